@@ -0,0 +1,83 @@
+'''
+Sensor acquisition on core 1 (dual-core mode).
+
+start() reads the colour sensors, grayscale and encoders in a _thread,
+which the RP2040 port runs on the second core, and publishes each set
+through a FrameBuffer. Core 0 only copies the newest frame and never
+waits on I2C.
+'''
+import time
+import _thread
+
+from classes.lock import Lockable
+from sensor_frame import FrameBuffer
+
+
+class Acquisition(Lockable):
+    """ The lock is held while the thread runs, stop() waits on it """
+    def __init__(self, follow, grayscale=None, speed=None, period_ms=40):
+        self.follow = follow
+        self.grayscale = grayscale
+        self.speed = speed
+        self.period_ms = period_ms
+        self.frames = FrameBuffer()
+        self.running = False
+        self.errors = 0
+        self.last_error = None
+
+    def _color_sensors(self):
+        follow = self.follow
+        return (follow.left_sensor, follow.middle_sensor, follow.right_sensor)
+
+    def acquire(self, frame):
+        """ fill <frame> with a new set of readings """
+        for i, sensor in enumerate(self._color_sensors()):
+            frame.set_color(i, sensor.read())
+        if self.grayscale is not None:
+            values = self.grayscale.get_value()
+            for i in range(3):
+                frame.grayscale[i] = values[i]
+        if self.speed is not None:
+            frame.speed = self.speed.get_speed()
+            frame.mileage = self.speed.get_mileage()
+        frame.ticks_ms = time.ticks_ms()
+
+    def step(self):
+        self.acquire(self.frames.back())
+        self.frames.publish()
+
+    def _run(self):
+        self.lock()
+        try:
+            deadline = time.ticks_ms()
+            while self.running:
+                try:
+                    self.step()
+                except Exception as e:
+                    # keep going, a single failed I2C read must not stop the acquisition
+                    self.errors += 1
+                    self.last_error = e
+                deadline = time.ticks_add(deadline, self.period_ms)
+                delay = time.ticks_diff(deadline, time.ticks_ms())
+                if delay > 0:
+                    time.sleep_ms(delay)
+                else:
+                    deadline = time.ticks_ms()
+        finally:
+            self.unlock()
+
+    def start(self):
+        """ start the acquisition thread on core 1 """
+        # keep the sensors integrating, read() then does not power cycle them
+        for sensor in self._color_sensors():
+            sensor.active(True)
+        self.running = True
+        _thread.start_new_thread(self._run, ())
+
+    def stop(self, timeout=1):
+        """ stop the thread, return True once it has finished """
+        self.running = False
+        if self.lock(timeout):
+            self.unlock()
+            return True
+        return False
@@ -0,0 +1,68 @@
+'''
+Awaitable wrappers for the blocking drivers, used by the scheduler tasks.
+
+The plain drivers wait inside the call (colour sensor integration, sonar
+echo), these wrappers give the other tasks the time instead.
+'''
+import time
+from machine import Pin
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+'''Poll interval while waiting on hardware (ms)'''
+POLL_MS = 2
+
+
+async def read_color(tcs):
+    """ raw (r, g, b, clear) of a TCS34725.
+        The sensor is left running, so after the first integration a new
+        reading is usually ready and read() returns without waiting.
+    """
+    if not tcs.active():
+        tcs.active(True)
+    while not tcs._valid():
+        await asyncio.sleep(POLL_MS / 1000)
+    return tcs.read()
+
+
+async def read_colors(follow):
+    """ raw (left, middle, right) readings of the Follow sensors """
+    left = await read_color(follow.left_sensor)
+    middle = await read_color(follow.middle_sensor)
+    right = await read_color(follow.right_sensor)
+    return (left, middle, right)
+
+
+async def get_distance(ultrasonic):
+    """ distance in cm, -1 on timeout.
+        The echo edges are timed by a pin IRQ instead of time_pulse_us().
+        The IRQ is hard, a soft one runs later from the scheduler and
+        would see the pin after a short echo has already ended.
+    """
+    edges = [0, 0]
+
+    def on_edge(pin):
+        t = time.ticks_us()
+        if pin.value():
+            edges[0] = t
+        else:
+            edges[1] = t
+
+    echo = ultrasonic._echo
+    echo.irq(on_edge, Pin.IRQ_RISING | Pin.IRQ_FALLING, hard=True)
+    ultrasonic._pulse()
+    t_s = time.ticks_us()
+    try:
+        while not edges[1]:
+            if time.ticks_diff(time.ticks_us(), t_s) > ultrasonic.TIMEOUT:
+                return -1
+            await asyncio.sleep(POLL_MS / 1000)
+    finally:
+        echo.irq(None)
+    if not edges[0]:
+        return -1
+    pulse_width = time.ticks_diff(edges[1], edges[0]) / 1000000.0
+    return pulse_width * ultrasonic.SOUND_SPEED / 2 * 100
@@ -0,0 +1,83 @@
+'''
+Concurrent boot phases and their timing.
+
+BootPhases runs one blocking phase on core 1 (a _thread, like the sensor
+acquisition) while core 0 runs others, and records when every phase
+started and ended:
+
+    boot = BootPhases(0)                            # ms since reset
+    boot.background("colour sensors", Follow)       # core 1
+    boot.run("esp8266 reset", ws.wait_reset)        # core 0, meanwhile
+    sensors = boot.join()                           # Follow(), once done
+    boot.mark("drivable")
+    log(boot.describe())
+
+ticks_ms() starts at the Pico's reset, so t0 = 0 gives the times since
+power-on.
+'''
+import time
+import _thread
+
+
+class BootPhases():
+    def __init__(self, t0=None):
+        self.t0 = time.ticks_ms() if t0 is None else t0
+        self.phases = []        # [name, start ms, end ms, core]
+        self.done = True        # the background phase finished
+        self.result = None
+        self.error = None
+
+    def now(self):
+        return time.ticks_diff(time.ticks_ms(), self.t0)
+
+    def run(self, name, fn, *args):
+        """ fn(*args) on this core, return its result """
+        phase = [name, self.now(), None, 0]
+        self.phases.append(phase)
+        try:
+            return fn(*args)
+        finally:
+            phase[2] = self.now()
+
+    def background(self, name, fn, *args):
+        """ start fn(*args) on core 1, join() returns its result """
+        phase = [name, self.now(), None, 1]
+        self.phases.append(phase)
+        self.done = False
+        self.result = None
+        self.error = None
+
+        def runner():
+            try:
+                self.result = fn(*args)
+            except Exception as e:
+                self.error = e
+            phase[2] = self.now()
+            self.done = True
+
+        _thread.start_new_thread(runner, ())
+
+    def join(self):
+        """ wait for the background phase, return its result or raise its exception """
+        while not self.done:
+            time.sleep_ms(1)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def mark(self, name):
+        """ a point in time, e.g. when the car can drive """
+        t = self.now()
+        self.phases.append([name, t, t, 0])
+
+    def describe(self):
+        parts = []
+        for name, start, end, core in self.phases:
+            if end is None:
+                parts.append("%s from %d ms" % (name, start))
+            elif start == end:
+                parts.append("%s at %d ms" % (name, start))
+            else:
+                parts.append("%s %d-%d ms (%d ms%s)" % (
+                    name, start, end, end - start, ", core 1" if core else ""))
+        return "boot: " + ", ".join(parts)
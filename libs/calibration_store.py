@@ -0,0 +1,169 @@
+'''
+Compact, versioned calibration store for the colour sensors.
+
+The file is a struct-packed binary blob that replaces the generated
+``color_calibration.py`` source file. It holds the per-sensor colour
+centroids, the match threshold and any precomputed lookup tables, so the
+car can load its calibration at boot without parsing Python source.
+
+Layout (little endian):
+
+    header   <4sBBH   magic b"PCAL", version, section count, reserved
+    section  <BBH     tag, reserved, payload length, followed by the payload
+    trailer  <I       CRC32 over everything before the trailer
+'''
+import struct
+from array import array
+from binascii import crc32
+
+CALIBRATION_FILE = "calibration.bin"
+
+MAGIC = b"PCAL"
+VERSION = 1
+
+# Sensor slots, "all" is the shared color_map used by every sensor
+SENSORS = ("all", "left", "middle", "right")
+
+TAG_COLORS = 1      # colour names, defines the colour index order
+TAG_CENTROIDS = 2   # RGB centroid per colour for one sensor slot
+TAG_THRESHOLD = 3   # colour match threshold
+TAG_TABLE = 4       # named uint16 lookup table
+
+_HEADER = "<4sBBH"
+_SECTION = "<BBH"
+_HEADER_SIZE = struct.calcsize(_HEADER)
+_SECTION_SIZE = struct.calcsize(_SECTION)
+
+
+def _section(tag, payload):
+    return struct.pack(_SECTION, tag, 0, len(payload)) + payload
+
+
+def _pack_name(name):
+    name = name.encode()
+    if len(name) > 255:
+        raise ValueError("Name too long: %s" % name)
+    return bytes((len(name),)) + name
+
+
+def _unpack_name(buf, offset):
+    length = buf[offset]
+    offset += 1
+    return bytes(buf[offset:offset + length]).decode(), offset + length
+
+
+def dumps(data):
+    '''Pack a calibration dict into bytes.
+
+    Args:
+        data: dict with the keys
+            "colors": list of colour names (defines the index order)
+            "centroids": {sensor slot: {colour name: (r, g, b)}}
+            "threshold": colour match threshold (int)
+            "tables": {name: sequence of uint16}
+
+    Returns:
+        bytes: the packed calibration
+    '''
+    colors = list(data.get("colors") or data["centroids"]["all"].keys())
+    sections = []
+
+    payload = bytes((len(colors),))
+    for name in colors:
+        payload += _pack_name(name)
+    sections.append(_section(TAG_COLORS, payload))
+
+    for slot, centroids in data.get("centroids", {}).items():
+        payload = bytearray((SENSORS.index(slot),))
+        for name in colors:
+            r, g, b = centroids[name]
+            payload.extend(struct.pack("<BBB", int(r), int(g), int(b)))
+        sections.append(_section(TAG_CENTROIDS, bytes(payload)))
+
+    if data.get("threshold") is not None:
+        sections.append(_section(TAG_THRESHOLD, struct.pack("<H", int(data["threshold"]))))
+
+    for name, values in data.get("tables", {}).items():
+        values = array("H", values)
+        payload = _pack_name(name) + struct.pack("<H", len(values)) + bytes(values)
+        sections.append(_section(TAG_TABLE, payload))
+
+    blob = struct.pack(_HEADER, MAGIC, VERSION, len(sections), 0) + b"".join(sections)
+    return blob + struct.pack("<I", crc32(blob) & 0xFFFFFFFF)
+
+
+def loads(blob):
+    '''Unpack bytes produced by dumps().
+
+    Unknown section tags are skipped so older firmware can read newer files.
+
+    Raises:
+        ValueError: bad magic, unsupported version, truncated data or CRC mismatch
+
+    Returns:
+        dict: same shape as the argument of dumps()
+    '''
+    if len(blob) < _HEADER_SIZE + 4:
+        raise ValueError("Calibration data truncated")
+    buf = memoryview(blob)
+    (crc,) = struct.unpack("<I", buf[-4:])
+    if crc32(buf[:-4]) & 0xFFFFFFFF != crc:
+        raise ValueError("Calibration checksum mismatch")
+
+    magic, version, count, _ = struct.unpack(_HEADER, buf[:_HEADER_SIZE])
+    if magic != MAGIC:
+        raise ValueError("Not a calibration file")
+    if version > VERSION:
+        raise ValueError("Unsupported calibration version %d" % version)
+
+    data = {"colors": [], "centroids": {}, "threshold": None, "tables": {}}
+    offset = _HEADER_SIZE
+    end = len(blob) - 4
+    for _ in range(count):
+        if offset + _SECTION_SIZE > end:
+            raise ValueError("Calibration data truncated")
+        tag, _, length = struct.unpack(_SECTION, buf[offset:offset + _SECTION_SIZE])
+        offset += _SECTION_SIZE
+        if offset + length > end:
+            raise ValueError("Calibration data truncated")
+        payload = buf[offset:offset + length]
+        offset += length
+
+        if tag == TAG_COLORS:
+            pos = 1
+            for _ in range(payload[0]):
+                name, pos = _unpack_name(payload, pos)
+                data["colors"].append(name)
+        elif tag == TAG_CENTROIDS:
+            centroids = {}
+            for i, name in enumerate(data["colors"]):
+                pos = 1 + 3 * i
+                centroids[name] = (payload[pos], payload[pos + 1], payload[pos + 2])
+            data["centroids"][SENSORS[payload[0]]] = centroids
+        elif tag == TAG_THRESHOLD:
+            (data["threshold"],) = struct.unpack("<H", payload)
+        elif tag == TAG_TABLE:
+            name, pos = _unpack_name(payload, 0)
+            (n,) = struct.unpack("<H", payload[pos:pos + 2])
+            table = array("H", bytes(payload[pos + 2:pos + 2 + 2 * n]))
+            data["tables"][name] = table
+    return data
+
+
+def save(filename, data):
+    '''Write a calibration dict to <filename>.'''
+    blob = dumps(data)
+    with open(filename, "wb") as f:
+        f.write(blob)
+    return len(blob)
+
+
+def load(filename):
+    '''Read a calibration dict from <filename>.
+
+    Raises:
+        OSError: file missing or unreadable
+        ValueError: file corrupted (see loads())
+    '''
+    with open(filename, "rb") as f:
+        return loads(f.read())
@@ -0,0 +1,139 @@
+'''
+Car state and the mode transition table.
+
+All mutable state of main.py lives in one CarState object. The mode only
+changes through dispatch(event): the (mode, event) pair is looked up in
+TRANSITIONS and the handler method runs. Events that don't apply to the
+current mode are ignored, so callers can dispatch on every packet and
+the transitions can be tested on the host without hardware.
+'''
+
+# Modes
+STOPPED = "stopped"          # car switched off in the app (E)
+IDLE = "idle"                # started, remote control only
+ARMED = "armed"              # line track switched on (G), waiting for I
+LINE_TRACK = "line track"    # following the line, the mode name Follow expects
+
+# Events
+EV_START = "start"
+EV_STOP = "stop"
+EV_LINE_TRACK_ON = "line track on"
+EV_LINE_TRACK_OFF = "line track off"
+EV_GO = "go"
+EV_EXIT = "exit"             # connection lost or an exit condition while tracking
+EV_FINISH = "finish"
+
+# (mode, event): (next mode, handler method)
+TRANSITIONS = {
+    (STOPPED, EV_START): (IDLE, "on_start"),
+    (IDLE, EV_STOP): (STOPPED, "on_stop"),
+    (ARMED, EV_STOP): (STOPPED, "on_stop"),
+    (LINE_TRACK, EV_STOP): (STOPPED, "on_stop"),
+    (IDLE, EV_LINE_TRACK_ON): (ARMED, "on_line_track_enabled"),
+    (ARMED, EV_LINE_TRACK_OFF): (IDLE, "on_line_track_disabled"),
+    (LINE_TRACK, EV_LINE_TRACK_OFF): (IDLE, "on_line_track_disabled"),
+    (ARMED, EV_GO): (LINE_TRACK, "on_go"),
+    (LINE_TRACK, EV_EXIT): (ARMED, "on_line_track_exit"),
+    (LINE_TRACK, EV_FINISH): (LINE_TRACK, "on_finish"),
+}
+
+
+class CarState():
+    __slots__ = (
+        "mode", "last_event", "transitions",
+        "line_status", "hub_reached", "to_destination",
+        "move_status", "dpad_touched", "throttle_power", "steer_power",
+        "lights_brightness", "is_move_last",
+        "brake_light_status", "brake_light_time",
+        "brake_light_brightness", "brake_light_brightness_flag",
+        "signal_blink_state", "signal_blink_time",
+        "sonar_on", "sonar_angle", "sonar_distance",
+        "avoid_proc", "avoid_has_obstacle",
+        "sensor_raw",
+    )
+
+    def __init__(self):
+        self.mode = STOPPED
+        self.last_event = None
+        self.transitions = 0
+
+        self.line_status = None
+        self.hub_reached = False
+        self.to_destination = False
+
+        self.move_status = 'stop'
+        self.dpad_touched = False
+        self.throttle_power = 0
+        self.steer_power = 0
+
+        self.lights_brightness = 0.2
+        self.is_move_last = False
+        self.brake_light_status = False
+        self.brake_light_time = 0
+        self.brake_light_brightness = 255 # 0 ~ 255
+        self.brake_light_brightness_flag = -1 # -1 or 1
+        self.signal_blink_state = False
+        self.signal_blink_time = 0
+
+        self.sonar_on = False
+        self.sonar_angle = 0
+        self.sonar_distance = 0
+        self.avoid_proc = "scan" # obstacle process, "scan", "getdir", "stop", "forward", "left", "right"
+        self.avoid_has_obstacle = False
+
+        # raw (left, middle, right) colour readings of the sensor task
+        self.sensor_raw = None
+
+    # flags of the old globals, derived from the mode
+    @property
+    def start(self):
+        return self.mode != STOPPED
+
+    @property
+    def start_line_track(self):
+        return self.mode == ARMED or self.mode == LINE_TRACK
+
+    @property
+    def line_track_active(self):
+        return self.mode == LINE_TRACK
+
+    def dispatch(self, event):
+        """ apply <event>, return True if it caused a transition """
+        entry = TRANSITIONS.get((self.mode, event))
+        if entry is None:
+            return False
+        self.mode = entry[0]
+        self.last_event = event
+        self.transitions += 1
+        getattr(self, entry[1])()
+        return True
+
+    ''' transition handlers, called after the mode is set '''
+    def on_start(self):
+        print("Car started")
+
+    def on_stop(self):
+        self.move_status = 'stop'
+        self.line_status = None
+        print("Car stopped")
+
+    def on_line_track_enabled(self):
+        print("Line Track Mode Enabled")
+
+    def on_line_track_disabled(self):
+        self.line_status = None
+        print("Line Track Mode Disabled")
+
+    def on_go(self):
+        self.line_status = None
+        print('line track enabled')
+
+    def on_line_track_exit(self):
+        self.move_status = 'stop'
+        self.line_status = None
+
+    def on_finish(self):
+        self.line_status = None
+        self.to_destination = False
+        self.hub_reached = False
+        print("line track finished")
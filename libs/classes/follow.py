@@ -5,7 +5,34 @@ from machine import Pin, SoftI2C
 from helper import debug_print, get_debug
 from typing import Optional, Union, Tuple, Any
 
+import calibration_store
+from calibration_store import CALIBRATION_FILE
+
 from classes.new_tcs import TCS34725, TCSGAIN_LOW, TCSINTEG_MEDIUM
+from classes.range_classifier import RangeBoxClassifier
+
+# Sensor index used by the range box classifier
+SENSOR_INDEX = {"left": 0, "middle": 1, "right": 2}
+
+# Raw (r, g, b, clear) range boxes used until a calibration provides its own
+DEFAULT_RANGE_BOXES = {
+    "lila": ((150, 140, 110, 350), (200, 190, 160, 600)),
+}
+
+# Raw to RGB conversions, the calibration store selects one by index
+RGB_ALGORITHMS = ("_raw_to_rgb", "_raw_to_rgb_alternative", "_raw_to_rgb_simple")
+
+# Methods provided on demand by classes.follow_tools
+TOOLS = (
+    "_safe_input",
+    "calibrate_white_balance",
+    "test_and_calibrate_colors",
+    "test_single_color",
+    "print_color_distances",
+    "debug_color_reading",
+    "test_conversion_algorithms",
+    "calibrate_range_box",
+)
 
 
 class Follow:
@@ -13,6 +40,7 @@ class Follow:
         self,
         target_color: Union[str, Tuple[int, int, int]] = "orange",
         standalone: bool = False,
+        calibration_file: Optional[str] = CALIBRATION_FILE,
     ):
         """
         Initialize the Follow class for line tracking with color sensors.
@@ -22,6 +50,7 @@ class Follow:
                          - A color name string (e.g., "orange", "blue", "terracotta")
                          - An RGB tuple (e.g., (255, 128, 0))
             standalone: Whether to run in standalone mode with single sensor
+            calibration_file: Calibration store loaded at boot if it exists (None to skip)
         """
         print("Starting tcs34725")
         self.standalone = standalone
@@ -53,8 +82,18 @@ class Follow:
             "blue": (121, 157, 147),
         }
         self.rgb_to_color = {v: k for k, v in self.color_map.items()}
-        self.min_lila_map = (150, 140, 110, 350)
-        self.max_lila_map = (200, 190, 160, 600)
+        # Per-sensor centroids ("left", "middle", "right"), filled from the calibration store
+        self.sensor_color_maps = {}
+        # Raw range boxes per color and sensor
+        self.range_boxes = RangeBoxClassifier(self.color_map.keys())
+        for color_name, (lo, hi) in DEFAULT_RANGE_BOXES.items():
+            self.range_boxes.set_box(color_name, lo, hi)
+        self.color_threshold = 40  # Adjust this value as needed
+        self.set_rgb_algorithm(RGB_ALGORITHMS[0])
+
+        # Load the saved calibration before resolving the target color
+        if calibration_file:
+            self.load_color_map(calibration_file, verbose=False)
 
         # Convert target_color to RGB tuple and validate
         if isinstance(target_color, str):
@@ -65,79 +104,24 @@ class Follow:
             self.target_rgb = self._validate_rgb(target_color)
 
 
-        # Set target color name based on RGB
+        # Set target color name based on RGB, this also fills the target caches
         self.target_color = self._get_closest_color_name(self.target_rgb)
         print("I2C started")
-        self.color_threshold = 40  # Adjust this value as needed
         self.line_out_time = 0  # Track when line was lost
+        self.current_mode = None
 
-    def _safe_input(self, prompt: str = "", timeout_ms: int = 30000) -> str:
-        """Safe input function that handles MicroPython limitations
+    def __getattr__(self, name: str) -> Any:
+        """Load the calibration and diagnostic tooling on first use.
 
-        Args:
-            prompt: Text to display to user
-            timeout_ms: Timeout in milliseconds (default 30 seconds)
-
-        Returns:
-            str: User input or empty string if failed
+        Methods like test_and_calibrate_colors() live in classes.follow_tools
+        so they are not compiled into RAM while driving.
         """
-        if prompt:
-            print(prompt)
+        if name in TOOLS:
+            from classes import follow_tools
 
-        try:
-            # Try standard input first
-            user_input = input()
-            print(f"Received input: '{user_input}'")
-            return user_input
-        except (OSError, KeyboardInterrupt, EOFError) as e:
-            print(f"Input error: {e}")
-            print("Using alternative input method...")
-
-            # Alternative method for MicroPython
-            try:
-                import sys
-                import time
-
-                start_time = time.ticks_ms()
-                result = ""
-
-                print("Press Enter when ready (or wait for timeout)...")
-
-                while True:
-                    if time.ticks_diff(time.ticks_ms(), start_time) > timeout_ms:
-                        print("Input timeout reached, proceeding...")
-                        break
-
-                    # Simple character-by-character reading
-                    try:
-                        char = sys.stdin.read(1) if hasattr(sys.stdin, "read") else None
-                        if char and (char == "\n" or char == "\r"):
-                            break
-                        elif char:
-                            result += char
-                    except (OSError, AttributeError):
-                        # If character reading fails, just break
-                        break
-
-                    time.sleep_ms(100)  # Small delay
-
-                if result:
-                    print(f"Received: '{result}'")
-                return result
-
-            except (ImportError, AttributeError, OSError):
-                # If all input methods fail, use a simple delay
-                print("Input not available - waiting 3 seconds then proceeding...")
-                try:
-                    time.sleep(3)
-                except Exception as sleep_error:
-                    print(f"Sleep error: {sleep_error}")
-                return ""
-
-        except Exception as e:
-            print(f"Unexpected input error: {e}")
-            print("Proceeding without user input...")
-            return ""
+            follow_tools.attach(Follow)
+            return getattr(self, name)
+        raise AttributeError(name)
 
     def _validate_rgb(self, rgb: Tuple[Any, ...]) -> Tuple[int, int, int]:
         """Validate RGB tuple and ensure it contains exactly 3 integers.
@@ -232,10 +216,21 @@ class Follow:
             raw_values = sensor.read()  # Returns (r, g, b, clear)
 
         # Convert raw ADC values to standard RGB (0-255)
-        return self._raw_to_rgb(
+        return self._convert(
             raw_values[0], raw_values[1], raw_values[2], raw_values[3]
         )
 
+    def set_rgb_algorithm(self, name: str) -> None:
+        """Select the raw to RGB conversion used for every sensor reading.
+
+        Args:
+            name: One of RGB_ALGORITHMS ("_raw_to_rgb", "_raw_to_rgb_alternative", "_raw_to_rgb_simple")
+        """
+        if name not in RGB_ALGORITHMS:
+            raise ValueError(f"Unknown RGB algorithm: {name}. Must be one of: {RGB_ALGORITHMS}")
+        self.rgb_algorithm = name
+        self._convert = getattr(self, name)
+
     def _raw_to_rgb(
         self, r_raw: int, g_raw: int, b_raw: int, clear_raw: int
     ) -> Tuple[int, int, int]:
@@ -381,179 +376,79 @@ class Follow:
 
         return (r, g, b)
 
-    def calibrate_white_balance(self, sensor: Any = None) -> Tuple[int, int, int, int]:
-        """Calibrate white balance by reading a white surface
+    def save_color_map(self, filename: str = CALIBRATION_FILE) -> None:
+        """Save the current color_map, per-sensor centroids, threshold and
+        lookup tables to the binary calibration store
 
         Args:
-            sensor: The sensor to calibrate (None for standalone mode)
-
-        Returns:
-            Tuple[int, int, int, int]: White balance calibration values (r, g, b, clear)
+            filename: Name of the file to save to
         """
-        print("Point sensor at a white surface and press Enter...")
-        self._safe_input()
-
-        if self.standalone:
-            white_values = self.sensor.read()
-        else:
-            white_values = sensor.read()
-
-        print(
-            f"White calibration values: R={white_values[0]}, G={white_values[1]}, B={white_values[2]}, Clear={white_values[3]}"
-        )
-        return white_values
+        centroids = {"all": self.color_map}
+        centroids.update(self.sensor_color_maps)
+        data = {
+            "colors": self.range_boxes.colors,
+            "centroids": centroids,
+            "threshold": self.color_threshold,
+            "tables": self.range_boxes.to_tables(),
+        }
+        data["tables"]["rgb_algorithm"] = (RGB_ALGORITHMS.index(self.rgb_algorithm),)
+        try:
+            size = calibration_store.save(filename, data)
+            print(f"✓ Color map saved to {filename} ({size} bytes)")
+        except Exception as e:
+            print(f"Error saving color map: {e}")
 
-    def test_and_calibrate_colors(self, sensor: Any = None) -> dict:
-        """Test all colors in the color_map and allow adjustment of RGB values
+    def load_color_map(self, filename: str = CALIBRATION_FILE, verbose: bool = True) -> bool:
+        """Load color_map, per-sensor centroids, threshold and lookup tables
+        from the binary calibration store
 
-        This method will guide you through testing each color in your color_map
-        and allow you to update the RGB values based on actual sensor readings.
+        Legacy ``color_calibration.py`` files are still read when the filename
+        ends in ".py", so old calibrations can be loaded once and saved again.
 
         Args:
-            sensor: The sensor to use for testing (None for standalone mode)
+            filename: Name of the file to load from
+            verbose: Print the loaded colors and errors
 
         Returns:
-            dict: Updated color_map with new RGB values
-        """
-        print("=== Color Calibration Tool ===")
-        print("This tool will help you calibrate each color in your color_map.")
-        print("For each color, point the sensor at that color and press Enter.")
-        print(
-            "You can then choose to update the RGB values or keep the current ones.\n"
-        )
-
-        updated_color_map = self.color_map.copy()
-
-        for color_name, current_rgb in self.color_map.items():
-            print(f"\n--- Testing Color: {color_name.upper()} ---")
-            print(f"Current RGB values: {current_rgb}")
-            print(f"Point the sensor at a {color_name} surface and press Enter...")
-
-            try:
-                self._safe_input()
-
-                # Read current sensor values
-                if self.standalone:
-                    raw_values = self.sensor.read()
-                else:
-                    raw_values = sensor.read() if sensor else self.middle_sensor.read()
-
-                converted_rgb = self._raw_to_rgb(
-                    raw_values[0], raw_values[1], raw_values[2], raw_values[3]
-                )
-                distance_to_current = self._color_distance(converted_rgb, current_rgb)
-
-                print(
-                    f"Raw sensor reading: R={raw_values[0]}, G={raw_values[1]}, B={raw_values[2]}, Clear={raw_values[3]}"
-                )
-                print(f"Converted RGB: {converted_rgb}")
-                print(f"Distance to current {color_name}: {distance_to_current:.2f}")
-
-                # Ask if user wants to update
-                while True:
-                    choice = (
-                        self._safe_input(
-                            f"Update {color_name} RGB values? (y/n/m for manual): "
-                        )
-                        .lower()
-                        .strip()
-                    )
-
-                    if choice == "y":
-                        updated_color_map[color_name] = converted_rgb
-                        print(
-                            f"✓ Updated {color_name}: {current_rgb} → {converted_rgb}"
-                        )
-                        break
-                    elif choice == "n":
-                        print(f"✓ Kept original {color_name}: {current_rgb}")
-                        break
-                    elif choice == "m":
-                        # Manual RGB input
-                        try:
-                            print("Enter RGB values manually (format: r,g,b):")
-                            manual_input = self._safe_input("RGB: ").strip()
-                            if manual_input:
-                                r, g, b = map(int, manual_input.split(","))
-                                manual_rgb = (
-                                    max(0, min(255, r)),
-                                    max(0, min(255, g)),
-                                    max(0, min(255, b)),
-                                )
-                                updated_color_map[color_name] = manual_rgb
-                                print(
-                                    f"✓ Manually set {color_name}: {current_rgb} → {manual_rgb}"
-                                )
-                                break
-                            else:
-                                print("No input received, keeping original value")
-                                break
-                        except ValueError:
-                            print("Invalid format. Use: r,g,b (e.g., 255,128,64)")
-                    elif choice == "":
-                        # No input received, keep original
-                        print(f"✓ No input - kept original {color_name}: {current_rgb}")
-                        break
-                    else:
-                        print("Please enter 'y', 'n', or 'm'")
-
-            except KeyboardInterrupt:
-                print(f"\nSkipping {color_name}...")
-                continue
-            except Exception as e:
-                print(f"Error reading {color_name}: {e}")
-                continue
-
-        print("\n=== Calibration Complete ===")
-        print("Updated color map:")
-        for color_name, rgb_values in updated_color_map.items():
-            old_values = self.color_map[color_name]
-            if rgb_values != old_values:
-                print(f"  {color_name}: {old_values} → {rgb_values} ✓")
-            else:
-                print(f"  {color_name}: {rgb_values} (unchanged)")
-
-        # Ask if user wants to apply changes
-        while True:
-            apply = (
-                self._safe_input("\nApply these changes to the color_map? (y/n): ")
-                .lower()
-                .strip()
-            )
-            if apply == "y":
-                self.color_map = updated_color_map
-                self.rgb_to_color = {v: k for k, v in self.color_map.items()}
-                print("✓ Color map updated!")
-                break
-            elif apply == "n" or apply == "":
-                print("✓ Changes discarded, original color map kept.")
-                break
-            else:
-                print("Please enter 'y' or 'n'")
-
-        return updated_color_map
-
-    def save_color_map(self, filename: str = "color_calibration.py") -> None:
-        """Save the current color_map to a Python file
-
-        Args:
-            filename: Name of the file to save to
+            bool: True if successful, False otherwise
         """
+        if filename.endswith(".py"):
+            return self._load_color_map_source(filename)
         try:
-            with open(filename, "w") as f:
-                f.write("# Auto-generated color calibration file\n")
-                f.write("# Generated by Follow.save_color_map()\n\n")
-                f.write("color_map = {\n")
-                for color_name, rgb_values in self.color_map.items():
-                    f.write(f'    "{color_name}": {rgb_values},\n')
-                f.write("}\n\n")
-                f.write("# To use: sensor.load_color_map('color_calibration.py')\n")
-            print(f"✓ Color map saved to {filename}")
-        except Exception as e:
-            print(f"Error saving color map: {e}")
+            data = calibration_store.load(filename)
+        except OSError:
+            if verbose:
+                print(f"Error: File {filename} not found")
+            return False
+        except ValueError as e:
+            print(f"Error loading color map: {e}")
+            return False
 
-    def load_color_map(self, filename: str = "color_calibration.py") -> bool:
-        """Load color_map from a Python file
+        centroids = data["centroids"]
+        if "all" in centroids:
+            self.color_map = centroids["all"]
+            self.rgb_to_color = {v: k for k, v in self.color_map.items()}
+        self.sensor_color_maps = {k: v for k, v in centroids.items() if k != "all"}
+        if data["threshold"] is not None:
+            self.color_threshold = data["threshold"]
+        if "rgb_algorithm" in data["tables"]:
+            self.set_rgb_algorithm(RGB_ALGORITHMS[data["tables"]["rgb_algorithm"][0]])
+        # Without matching box tables the boxes are left empty, the defaults
+        # belong to another calibration and would override the loaded one
+        range_boxes = RangeBoxClassifier(data["colors"] or self.color_map.keys())
+        range_boxes.load_tables(data["tables"])
+        self.range_boxes = range_boxes
+        self._refresh_target()
+
+        if verbose:
+            print(f"✓ Color map loaded from {filename}")
+            print("Loaded colors:")
+            for color_name, rgb_values in self.color_map.items():
+                print(f"  {color_name}: {rgb_values}")
+        return True
+
+    def _load_color_map_source(self, filename: str) -> bool:
+        """Load color_map from a legacy Python file written by older versions
 
         Args:
             filename: Name of the file to load from
@@ -574,137 +469,17 @@ class Follow:
                 self.color_map = namespace["color_map"]
                 self.rgb_to_color = {v: k for k, v in self.color_map.items()}
                 print(f"✓ Color map loaded from {filename}")
-                print("Loaded colors:")
-                for color_name, rgb_values in self.color_map.items():
-                    print(f"  {color_name}: {rgb_values}")
                 return True
             else:
                 print(f"Error: No 'color_map' found in {filename}")
                 return False
-        except FileNotFoundError:
+        except OSError:
             print(f"Error: File {filename} not found")
             return False
         except Exception as e:
             print(f"Error loading color map: {e}")
             return False
 
-    def test_single_color(
-        self, color_name: str, sensor: str = None
-    ) -> Tuple[Tuple[int, int, int, int], Tuple[int, int, int], float]:
-        """Test a single color and compare with current color_map value
-
-        Args:
-            color_name: Name of the color to test
-            sensor: The sensor to use (None for standalone mode)
-
-        Returns:
-            Tuple containing (raw_values, converted_rgb, distance_to_current)
-        """
-        if color_name.lower() not in self.color_map:
-            raise ValueError(
-                f"Color '{color_name}' not found in color_map. Available colors: {list(self.color_map.keys())}"
-            )
-
-        color_name = color_name.lower()
-        current_rgb = self.color_map[color_name]
-
-        print(f"\n--- Testing {color_name.upper()} ---")
-        print(f"Current RGB: {current_rgb}")
-        print(f"Point sensor at {color_name} surface and press Enter...")
-        self._safe_input()
-
-        # Read sensor
-        if self.standalone:
-            raw_values = self.sensor.read()
-        else:
-            if sensor == "left":
-                raw_values = self.left_sensor.read() 
-            if sensor == "middle":
-                raw_values = self.middle_sensor.read() 
-            if sensor == "right":
-                raw_values = self.right_sensor.read() 
-
-        converted_rgb = self._raw_to_rgb(
-            raw_values[0], raw_values[1], raw_values[2], raw_values[3]
-        )
-        distance = self._color_distance(converted_rgb, current_rgb)
-
-        print(
-            f"Raw reading: R={raw_values[0]}, G={raw_values[1]}, B={raw_values[2]}, Clear={raw_values[3]}"
-        )
-        print(f"Converted RGB: {converted_rgb}")
-        print(f"Distance to current: {distance:.2f}")
-        print(f"Match threshold: {self.color_threshold}")
-        print(f"Would match: {'✓ YES' if distance < self.color_threshold else '✗ NO'}")
-
-        return raw_values, converted_rgb, distance
-
-    def print_color_distances(self, test_rgb: Tuple[int, int, int]) -> None:
-        """Print distances from test_rgb to all colors in color_map
-
-        Args:
-            test_rgb: RGB tuple to compare against all colors
-        """
-        print(f"\nDistances from RGB {test_rgb} to all colors:")
-        print("-" * 50)
-
-        distances = []
-        for color_name, color_rgb in self.color_map.items():
-            distance = self._color_distance(test_rgb, color_rgb)
-            distances.append((distance, color_name, color_rgb))
-
-        # Sort by distance (closest first)
-        distances.sort()
-
-        for distance, color_name, color_rgb in distances:
-            match_status = (
-                "✓ MATCH" if distance < self.color_threshold else "✗ no match"
-            )
-            print(f"  {color_name:12} {color_rgb}: {distance:6.2f} {match_status}")
-
-        closest_color = distances[0][1]
-        print(f"\nClosest color: {closest_color} (distance: {distances[0][0]:.2f})")
-
-    def debug_color_reading(
-        self, sensor: str = None
-    ) -> Tuple[Tuple[int, int, int, int], Tuple[int, int, int], str]:
-        """Debug method to show both raw and converted values
-
-        Args:
-            sensor: The sensor to read from (None for standalone mode)
-
-        Returns:
-            Tuple containing (raw_values, converted_rgb, color_name)
-        """
-        if self.standalone:
-            raw_values = self.sensor.read()
-        else:
-            if sensor == "left":
-                raw_values = self.left_sensor.read() 
-            if sensor == "middle":
-                raw_values = self.middle_sensor.read() 
-            if sensor == "right":
-                raw_values = self.right_sensor.read() 
-
-        converted_rgb = self._raw_to_rgb(
-            raw_values[0], raw_values[1], raw_values[2], raw_values[3]
-        )
-        color_name = self.rgb_to_color_name(converted_rgb)
-
-        print(
-            f"Raw ADC values: R={raw_values[0]}, G={raw_values[1]}, B={raw_values[2]}, Clear={raw_values[3]}"
-        )
-        print(f"Converted RGB: {converted_rgb}")
-        print(f"Detected color: {color_name}")
-        print(
-            f"Distance to target ({self.target_color}): {self._color_distance(converted_rgb, self.target_rgb):.2f}"
-        )
-
-        # Show distances to all colors
-        self.print_color_distances(converted_rgb)
-
-        return raw_values, converted_rgb, color_name
-
     def get_raw_values(self, sensor: Any = None) -> Tuple[int, int, int, int]:
         """Get raw ADC values from sensor without conversion
 
@@ -719,60 +494,6 @@ class Follow:
         else:
             return sensor.read()
 
-    def test_conversion_algorithms(self) -> None:
-        """Test all three RGB conversion algorithms on current reading"""
-        print("Testing RGB Conversion Algorithms")
-        print("=" * 50)
-
-        try:
-            # Read raw values
-            if self.standalone:
-                raw_values = self.sensor.read()
-            else:
-                raw_values = self.read_raw()
-
-            print(f"Raw ADC values: {raw_values}")
-            r_raw, g_raw, b_raw, clear_raw = raw_values
-
-            # Test each algorithm
-            algorithms = [
-                ("Default (Ratio + Scale)", "_raw_to_rgb"),
-                ("Alternative (Illumination Corrected)", "_raw_to_rgb_alternative"),
-                ("Simple (Direct Scaling)", "_raw_to_rgb_simple"),
-            ]
-
-            for name, method_name in algorithms:
-                print(f"\n{name}:")
-                try:
-                    if method_name == "_raw_to_rgb":
-                        rgb = self._raw_to_rgb(r_raw, g_raw, b_raw, clear_raw)
-                    elif method_name == "_raw_to_rgb_alternative":
-                        rgb = self._raw_to_rgb_alternative(
-                            r_raw, g_raw, b_raw, clear_raw
-                        )
-                    else:  # simple
-                        rgb = self._raw_to_rgb_simple(r_raw, g_raw, b_raw, clear_raw)
-
-                    print(f"  RGB: {rgb}")
-
-                    # Find closest color and distance
-                    closest_color = self._get_closest_color_name(rgb)
-                    distance = self._color_distance(rgb, self.color_map[closest_color])
-                    print(f"  Closest: {closest_color} (distance: {distance:.2f})")
-
-                    if distance <= self.color_threshold:
-                        print(f"  ✓ Match within threshold ({self.color_threshold})")
-                    else:
-                        print("  ✗ No match (exceeds threshold)")
-
-                except Exception as e:
-                    print(f"  Error: {e}")
-
-            print("\n" + "=" * 50)
-
-        except Exception as e:
-            print(f"Error reading sensor: {e}")
-
     @property
     def target_color_rgb(self) -> Tuple[int, int, int]:
         """Get the target color for the line.
@@ -816,7 +537,7 @@ class Follow:
         Returns:
             str: Target color as color name (e.g "Red").
         """
-        return self._get_closest_color_name(self.target_rgb)
+        return self._target_color
 
     color = target_color
 
@@ -830,12 +551,36 @@ class Follow:
         Raises:
             ValueError: Color name not valid for the Sensor ("lila", "blau", "grün", "gelb", "orange", "terracotta")
         """
-        if color.lower() in self.color_map:
-            self.target_rgb = self.color_map[color.lower()]
-        else:
+        color = color.lower()
+        if color not in self.color_map:
             raise ValueError(
                 f"Invalid color name: '{color}'. Must be one of: {list(self.color_map.keys())}"
             )
+        # Everything derived from the target is cached here, so the matching
+        # methods do no string or dict work per frame
+        self._target_color = color
+        self.target_rgb = self.color_map[color]
+        self._target_bit = self.range_boxes.bit(color)
+        self._update_fast_path()
+
+    def _refresh_target(self) -> None:
+        """Re-resolve the cached target after color_map or range_boxes changed."""
+        if not hasattr(self, "_target_color"):
+            return
+        if self._target_color in self.color_map:
+            self.target_color = self._target_color
+        else:
+            self.target_color_rgb = self.target_rgb
+
+    @property
+    def color_threshold(self) -> int:
+        """Maximum color distance for a match."""
+        return self._color_threshold
+
+    @color_threshold.setter
+    def color_threshold(self, threshold: int) -> None:
+        self._color_threshold = threshold
+        self._threshold_sq = threshold * threshold
 
     def _color_distance(
         self, color1: Tuple[int, int, int], color2: Tuple[int, int, int]
@@ -993,24 +738,32 @@ class Follow:
         if target_rgb is None:
             target_rgb = self.target_rgb
 
-        distance = self._color_distance(color, target_rgb)
-        # print(f"Color: {color}, Target: {target_rgb}, Distance: {distance}")
-        if distance < self.color_threshold:
-            return True
-        else:
-            return False
+        # Compare squared distances, no sqrt and no generator per call
+        dr = color[0] - target_rgb[0]
+        dg = color[1] - target_rgb[1]
+        db = color[2] - target_rgb[2]
+        return dr * dr + dg * dg + db * db < self._threshold_sq
 
-    def get_color_str(self) -> Tuple[str, str, str]:
+    def get_color_str(self, raw: Optional[Tuple] = None) -> Tuple[str, str, str]:
         """
+        Args:
+            raw: Raw (left, middle, right) readings, the sensors are read if None
+
         Returns:
         tuple of str: Color that corresponds to the RGB values.
         (left, middle, right)
         """
-        left_result = self.rgb_to_color_name(rgb=self._read_sensor(self.left_sensor))
-        middle_result = self.rgb_to_color_name(
-            rgb=self._read_sensor(self.middle_sensor)
-        )
-        right_result = self.rgb_to_color_name(rgb=self._read_sensor(self.right_sensor))
+        if raw is not None:
+            convert = self._convert
+            left_result = self.rgb_to_color_name(rgb=convert(*raw[0]))
+            middle_result = self.rgb_to_color_name(rgb=convert(*raw[1]))
+            right_result = self.rgb_to_color_name(rgb=convert(*raw[2]))
+        else:
+            left_result = self.rgb_to_color_name(rgb=self._read_sensor(self.left_sensor))
+            middle_result = self.rgb_to_color_name(
+                rgb=self._read_sensor(self.middle_sensor)
+            )
+            right_result = self.rgb_to_color_name(rgb=self._read_sensor(self.right_sensor))
 
         # Ensure we return strings (cast to str if needed)
         left = str(left_result) if isinstance(left_result, str) else ""
@@ -1019,21 +772,64 @@ class Follow:
 
         return (left, middle, right)
 
-    def simple_get_line(self):
-        l = self.read_raw("left")
-        m = self.read_raw("middle")
-        r = self.read_raw("right")
+    def _update_fast_path(self) -> None:
+        """Use the range boxes for line detection when the target color has a
+        box on every sensor and no two color boxes overlap."""
+        boxes = self.range_boxes
+        self.use_range_boxes = boxes.has_box(self._target_color) and not boxes.overlaps()
+
+    def read_raw_all(self) -> Tuple[Tuple[int, int, int, int], ...]:
+        """Read the raw values of the left, middle and right sensor"""
+        return (
+            self.left_sensor.read(),
+            self.middle_sensor.read(),
+            self.right_sensor.read(),
+        )
 
-        print(l, m, r)
+    def get_line_masks(self, raw: Optional[Tuple] = None) -> Tuple[int, int, int]:
+        """Classify the raw readings of all sensors against every range box
 
-        left = all(lower <= value <= upper for value, lower, upper in zip(l, self.min_lila_map, self.max_lila_map))
-        middle = all(lower <= value <= upper for value, lower, upper in zip(m, self.min_lila_map, self.max_lila_map))
-        right = all(lower <= value <= upper for value, lower, upper in zip(r, self.min_lila_map, self.max_lila_map))
+        Args:
+            raw: Raw (left, middle, right) readings, the sensors are read if None
 
-        return (left, middle, right)
+        Returns:
+            Tuple[int, int, int]: Bitmask per sensor (left, middle, right), bit i is
+                                  set if the reading is inside the box of range_boxes.colors[i]
+        """
+        classify = self.range_boxes.classify
+        if raw is not None:
+            return (classify(0, raw[0]), classify(1, raw[1]), classify(2, raw[2]))
+        return (
+            classify(0, self.read_raw("left")),
+            classify(1, self.read_raw("middle")),
+            classify(2, self.read_raw("right")),
+        )
+
+    def simple_get_line(self, raw: Optional[Tuple] = None) -> Tuple[bool, bool, bool]:
+        """Check which sensors see the target color using the range boxes
+
+        Args:
+            raw: Raw (left, middle, right) readings, the sensors are read if None
+
+        Returns:
+            Tuple[bool, bool, bool]: (left, middle, right)
+        """
+        bit = self._target_bit
+        left, middle, right = self.get_line_masks(raw)
 
-    def get_line_position(self, current_mode: Optional[str] = None) -> Optional[str]:
-        """Determine the position of the line based on sensor readings."""
+        if get_debug():
+            debug_print(f"{left:b} {middle:b} {right:b}", action="line_track", msg="Range Box Masks")
+
+        return (bool(left & bit), bool(middle & bit), bool(right & bit))
+
+    def get_line_position(
+        self, current_mode: Optional[str] = None, raw: Optional[Tuple] = None
+    ) -> Optional[str]:
+        """Determine the position of the line based on sensor readings.
+
+        <raw> are (left, middle, right) raw readings taken by the caller,
+        the sensors are read if None.
+        """
         self.current_mode = current_mode
 
         # Only proceed if we're in line track mode
@@ -1041,10 +837,10 @@ class Follow:
             print("Not in line track mode, skipping get_line_position.")
             return None
 
-        left = self.simple_get_line()[0]
-        middle = self.simple_get_line()[1]
-        right = self.simple_get_line()[2]
-        print(left, middle, right)
+        if self.use_range_boxes:
+            left, middle, right = self.simple_get_line(raw)
+        else:
+            left, middle, right = self.color_match_bool(raw=raw)
 
         if left is None and middle is None and right is None:
             return None
@@ -1058,21 +854,32 @@ class Follow:
         else: 
             return None
 
-    def color_match_bool(self, match_color: str) -> Tuple[bool, bool, bool]:
-        left_color = self.color_match(
-            self._read_sensor(self.left_sensor), self.color_name_to_rgb(match_color)
-        )
-        middle_color = self.color_match(
-            self._read_sensor(self.middle_sensor), self.color_name_to_rgb(match_color)
-        )
-        right_color = self.color_match(
-            self._read_sensor(self.right_sensor), self.color_name_to_rgb(match_color)
-        )
+    def color_match_bool(
+        self, match_color: Optional[str] = None, raw: Optional[Tuple] = None
+    ) -> Tuple[bool, bool, bool]:
+        """Check which sensors see <match_color> (the cached target by default)."""
+        if match_color is None or match_color == self._target_color:
+            match_rgb = self.target_rgb
+        else:
+            match_rgb = self.color_name_to_rgb(match_color)
+        if raw is not None:
+            convert = self._convert
+            return tuple(self.color_match(convert(*values), match_rgb) for values in raw)
+        left_color = self.color_match(self._read_sensor(self.left_sensor), match_rgb)
+        middle_color = self.color_match(self._read_sensor(self.middle_sensor), match_rgb)
+        right_color = self.color_match(self._read_sensor(self.right_sensor), match_rgb)
 
         return left_color, middle_color, right_color
 
 
-    def follow_line(self, power: int) -> Optional[str]:
+    def raw_color_match(self, raw: Tuple[int, int, int, int]) -> bool:
+        """Check if one raw (r, g, b, clear) reading is the cached target color,
+        like color_match_bool() for a single sensor."""
+        return self.color_match(self._convert(*raw), self.target_rgb)
+
+    def follow_line(
+        self, power: int, current_mode: Optional[str] = None, raw: Optional[Tuple] = None
+    ) -> Optional[str]:
         """Follow the line based on sensor readings.
 
         This function should be called from main.py to follow a colored line.
@@ -1081,12 +888,16 @@ class Follow:
 
         Args:
             power: Motor power level (0-100)
+            current_mode: The mode of the car, the last used mode if None
+            raw: Raw (left, middle, right) readings from the sensor task. The
+                 caller then sets the pace and the 0.1 s delay is skipped.
 
         Returns:
             The current move_status value ('left', 'right', 'forward', 'stop')
         """
-
-        position = self.get_line_position(self.current_mode)
+        if current_mode is None:
+            current_mode = self.current_mode
+        position = self.get_line_position(current_mode, raw)
         # Check if debug mode is enabled and we're in line track mode
         is_debug = get_debug() and self.current_mode == "line track"
 
@@ -1143,148 +954,6 @@ class Follow:
         #     #     )
         #     print(f"Direction: {position}")
         # Small delay to avoid overwhelming the motors
-        sleep(0.1)
+        if raw is None:
+            sleep(0.1)
         return position
-
-
-if __name__ == "__main__":
-
-    def safe_input(prompt=""):
-        """Simple safe input for main section"""
-        try:
-            if prompt:
-                print(prompt, end="")
-            return input()
-        except (OSError, KeyboardInterrupt, EOFError) as e:
-            print(f"Input error: {e}")
-            print("Using default values...")
-            return ""
-        except Exception as e:
-            print(f"Unexpected input error: {e}")
-            return ""
-
-    print("=== TCS34725 Color Sensor Testing ===")
-    print("Choose a testing mode:")
-    print("1. Test raw-to-RGB conversion (no hardware needed)")
-    print("2. Debug single color reading (requires hardware)")
-    print("3. Test single color calibration (requires hardware)")
-    print("4. Full color calibration (requires hardware)")
-    print("5. Load saved color calibration")
-
-    try:
-        choice = safe_input("Enter choice (1-5): ").strip()
-        if not choice:
-            choice = "1"  # Default to option 1 if no input
-
-        if choice == "1":
-            # Test the conversion without requiring hardware
-            print("\n=== Testing Raw-to-RGB Conversion ===")
-
-            class TestFollow:
-                def _raw_to_rgb(self, r_raw, g_raw, b_raw, clear_raw):
-                    def extract_int(value):
-                        if isinstance(value, tuple):
-                            return int(value[0]) if len(value) > 0 else 0
-                        return int(value)
-
-                    r_raw = extract_int(r_raw)
-                    g_raw = extract_int(g_raw)
-                    b_raw = extract_int(b_raw)
-                    clear_raw = extract_int(clear_raw)
-
-                    if clear_raw == 0:
-                        return (0, 0, 0)
-
-                    r_ratio = r_raw / clear_raw
-                    g_ratio = g_raw / clear_raw
-                    b_ratio = b_raw / clear_raw
-
-                    max_ratio = max(r_ratio, g_ratio, b_ratio)
-
-                    if max_ratio == 0:
-                        return (0, 0, 0)
-
-                    r = int((r_ratio / max_ratio) * 255)
-                    g = int((g_ratio / max_ratio) * 255)
-                    b = int((b_ratio / max_ratio) * 255)
-
-                    return (
-                        max(0, min(255, r)),
-                        max(0, min(255, g)),
-                        max(0, min(255, b)),
-                    )
-
-            test_sensor = TestFollow()
-            test_cases = [
-                (614, 572, 481, 1644, "Purple test 1"),
-                (319, 313, 277, 851, "Purple test 2"),
-                (800, 400, 200, 1500, "Reddish test"),
-                (200, 800, 300, 1400, "Greenish test"),
-                (300, 400, 900, 1600, "Blueish test"),
-            ]
-
-            for r, g, b, c, description in test_cases:
-                result = test_sensor._raw_to_rgb(r, g, b, c)
-                print(f"{description} ({r}, {g}, {b}, {c}) -> RGB: {result}")
-
-        elif choice in ["2", "3", "4", "5"]:
-            # Create sensor instance for hardware testing
-            try:
-                print("\nInitializing sensor...")
-                sensor = Follow(target_color="orange", standalone=True)
-
-                if choice == "2":
-                    print("\n=== Debug Color Reading ===")
-                    raw_vals, rgb_vals, color_name = sensor.debug_color_reading()
-
-                elif choice == "3":
-                    print("\n=== Single Color Test ===")
-                    available_colors = list(sensor.color_map.keys())
-                    print(f"Available colors: {', '.join(available_colors)}")
-                    color_to_test = (
-                        safe_input("Enter color name to test: ").strip().lower()
-                    )
-                    if color_to_test and color_to_test in available_colors:
-                        sensor.test_single_color(color_to_test)
-                    elif color_to_test:
-                        print(f"Color '{color_to_test}' not found!")
-                    else:
-                        print("No color specified, testing 'terracotta'")
-                        sensor.test_single_color("terracotta")
-
-                elif choice == "4":
-                    print("\n=== Full Color Calibration ===")
-                    updated_map = sensor.test_and_calibrate_colors()
-
-                    # Ask if user wants to save
-                    save_choice = (
-                        safe_input("Save calibration to file? (y/n): ").lower().strip()
-                    )
-                    if save_choice == "y" or save_choice == "":
-                        filename = safe_input(
-                            "Filename (default: color_calibration.py): "
-                        ).strip()
-                        if not filename:
-                            filename = "color_calibration.py"
-                        sensor.save_color_map(filename)
-
-                elif choice == "5":
-                    print("\n=== Load Color Calibration ===")
-                    filename = safe_input(
-                        "Filename (default: color_calibration.py): "
-                    ).strip()
-                    if not filename:
-                        filename = "color_calibration.py"
-                    sensor.load_color_map(filename)
-
-            except Exception as e:
-                print(f"Hardware error: {e}")
-                print("Make sure the sensor is properly connected.")
-
-        else:
-            print("Invalid choice!")
-
-    except KeyboardInterrupt:
-        print("\nExiting...")
-    except Exception as e:
-        print(f"Error: {e}")
@@ -0,0 +1,585 @@
+# filepath: libs/classes/follow_tools.py
+"""Interactive calibration and diagnostic tooling for the Follow class.
+
+None of this is needed while driving, so it is kept out of classes.follow
+and only imported the first time one of these methods is used on a Follow
+instance (see Follow.__getattr__). The methods keep their original names
+and signatures.
+"""
+from typing import Any, Tuple
+
+from classes.follow import Follow, SENSOR_INDEX, TOOLS
+from calibration_store import CALIBRATION_FILE
+
+
+def _safe_input(self, prompt: str = "", timeout_ms: int = 30000) -> str:
+    """Safe input function that handles MicroPython limitations
+
+    Args:
+        prompt: Text to display to user
+        timeout_ms: Timeout in milliseconds (default 30 seconds)
+
+    Returns:
+        str: User input or empty string if failed
+    """
+    if prompt:
+        print(prompt)
+
+    try:
+        # Try standard input first
+        user_input = input()
+        print(f"Received input: '{user_input}'")
+        return user_input
+    except (OSError, KeyboardInterrupt, EOFError) as e:
+        print(f"Input error: {e}")
+        print("Using alternative input method...")
+
+        # Alternative method for MicroPython
+        try:
+            import sys
+            import time
+
+            start_time = time.ticks_ms()
+            result = ""
+
+            print("Press Enter when ready (or wait for timeout)...")
+
+            while True:
+                if time.ticks_diff(time.ticks_ms(), start_time) > timeout_ms:
+                    print("Input timeout reached, proceeding...")
+                    break
+
+                # Simple character-by-character reading
+                try:
+                    char = sys.stdin.read(1) if hasattr(sys.stdin, "read") else None
+                    if char and (char == "\n" or char == "\r"):
+                        break
+                    elif char:
+                        result += char
+                except (OSError, AttributeError):
+                    # If character reading fails, just break
+                    break
+
+                time.sleep_ms(100)  # Small delay
+
+            if result:
+                print(f"Received: '{result}'")
+            return result
+
+        except (ImportError, AttributeError, OSError):
+            # If all input methods fail, use a simple delay
+            print("Input not available - waiting 3 seconds then proceeding...")
+            try:
+                time.sleep(3)
+            except Exception as sleep_error:
+                print(f"Sleep error: {sleep_error}")
+            return ""
+
+    except Exception as e:
+        print(f"Unexpected input error: {e}")
+        print("Proceeding without user input...")
+        return ""
+
+
+def calibrate_white_balance(self, sensor: Any = None) -> Tuple[int, int, int, int]:
+    """Calibrate white balance by reading a white surface
+
+    Args:
+        sensor: The sensor to calibrate (None for standalone mode)
+
+    Returns:
+        Tuple[int, int, int, int]: White balance calibration values (r, g, b, clear)
+    """
+    print("Point sensor at a white surface and press Enter...")
+    self._safe_input()
+
+    if self.standalone:
+        white_values = self.sensor.read()
+    else:
+        white_values = sensor.read()
+
+    print(
+        f"White calibration values: R={white_values[0]}, G={white_values[1]}, B={white_values[2]}, Clear={white_values[3]}"
+    )
+    return white_values
+
+
+def test_and_calibrate_colors(self, sensor: Any = None) -> dict:
+    """Test all colors in the color_map and allow adjustment of RGB values
+
+    This method will guide you through testing each color in your color_map
+    and allow you to update the RGB values based on actual sensor readings.
+
+    Args:
+        sensor: The sensor to use for testing (None for standalone mode)
+
+    Returns:
+        dict: Updated color_map with new RGB values
+    """
+    print("=== Color Calibration Tool ===")
+    print("This tool will help you calibrate each color in your color_map.")
+    print("For each color, point the sensor at that color and press Enter.")
+    print(
+        "You can then choose to update the RGB values or keep the current ones.\n"
+    )
+
+    updated_color_map = self.color_map.copy()
+
+    for color_name, current_rgb in self.color_map.items():
+        print(f"\n--- Testing Color: {color_name.upper()} ---")
+        print(f"Current RGB values: {current_rgb}")
+        print(f"Point the sensor at a {color_name} surface and press Enter...")
+
+        try:
+            self._safe_input()
+
+            # Read current sensor values
+            if self.standalone:
+                raw_values = self.sensor.read()
+            else:
+                raw_values = sensor.read() if sensor else self.middle_sensor.read()
+
+            converted_rgb = self._convert(
+                raw_values[0], raw_values[1], raw_values[2], raw_values[3]
+            )
+            distance_to_current = self._color_distance(converted_rgb, current_rgb)
+
+            print(
+                f"Raw sensor reading: R={raw_values[0]}, G={raw_values[1]}, B={raw_values[2]}, Clear={raw_values[3]}"
+            )
+            print(f"Converted RGB: {converted_rgb}")
+            print(f"Distance to current {color_name}: {distance_to_current:.2f}")
+
+            # Ask if user wants to update
+            while True:
+                choice = (
+                    self._safe_input(
+                        f"Update {color_name} RGB values? (y/n/m for manual): "
+                    )
+                    .lower()
+                    .strip()
+                )
+
+                if choice == "y":
+                    updated_color_map[color_name] = converted_rgb
+                    print(
+                        f"✓ Updated {color_name}: {current_rgb} → {converted_rgb}"
+                    )
+                    break
+                elif choice == "n":
+                    print(f"✓ Kept original {color_name}: {current_rgb}")
+                    break
+                elif choice == "m":
+                    # Manual RGB input
+                    try:
+                        print("Enter RGB values manually (format: r,g,b):")
+                        manual_input = self._safe_input("RGB: ").strip()
+                        if manual_input:
+                            r, g, b = map(int, manual_input.split(","))
+                            manual_rgb = (
+                                max(0, min(255, r)),
+                                max(0, min(255, g)),
+                                max(0, min(255, b)),
+                            )
+                            updated_color_map[color_name] = manual_rgb
+                            print(
+                                f"✓ Manually set {color_name}: {current_rgb} → {manual_rgb}"
+                            )
+                            break
+                        else:
+                            print("No input received, keeping original value")
+                            break
+                    except ValueError:
+                        print("Invalid format. Use: r,g,b (e.g., 255,128,64)")
+                elif choice == "":
+                    # No input received, keep original
+                    print(f"✓ No input - kept original {color_name}: {current_rgb}")
+                    break
+                else:
+                    print("Please enter 'y', 'n', or 'm'")
+
+        except KeyboardInterrupt:
+            print(f"\nSkipping {color_name}...")
+            continue
+        except Exception as e:
+            print(f"Error reading {color_name}: {e}")
+            continue
+
+    print("\n=== Calibration Complete ===")
+    print("Updated color map:")
+    for color_name, rgb_values in updated_color_map.items():
+        old_values = self.color_map[color_name]
+        if rgb_values != old_values:
+            print(f"  {color_name}: {old_values} → {rgb_values} ✓")
+        else:
+            print(f"  {color_name}: {rgb_values} (unchanged)")
+
+    # Ask if user wants to apply changes
+    while True:
+        apply = (
+            self._safe_input("\nApply these changes to the color_map? (y/n): ")
+            .lower()
+            .strip()
+        )
+        if apply == "y":
+            self.color_map = updated_color_map
+            self.rgb_to_color = {v: k for k, v in self.color_map.items()}
+            self._refresh_target()
+            print("✓ Color map updated!")
+            break
+        elif apply == "n" or apply == "":
+            print("✓ Changes discarded, original color map kept.")
+            break
+        else:
+            print("Please enter 'y' or 'n'")
+
+    return updated_color_map
+
+
+def test_single_color(
+    self, color_name: str, sensor: str = None
+) -> Tuple[Tuple[int, int, int, int], Tuple[int, int, int], float]:
+    """Test a single color and compare with current color_map value
+
+    Args:
+        color_name: Name of the color to test
+        sensor: The sensor to use (None for standalone mode)
+
+    Returns:
+        Tuple containing (raw_values, converted_rgb, distance_to_current)
+    """
+    if color_name.lower() not in self.color_map:
+        raise ValueError(
+            f"Color '{color_name}' not found in color_map. Available colors: {list(self.color_map.keys())}"
+        )
+
+    color_name = color_name.lower()
+    current_rgb = self.color_map[color_name]
+
+    print(f"\n--- Testing {color_name.upper()} ---")
+    print(f"Current RGB: {current_rgb}")
+    print(f"Point sensor at {color_name} surface and press Enter...")
+    self._safe_input()
+
+    # Read sensor
+    if self.standalone:
+        raw_values = self.sensor.read()
+    else:
+        if sensor == "left":
+            raw_values = self.left_sensor.read() 
+        if sensor == "middle":
+            raw_values = self.middle_sensor.read() 
+        if sensor == "right":
+            raw_values = self.right_sensor.read() 
+
+    converted_rgb = self._convert(
+        raw_values[0], raw_values[1], raw_values[2], raw_values[3]
+    )
+    distance = self._color_distance(converted_rgb, current_rgb)
+
+    print(
+        f"Raw reading: R={raw_values[0]}, G={raw_values[1]}, B={raw_values[2]}, Clear={raw_values[3]}"
+    )
+    print(f"Converted RGB: {converted_rgb}")
+    print(f"Distance to current: {distance:.2f}")
+    print(f"Match threshold: {self.color_threshold}")
+    print(f"Would match: {'✓ YES' if distance < self.color_threshold else '✗ NO'}")
+
+    return raw_values, converted_rgb, distance
+
+
+def print_color_distances(self, test_rgb: Tuple[int, int, int]) -> None:
+    """Print distances from test_rgb to all colors in color_map
+
+    Args:
+        test_rgb: RGB tuple to compare against all colors
+    """
+    print(f"\nDistances from RGB {test_rgb} to all colors:")
+    print("-" * 50)
+
+    distances = []
+    for color_name, color_rgb in self.color_map.items():
+        distance = self._color_distance(test_rgb, color_rgb)
+        distances.append((distance, color_name, color_rgb))
+
+    # Sort by distance (closest first)
+    distances.sort()
+
+    for distance, color_name, color_rgb in distances:
+        match_status = (
+            "✓ MATCH" if distance < self.color_threshold else "✗ no match"
+        )
+        print(f"  {color_name:12} {color_rgb}: {distance:6.2f} {match_status}")
+
+    closest_color = distances[0][1]
+    print(f"\nClosest color: {closest_color} (distance: {distances[0][0]:.2f})")
+
+
+def debug_color_reading(
+    self, sensor: str = None
+) -> Tuple[Tuple[int, int, int, int], Tuple[int, int, int], str]:
+    """Debug method to show both raw and converted values
+
+    Args:
+        sensor: The sensor to read from (None for standalone mode)
+
+    Returns:
+        Tuple containing (raw_values, converted_rgb, color_name)
+    """
+    if self.standalone:
+        raw_values = self.sensor.read()
+    else:
+        if sensor == "left":
+            raw_values = self.left_sensor.read() 
+        if sensor == "middle":
+            raw_values = self.middle_sensor.read() 
+        if sensor == "right":
+            raw_values = self.right_sensor.read() 
+
+    converted_rgb = self._convert(
+        raw_values[0], raw_values[1], raw_values[2], raw_values[3]
+    )
+    color_name = self.rgb_to_color_name(converted_rgb)
+
+    print(
+        f"Raw ADC values: R={raw_values[0]}, G={raw_values[1]}, B={raw_values[2]}, Clear={raw_values[3]}"
+    )
+    print(f"Converted RGB: {converted_rgb}")
+    print(f"Detected color: {color_name}")
+    print(
+        f"Distance to target ({self.target_color}): {self._color_distance(converted_rgb, self.target_rgb):.2f}"
+    )
+
+    # Show distances to all colors
+    self.print_color_distances(converted_rgb)
+
+    return raw_values, converted_rgb, color_name
+
+
+def test_conversion_algorithms(self) -> None:
+    """Test all three RGB conversion algorithms on current reading"""
+    print("Testing RGB Conversion Algorithms")
+    print("=" * 50)
+
+    try:
+        # Read raw values
+        if self.standalone:
+            raw_values = self.sensor.read()
+        else:
+            raw_values = self.read_raw()
+
+        print(f"Raw ADC values: {raw_values}")
+        r_raw, g_raw, b_raw, clear_raw = raw_values
+
+        # Test each algorithm
+        algorithms = [
+            ("Default (Ratio + Scale)", "_raw_to_rgb"),
+            ("Alternative (Illumination Corrected)", "_raw_to_rgb_alternative"),
+            ("Simple (Direct Scaling)", "_raw_to_rgb_simple"),
+        ]
+
+        for name, method_name in algorithms:
+            print(f"\n{name}:")
+            try:
+                if method_name == "_raw_to_rgb":
+                    rgb = self._raw_to_rgb(r_raw, g_raw, b_raw, clear_raw)
+                elif method_name == "_raw_to_rgb_alternative":
+                    rgb = self._raw_to_rgb_alternative(
+                        r_raw, g_raw, b_raw, clear_raw
+                    )
+                else:  # simple
+                    rgb = self._raw_to_rgb_simple(r_raw, g_raw, b_raw, clear_raw)
+
+                print(f"  RGB: {rgb}")
+
+                # Find closest color and distance
+                closest_color = self._get_closest_color_name(rgb)
+                distance = self._color_distance(rgb, self.color_map[closest_color])
+                print(f"  Closest: {closest_color} (distance: {distance:.2f})")
+
+                if distance <= self.color_threshold:
+                    print(f"  ✓ Match within threshold ({self.color_threshold})")
+                else:
+                    print("  ✗ No match (exceeds threshold)")
+
+            except Exception as e:
+                print(f"  Error: {e}")
+
+        print("\n" + "=" * 50)
+
+    except Exception as e:
+        print(f"Error reading sensor: {e}")
+
+
+def calibrate_range_box(
+    self, color_name: str, samples: int = 20, margin: float = 0.05
+) -> bool:
+    """Fit the range box of a color on all three sensors from raw readings
+
+    Place every sensor on the color before calling this.
+
+    Args:
+        color_name: Color to calibrate (must be in color_map)
+        samples: Readings per sensor
+        margin: Widen each bound by this fraction of the value
+
+    Returns:
+        bool: True if the range box fast path is usable afterwards
+    """
+    for sensor_name, index in SENSOR_INDEX.items():
+        readings = [self.read_raw(sensor_name) for _ in range(samples)]
+        self.range_boxes.fit(color_name.lower(), index, readings, margin)
+    self._update_fast_path()
+    if self.range_boxes.overlaps():
+        print("Warning: range boxes overlap, using color distance matching")
+    return self.use_range_boxes
+
+
+def attach(cls) -> None:
+    """Add the tooling methods listed in classes.follow.TOOLS to <cls>."""
+    namespace = globals()
+    for name in TOOLS:
+        setattr(cls, name, namespace[name])
+
+
+if __name__ == "__main__":
+
+    def safe_input(prompt=""):
+        """Simple safe input for main section"""
+        try:
+            if prompt:
+                print(prompt, end="")
+            return input()
+        except (OSError, KeyboardInterrupt, EOFError) as e:
+            print(f"Input error: {e}")
+            print("Using default values...")
+            return ""
+        except Exception as e:
+            print(f"Unexpected input error: {e}")
+            return ""
+
+    print("=== TCS34725 Color Sensor Testing ===")
+    print("Choose a testing mode:")
+    print("1. Test raw-to-RGB conversion (no hardware needed)")
+    print("2. Debug single color reading (requires hardware)")
+    print("3. Test single color calibration (requires hardware)")
+    print("4. Full color calibration (requires hardware)")
+    print("5. Load saved color calibration")
+
+    try:
+        choice = safe_input("Enter choice (1-5): ").strip()
+        if not choice:
+            choice = "1"  # Default to option 1 if no input
+
+        if choice == "1":
+            # Test the conversion without requiring hardware
+            print("\n=== Testing Raw-to-RGB Conversion ===")
+
+            class TestFollow:
+                def _raw_to_rgb(self, r_raw, g_raw, b_raw, clear_raw):
+                    def extract_int(value):
+                        if isinstance(value, tuple):
+                            return int(value[0]) if len(value) > 0 else 0
+                        return int(value)
+
+                    r_raw = extract_int(r_raw)
+                    g_raw = extract_int(g_raw)
+                    b_raw = extract_int(b_raw)
+                    clear_raw = extract_int(clear_raw)
+
+                    if clear_raw == 0:
+                        return (0, 0, 0)
+
+                    r_ratio = r_raw / clear_raw
+                    g_ratio = g_raw / clear_raw
+                    b_ratio = b_raw / clear_raw
+
+                    max_ratio = max(r_ratio, g_ratio, b_ratio)
+
+                    if max_ratio == 0:
+                        return (0, 0, 0)
+
+                    r = int((r_ratio / max_ratio) * 255)
+                    g = int((g_ratio / max_ratio) * 255)
+                    b = int((b_ratio / max_ratio) * 255)
+
+                    return (
+                        max(0, min(255, r)),
+                        max(0, min(255, g)),
+                        max(0, min(255, b)),
+                    )
+
+            test_sensor = TestFollow()
+            test_cases = [
+                (614, 572, 481, 1644, "Purple test 1"),
+                (319, 313, 277, 851, "Purple test 2"),
+                (800, 400, 200, 1500, "Reddish test"),
+                (200, 800, 300, 1400, "Greenish test"),
+                (300, 400, 900, 1600, "Blueish test"),
+            ]
+
+            for r, g, b, c, description in test_cases:
+                result = test_sensor._raw_to_rgb(r, g, b, c)
+                print(f"{description} ({r}, {g}, {b}, {c}) -> RGB: {result}")
+
+        elif choice in ["2", "3", "4", "5"]:
+            # Create sensor instance for hardware testing
+            try:
+                print("\nInitializing sensor...")
+                sensor = Follow(target_color="orange", standalone=True)
+
+                if choice == "2":
+                    print("\n=== Debug Color Reading ===")
+                    raw_vals, rgb_vals, color_name = sensor.debug_color_reading()
+
+                elif choice == "3":
+                    print("\n=== Single Color Test ===")
+                    available_colors = list(sensor.color_map.keys())
+                    print(f"Available colors: {', '.join(available_colors)}")
+                    color_to_test = (
+                        safe_input("Enter color name to test: ").strip().lower()
+                    )
+                    if color_to_test and color_to_test in available_colors:
+                        sensor.test_single_color(color_to_test)
+                    elif color_to_test:
+                        print(f"Color '{color_to_test}' not found!")
+                    else:
+                        print("No color specified, testing 'terracotta'")
+                        sensor.test_single_color("terracotta")
+
+                elif choice == "4":
+                    print("\n=== Full Color Calibration ===")
+                    updated_map = sensor.test_and_calibrate_colors()
+
+                    # Ask if user wants to save
+                    save_choice = (
+                        safe_input("Save calibration to file? (y/n): ").lower().strip()
+                    )
+                    if save_choice == "y" or save_choice == "":
+                        filename = safe_input(
+                            f"Filename (default: {CALIBRATION_FILE}): "
+                        ).strip()
+                        if not filename:
+                            filename = CALIBRATION_FILE
+                        sensor.save_color_map(filename)
+
+                elif choice == "5":
+                    print("\n=== Load Color Calibration ===")
+                    filename = safe_input(
+                        f"Filename (default: {CALIBRATION_FILE}): "
+                    ).strip()
+                    if not filename:
+                        filename = CALIBRATION_FILE
+                    sensor.load_color_map(filename)
+
+            except Exception as e:
+                print(f"Hardware error: {e}")
+                print("Make sure the sensor is properly connected.")
+
+        else:
+            print("Invalid choice!")
+
+    except KeyboardInterrupt:
+        print("\nExiting...")
+    except Exception as e:
+        print(f"Error: {e}")
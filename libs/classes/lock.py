@@ -1,3 +1,10 @@
+import _thread
+import time
+
+# guards the lazy creation of the per-object locks
+_alloc_lock = _thread.allocate_lock()
+
+
 class ContextManaged:
     """ An object that automaticall deinitializes hardware with a context manager."""
 
@@ -12,18 +19,46 @@ class ContextManaged:
         return
 
 class Lockable(ContextManaged):
-    """ An object that must be locked to prevent collisions on microcontroller resource. """
+    """ An object that must be locked to prevent collisions on microcontroller resource.
+        Backed by a _thread lock, so it also holds between the two cores.
+    """
+
+    _lock = None
+
+    def _get_lock(self):
+        lock = self._lock
+        if lock is None:
+            # subclasses don't call __init__, create the lock on first use
+            with _alloc_lock:
+                if self._lock is None:
+                    self._lock = _thread.allocate_lock()
+                lock = self._lock
+        return lock
+
+    @property
+    def _locked(self):
+        return self._get_lock().locked()
 
-    _locked = False
-    
     def try_lock(self):
         """ Attempt to grab the lock. Return True on success, False if the lock is already taken. """
-        if self._locked:
-            return False
-        self._locked = True
+        return self._get_lock().acquire(0)
+
+    def lock(self, timeout=-1):
+        """ Wait for the lock, at most <timeout> seconds (-1 waits forever). Return True on success. """
+        lock = self._get_lock()
+        if timeout < 0:
+            return lock.acquire(1)
+        # MicroPython's acquire() has no timeout, poll until the deadline
+        start = time.ticks_ms()
+        timeout_ms = int(timeout * 1000)
+        while not lock.acquire(0):
+            if time.ticks_diff(time.ticks_ms(), start) >= timeout_ms:
+                return False
+            time.sleep_ms(1)
         return True
-    
+
     def unlock(self):
         """ Release the lock so others may use the resource. """
-        if self._locked:
-            self._locked = False
+        lock = self._get_lock()
+        if lock.locked():
+            lock.release()
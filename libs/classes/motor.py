@@ -5,6 +5,9 @@ def mapping(x, in_min, in_max, out_min, out_max):
     return (x - in_min) * (out_max - out_min) / (in_max - in_min) + out_min
 
 class Motor():
+    # LatencyTrace told about every duty change, None = off
+    trace = None
+
     def __init__(self, pin_a, pin_b, dir=1):
         self.pwm1 = PWM(Pin(pin_a, Pin.OUT))
         self.pwm2 = PWM(Pin(pin_b, Pin.OUT))
@@ -12,8 +15,10 @@ class Motor():
         self.pwm2.freq(20000)
         self.dir = dir
         self.current_power = 0
+        self.target_power = 0   # set by motors.py, where a ramp is heading
 
     def run(self, power:int):
+        old = self.current_power
         self.current_power = power
         if power == 0:
             self.pwm1.duty_u16(0xffff)
@@ -28,6 +33,8 @@ class Motor():
             else:
                 self.pwm1.duty_u16(0xffff)
                 self.pwm2.duty_u16(0xffff - value)
+        if self.trace is not None and power != old:
+            self.trace.actuated(self, old, power)
 
 
 
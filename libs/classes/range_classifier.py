@@ -0,0 +1,106 @@
+from array import array
+
+CHANNELS = 4  # red, green, blue, clear
+EMPTY_LO = 0xFFFF  # lo > hi, an undefined box never matches
+
+
+class RangeBoxClassifier():
+    """ Per-colour, per-sensor range boxes on raw (r, g, b, clear) values.
+        Bounds are kept in two flat array('H') buffers indexed by
+        ((color * sensors) + sensor) * 4 + channel, so classify() runs
+        without allocating and returns a bitmask with bit i set when the
+        reading lies inside the box of colors[i].
+    """
+    def __init__(self, colors, sensors=3):
+        self.colors = list(colors)
+        self.sensors = sensors
+        self.n_colors = len(self.colors)
+        size = self.n_colors * sensors * CHANNELS
+        self.lo = array('H', [EMPTY_LO] * size)
+        self.hi = array('H', [0] * size)
+
+    def bit(self, color):
+        """ return the mask bit of <color>, 0 if the colour is unknown """
+        if color in self.colors:
+            return 1 << self.colors.index(color)
+        return 0
+
+    def set_box(self, color, lo, hi, sensor=None):
+        """ set the box of <color> on <sensor> (None for every sensor) """
+        i = self.colors.index(color)
+        sensors = range(self.sensors) if sensor is None else (sensor,)
+        for s in sensors:
+            base = (i * self.sensors + s) * CHANNELS
+            for c in range(CHANNELS):
+                self.lo[base + c] = max(0, min(0xFFFF, int(lo[c])))
+                self.hi[base + c] = max(0, min(0xFFFF, int(hi[c])))
+
+    def fit(self, color, sensor, samples, margin=0.05):
+        """ set the box of <color> on <sensor> to the bounding box of the
+            raw <samples>, widened by <margin> (fraction of each value) """
+        lo = [min(s[c] for s in samples) for c in range(CHANNELS)]
+        hi = [max(s[c] for s in samples) for c in range(CHANNELS)]
+        lo = [v - v * margin for v in lo]
+        hi = [v + v * margin for v in hi]
+        self.set_box(color, lo, hi, sensor)
+
+    def has_box(self, color):
+        """ True if <color> has a box on every sensor """
+        i = self.colors.index(color) if color in self.colors else -1
+        if i < 0:
+            return False
+        for s in range(self.sensors):
+            base = (i * self.sensors + s) * CHANNELS
+            if self.lo[base] > self.hi[base]:
+                return False
+        return True
+
+    def classify(self, sensor, raw):
+        """ return the bitmask of all colours whose box on <sensor> contains <raw> """
+        lo = self.lo
+        hi = self.hi
+        r, g, b, c = raw
+        stride = self.sensors * CHANNELS
+        j = sensor * CHANNELS
+        mask = 0
+        for i in range(self.n_colors):
+            if (lo[j] <= r <= hi[j] and lo[j + 1] <= g <= hi[j + 1]
+                    and lo[j + 2] <= b <= hi[j + 2] and lo[j + 3] <= c <= hi[j + 3]):
+                mask |= 1 << i
+            j += stride
+        return mask
+
+    def overlaps(self):
+        """ True if any two colour boxes intersect on the same sensor """
+        lo = self.lo
+        hi = self.hi
+        for s in range(self.sensors):
+            for a in range(self.n_colors):
+                ja = (a * self.sensors + s) * CHANNELS
+                if lo[ja] > hi[ja]:
+                    continue
+                for b in range(a + 1, self.n_colors):
+                    jb = (b * self.sensors + s) * CHANNELS
+                    if lo[jb] > hi[jb]:
+                        continue
+                    for c in range(CHANNELS):
+                        if lo[ja + c] > hi[jb + c] or lo[jb + c] > hi[ja + c]:
+                            break
+                    else:
+                        return True
+        return False
+
+    def to_tables(self):
+        """ return the bounds as calibration store tables """
+        return {"box_lo": self.lo, "box_hi": self.hi}
+
+    def load_tables(self, tables):
+        """ load bounds from calibration store tables, return False if they
+            are missing or do not match the colour and sensor count """
+        lo = tables.get("box_lo")
+        hi = tables.get("box_hi")
+        if lo is None or hi is None or len(lo) != len(self.lo) or len(hi) != len(self.hi):
+            return False
+        self.lo = array('H', lo)
+        self.hi = array('H', hi)
+        return True
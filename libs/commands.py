@@ -0,0 +1,61 @@
+'''
+Diff-based decoder for the app control packets.
+
+The app sends the full widget state in every packet. CommandDecoder keeps
+the last applied value per key and only calls a key's handler when the
+value changed. Level keys (throttle, d-pad) are applied on every packet.
+A handler returns False if it could not apply the value yet (e.g. the car
+is not started), the key is then tried again with the next packet.
+'''
+
+# value passed to a handler when the packet lacks its key, not None: the app
+# sends null for a released widget
+MISSING = object()
+
+
+class CommandDecoder():
+    def __init__(self, table):
+        """ <table>: (key, handler, level) in apply order, handler(value) -> applied """
+        self.table = tuple(table)
+        self.level = tuple((key, handler) for key, handler, level in self.table if level)
+        # keys applied only on a change, a packet that changes one must not be skipped
+        self.edges = tuple(key for key, handler, level in self.table if not level)
+        self.last = {}
+        self.last_data = None
+        self.pending = False   # a handler asked to be retried
+        self.calls = 0         # handler calls
+        self.skipped = 0       # unchanged keys not dispatched
+
+    def apply(self, data):
+        get = data.get
+        if not self.pending and data == self.last_data:
+            # same packet as before (the usual case), only the level keys
+            for key, handler in self.level:
+                handler(get(key, MISSING))
+            self.calls += len(self.level)
+            self.skipped += len(self.table) - len(self.level)
+            return
+
+        last = self.last
+        self.pending = False
+        pending = False
+        for key, handler, level in self.table:
+            value = get(key, MISSING)
+            if not level and key in last and last[key] == value:
+                self.skipped += 1
+                continue
+            self.calls += 1
+            if handler(value) is False:
+                pending = True
+            else:
+                last[key] = value
+        if pending:
+            self.pending = True
+        self.last_data = data
+
+    def forget(self, *keys):
+        """ apply <keys> again with the next packet, even if unchanged """
+        for key in keys:
+            if key in self.last:
+                del self.last[key]
+        self.pending = True
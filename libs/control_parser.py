@@ -0,0 +1,163 @@
+'''
+Fast-path decoder for the app's control packets on the text link.
+
+The SunFounder Controller sends one JSON object per line with the
+single letter keys A..S and values true/false/null, integers or plain
+strings. ControlParser splits the line on "," and only converts the
+items that changed since the last line, straight into a preallocated
+list of slots. Everything else (floats, lists, escapes, other keys, a
+double encoded string) returns None, the caller falls back to json.loads():
+
+    parser = ControlParser()
+    data = parser.decode(line)      # ControlSlots, or None
+    if data is None:
+        data = json.loads(line)
+    data.get('Q')
+
+ControlSlots reads like the dict json.loads() returns. decode() fills
+three of them in turn, skipping the one returned last and the one in
+kept: the caller sets kept to the packet it applied, so
+CommandDecoder.apply() can compare the next packet with it even when
+packets are decoded and dropped in between. An unchanged line returns
+the same ControlSlots again.
+'''
+from framing import CONTROL_KEYS
+
+MISSING = object()
+
+# '"A"' -> slot, the key as it appears in the line
+QUOTED = {}
+# 'A' -> slot
+INDEX = {}
+for i in range(len(CONTROL_KEYS)):
+    QUOTED['"%s"' % CONTROL_KEYS[i]] = i
+    INDEX[CONTROL_KEYS[i]] = i
+
+CONSTANTS = {"true": True, "false": False, "null": None}
+
+
+class ControlSlots():
+    """ a decoded packet in preallocated slots, read like a dict """
+    def __init__(self):
+        self.values = [None] * len(CONTROL_KEYS)
+        self.present = 0        # bit i: CONTROL_KEYS[i] was in the packet
+        self.line = None        # the line it was decoded from
+
+    def get(self, key, default=None):
+        i = INDEX.get(key)
+        if i is None or not self.present & (1 << i):
+            return default
+        return self.values[i]
+
+    def __getitem__(self, key):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self.get(key, MISSING) is not MISSING
+
+    def __eq__(self, other):
+        if isinstance(other, ControlSlots):
+            # the same line, decoded twice
+            return self.line == other.line
+        if isinstance(other, dict):
+            return self.dict() == other
+        return False
+
+    def dict(self):
+        return {CONTROL_KEYS[i]: self.values[i]
+                for i in range(len(CONTROL_KEYS)) if self.present & (1 << i)}
+
+    def __repr__(self):
+        return repr(self.dict())
+
+
+class ControlParser():
+    def __init__(self):
+        self.values = [None] * len(CONTROL_KEYS)
+        self.slot_of = [0] * len(CONTROL_KEYS)     # item position -> slot
+        self.items = None       # the items of the last line
+        self.present = 0
+        self.line = None
+        self.slots = (ControlSlots(), ControlSlots(), ControlSlots())
+        self.current = None     # the ControlSlots returned last
+        self.kept = None        # set by the caller: not reused by decode()
+        self.decoded = 0
+        self.repeated = 0       # same line as before, same ControlSlots returned
+        self.fallbacks = 0      # lines left to json.loads()
+
+    def _parse(self, items, prev):
+        """ convert the items that differ from <prev>, return the present bits or -1 """
+        values = self.values
+        slot_of = self.slot_of
+        present = self.present if prev is not None else 0
+        for j in range(len(items)):
+            item = items[j]
+            if prev is not None and item == prev[j]:
+                continue
+            key, sep, value = item.partition(":")
+            i = QUOTED.get(key.strip())
+            if i is None or not sep:
+                return -1
+            if prev is not None and slot_of[j] != i:
+                # another key order
+                return -1
+            value = value.strip()
+            v = CONSTANTS.get(value, MISSING)
+            if v is MISSING:
+                if value[:1] == '"':
+                    if len(value) < 2 or value[-1] != '"':
+                        return -1
+                    v = value[1:-1]
+                else:
+                    try:
+                        v = int(value)
+                    except ValueError:
+                        return -1
+            values[i] = v
+            slot_of[j] = i
+            present |= 1 << i
+        return present
+
+    def decode(self, line):
+        """ the ControlSlots of <line>, None if it needs json.loads() """
+        if line == self.line and self.current is not None:
+            self.repeated += 1
+            return self.current
+        if not (line.startswith("{") and line.endswith("}")) or "\\" in line:
+            self.fallbacks += 1
+            return None
+        items = line[1:-1].split(",")
+        if len(items) > len(CONTROL_KEYS):
+            self.fallbacks += 1
+            return None
+        prev = self.items
+        if prev is not None and len(prev) != len(items):
+            prev = None
+        present = self._parse(items, prev)
+        if present < 0 and prev is not None:
+            present = self._parse(items, None)
+        if present < 0:
+            self.items = None
+            self.line = None
+            self.current = None
+            self.fallbacks += 1
+            return None
+        self.items = items
+        self.present = present
+        self.line = line
+        for slots in self.slots:
+            if slots is not self.current and slots is not self.kept:
+                break
+        slots.values[:] = self.values
+        slots.present = present
+        slots.line = line
+        self.current = slots
+        self.decoded += 1
+        return slots
+
+    def describe(self):
+        return "control parser: %d decoded, %d repeated, %d to json.loads()" % (
+            self.decoded, self.repeated, self.fallbacks)
@@ -0,0 +1,254 @@
+'''
+Binary framing between the Pico and the ESP8266 bridge.
+
+The text link sends every packet as a JSON line (WS+{...}\\n, ~150
+bytes). In binary mode the WS traffic is framed instead:
+
+    0xA5 | type | length | payload (length bytes) | CRC-16/CCITT-FALSE
+
+The CRC (little endian) covers type, length and payload. Frame types:
+
+    CONTROL    ESP -> Pico  the app packet, struct-packed (CONTROL_FORMAT)
+    TEXT       ESP -> Pico  a text line ([OK] ..., [CONNECTED] ...)
+    TELEMETRY  Pico -> ESP  the fixed telemetry fields (TELEMETRY_FORMAT)
+    JSON       Pico -> ESP  any other changed field as a JSON object
+
+The app keeps talking JSON, the ESP packs and unpacks it. The same
+functions pack the ESP side in tools/esp_bridge.py.
+'''
+import struct
+import json
+
+SYNC = 0xA5
+HEADER = 3
+CRC_SIZE = 2
+MAX_PAYLOAD = 255
+
+CONTROL = 1
+TEXT = 2
+TELEMETRY = 3
+JSON = 4
+
+# app widget keys, a bool value of key i is bit i of the control frame
+CONTROL_KEYS = "ABCDEFGHIJKLMNOPQRS"
+THROTTLE_KEY = 'Q'
+DIRECTION_KEY = 'K'
+DIRECTIONS = (None, "forward", "backward", "left", "right", "stop")
+# present mask, bool values, null mask (the key was sent as null), throttle,
+# direction index
+CONTROL_FORMAT = "<IIIbB"
+Q_BIT = 1 << CONTROL_KEYS.index(THROTTLE_KEY)
+K_BIT = 1 << CONTROL_KEYS.index(DIRECTION_KEY)
+
+# B speed (cm/s * 100), C mileage (mm), D sonar angle and distance, J line colour
+TELEMETRY_FIELDS = ('B', 'C', 'D', 'J')
+TELEMETRY_FORMAT = "<hIhhB"
+
+
+def _crc_table():
+    table = []
+    for i in range(256):
+        crc = i << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021 if crc & 0x8000 else crc << 1) & 0xFFFF
+        table.append(crc)
+    return tuple(table)
+
+CRC_TABLE = _crc_table()
+
+
+def crc16(data, crc=0xFFFF):
+    table = CRC_TABLE
+    for b in data:
+        crc = ((crc << 8) & 0xFFFF) ^ table[(crc >> 8) ^ b]
+    return crc
+
+
+def pack_frame(buf, kind, payload, n=0):
+    """ write a frame of <kind> around <payload> into <buf> at <n>, return the end """
+    length = len(payload)
+    if length > MAX_PAYLOAD:
+        raise ValueError("frame payload too long: %d" % length)
+    end = n + HEADER + length
+    buf[n] = SYNC
+    buf[n + 1] = kind
+    buf[n + 2] = length
+    buf[n + HEADER:end] = payload
+    struct.pack_into("<H", buf, end, crc16(memoryview(buf)[n + 1:end]))
+    return end + CRC_SIZE
+
+
+def frame(kind, payload):
+    """ a frame as new bytes, for the rare frames and the host side """
+    buf = bytearray(HEADER + len(payload) + CRC_SIZE)
+    pack_frame(buf, kind, payload)
+    return bytes(buf)
+
+
+def pack_control(data):
+    """ the payload of a CONTROL frame for the app packet <data> (ESP side) """
+    present = 0
+    values = 0
+    nulls = 0
+    throttle = 0
+    direction = 0
+    for i in range(len(CONTROL_KEYS)):
+        key = CONTROL_KEYS[i]
+        value = data.get(key)
+        if isinstance(value, bool):
+            present |= 1 << i
+            if value:
+                values |= 1 << i
+        elif value is None and key in data:
+            # null is a value too, e.g. "K": null releases the d-pad
+            present |= 1 << i
+            nulls |= 1 << i
+    value = data.get(THROTTLE_KEY)
+    if isinstance(value, int) and not isinstance(value, bool):
+        present |= Q_BIT
+        throttle = max(-128, min(127, value))
+    value = data.get(DIRECTION_KEY)
+    if isinstance(value, str):
+        present |= K_BIT
+        direction = DIRECTIONS.index(value) if value in DIRECTIONS else DIRECTIONS.index("stop")
+    return struct.pack(CONTROL_FORMAT, present, values, nulls, throttle, direction)
+
+
+def unpack_telemetry(payload):
+    """ the app fields of a TELEMETRY payload (ESP side) """
+    speed, mileage, angle, distance, line = struct.unpack(TELEMETRY_FORMAT, payload)
+    return {'B': speed / 100, 'C': mileage / 1000, 'D': [angle, distance], 'J': line}
+
+
+class ControlDecoder():
+    """ CONTROL payloads to the dict the app sent, without JSON parsing """
+    def __init__(self):
+        self.last = b""
+        self.data = None
+        self.decoded = 0
+        self.repeated = 0       # same payload as before, same dict returned
+
+    def decode(self, payload):
+        raw = bytes(payload)
+        if raw == self.last and self.data is not None:
+            # CommandDecoder.apply() then takes its unchanged packet path
+            self.repeated += 1
+            return self.data
+        present, values, nulls, throttle, direction = struct.unpack(CONTROL_FORMAT, raw)
+        data = {}
+        for i in range(len(CONTROL_KEYS)):
+            if present & (1 << i):
+                data[CONTROL_KEYS[i]] = None if nulls & (1 << i) else bool(values & (1 << i))
+        if present & Q_BIT and not nulls & Q_BIT:
+            data[THROTTLE_KEY] = throttle
+        if present & K_BIT and not nulls & K_BIT:
+            data[DIRECTION_KEY] = DIRECTIONS[direction] if direction < len(DIRECTIONS) else "stop"
+        self.last = raw
+        self.data = data
+        self.decoded += 1
+        return data
+
+
+class FrameReader():
+    """ Non-blocking frame parser on the UART, resyncs on the next SYNC byte after an error """
+    def __init__(self, uart, size=512):
+        self.uart = uart
+        self.size = size
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.start = 0
+        self.end = 0
+        self.frames = 0
+        self.crc_errors = 0
+        self.skipped = 0        # bytes thrown away while looking for SYNC
+        self.dropped = 0        # bytes lost to a full buffer
+
+    def poll(self):
+        n = self.uart.any()
+        if not n:
+            return 0
+        if self.start and self.end + n > self.size:
+            # move the unparsed bytes to the front
+            left = self.end - self.start
+            self.mv[0:left] = self.mv[self.start:self.end]
+            self.start = 0
+            self.end = left
+        free = self.size - self.end
+        got = self.uart.readinto(self.mv[self.end:self.size], min(n, free)) or 0
+        self.end += got
+        if n > free:
+            self.dropped += self.uart.readinto(bytearray(n - free), n - free) or 0
+        return got
+
+    def pending(self):
+        return self.end - self.start + self.uart.any()
+
+    def read(self):
+        """ (kind, payload memoryview) of the next complete frame or None,
+            the payload is valid until the next read() """
+        self.poll()
+        buf = self.buf
+        while self.end - self.start >= HEADER:
+            s = self.start
+            if buf[s] != SYNC:
+                self.start += 1
+                self.skipped += 1
+                continue
+            end = s + HEADER + buf[s + 2]
+            if end + CRC_SIZE > self.end:
+                return None
+            crc = buf[end] | buf[end + 1] << 8
+            if crc16(self.mv[s + 1:end]) != crc:
+                self.crc_errors += 1
+                self.start += 1
+                continue
+            self.start = end + CRC_SIZE
+            if self.start == self.end:
+                self.start = self.end = 0
+            self.frames += 1
+            return buf[s + 1], self.mv[s + HEADER:end]
+        return None
+
+    def describe(self):
+        return "uart rx frames: %d frames, %d crc errors, %d bytes skipped, %d dropped" % (
+            self.frames, self.crc_errors, self.skipped, self.dropped)
+
+
+class TelemetryFramer():
+    """ send_dict to TELEMETRY (+ JSON for the other changed fields) frames """
+    def __init__(self, size=64):
+        self.payload = bytearray(struct.calcsize(TELEMETRY_FORMAT))
+        self.out = bytearray(size)
+        self.out_mv = memoryview(self.out)
+        self.include = None
+        self.other = self._other      # bound once, called per field
+
+    def _other(self, key):
+        return key not in TELEMETRY_FIELDS and (self.include is None or self.include(key))
+
+    def encode(self, d, include=None):
+        """ the frames for SendDict <d> into out, return their length """
+        get = d.get
+        sonar = get('D') or (0, 0)
+        struct.pack_into(TELEMETRY_FORMAT, self.payload, 0,
+                         int(get('B', 0) * 100), int(get('C', 0) * 1000),
+                         int(sonar[0]), int(sonar[1]), get('J', 0))
+        d.clear_changed(TELEMETRY_FIELDS)
+        n = pack_frame(self.out, TELEMETRY, self.payload)
+        self.include = include
+        if d.head_changed or d.any_changed(self.other):
+            # the constant fields once, e.g. the stage timing or the latency echo
+            length = d.encode(b"", self.other, head=d.head_changed) - 1
+            payload = d.out_mv[0:length]
+            if len(self.out) < n + HEADER + length + CRC_SIZE:
+                out = bytearray(n + HEADER + length + CRC_SIZE)
+                out[0:n] = self.out_mv[0:n]
+                self.out = out
+                self.out_mv = memoryview(out)
+            n = pack_frame(self.out, JSON, payload, n)
+        return n
+
+
+def json_payload(payload):
+    """ the fields of a JSON frame (ESP side) """
+    return json.loads(bytes(payload))
@@ -0,0 +1,97 @@
+'''
+Command to actuation latency.
+
+A LatencyTrace is stamped with time.ticks_us() at three points of a
+packet's way through the car:
+
+    received()   WS_Server read the control packet it applies
+    decoded()    on_receive() got the decoded packet
+    actuated()   a Motor.run() changed the PWM duty
+
+motors.py calls targets_set() when new target powers are set. The first
+duty change after that which moves a motor toward its target closes the
+packet, the three intervals go into a StageStats histogram. Rewriting
+the same duty (the idle stop() of every control period), a ramp toward
+a target set before the packet and a watchdog halt() don't count. A
+packet that is followed by the next one before such a change is counted
+as unactuated. With an echo key the
+last packet's value of that key and its rx to PWM time are sent back in
+send_dict, so the app can match them and measure the round trip.
+'''
+import time
+
+from stage_stats import StageStats
+
+STAGES = ("rx_decode", "decode_pwm", "rx_pwm")
+
+
+class LatencyTrace():
+    def __init__(self, echo_key=None):
+        self.stats = StageStats(STAGES)
+        self.echo_key = echo_key
+        self.rx_us = 0
+        self.decode_us = 0
+        self.pending = False       # decoded, no duty change yet
+        self.targeted = False      # target powers set since the decode
+        self.packets = 0
+        self.actuated_packets = 0
+        self.unactuated = 0        # replaced by the next packet before a duty write
+        self.echo_value = None
+        self.last_us = -1          # rx to PWM of the last actuated packet
+
+    def received(self, rx_us=None):
+        """ <rx_us>: when the packet was read, if it waited (e.g. held for coalescing) """
+        self.rx_us = time.ticks_us() if rx_us is None else rx_us
+
+    def decoded(self, data=None):
+        now = time.ticks_us()
+        if self.pending:
+            self.unactuated += 1
+        self.stats.add(0, time.ticks_diff(now, self.rx_us))
+        self.decode_us = now
+        self.pending = True
+        self.targeted = False
+        self.packets += 1
+        if self.echo_key is not None and data is not None:
+            self.echo_value = data.get(self.echo_key, self.packets)
+
+    def targets_set(self):
+        """ motors.py set new target powers, allocation free """
+        if self.pending:
+            self.targeted = True
+
+    def targets_halted(self):
+        """ the watchdog zeroed the targets, that is not the packet's doing """
+        self.targeted = False
+
+    def actuated(self, motor, old, power):
+        """ Motor.run() hook for a duty change from <old> to <power>, allocation free
+            so it may run in a timer callback
+        """
+        if not self.targeted:
+            return
+        target = motor.target_power
+        if abs(target - power) >= abs(target - old):
+            # away from the target, or not closer
+            return
+        now = time.ticks_us()
+        self.pending = False
+        self.targeted = False
+        self.actuated_packets += 1
+        self.stats.add(1, time.ticks_diff(now, self.decode_us))
+        self.last_us = time.ticks_diff(now, self.rx_us)
+        self.stats.add(2, self.last_us)
+
+    def publish(self, send_dict):
+        """ put [echoed value, rx to PWM us] into send_dict if an echo key is set """
+        if self.echo_key is not None:
+            send_dict[self.echo_key] = [self.echo_value, self.last_us]
+
+    def describe(self):
+        return "latency: %d packets, %d actuated, %d unactuated, rx->pwm p50 %d p99 %d max %d us" % (
+            self.packets, self.actuated_packets, self.unactuated,
+            self.stats.percentile(2, 50), self.stats.percentile(2, 99), self.stats.max_us[2])
+
+    def dump(self, f):
+        f.write("\n> %s" % self.describe())
+        self.stats.dump(f)
@@ -0,0 +1,182 @@
+'''
+Non-blocking line reader for the ESP8266 UART.
+
+poll() moves the bytes uart.any() reports into a preallocated ring
+buffer with readinto(), so it never waits for a UART timeout.
+readline() scans the new bytes for b"\\n" through a memoryview and copies
+a complete line into a preallocated line buffer:
+
+    reader = LineReader(uart)
+    line = reader.readline()   # memoryview without the line end, or None
+
+The returned view is only valid until the next poll() or readline().
+Bytes that arrive while the ring is full are dropped and counted, a
+line longer than the ring is dropped as a whole.
+
+With start_irq() the UART RX idle interrupt calls poll() instead, and
+readline() no longer touches the UART. ready() then tells without a scan
+whether a complete line is waiting. The interrupt only moves the write
+position and readline() only the read position, so the two never need a
+lock. Both positions run modulo twice the ring size to tell a full ring
+from an empty one.
+'''
+NEWLINE = 10
+CR = 13
+
+
+class LineReader():
+    def __init__(self, uart, size=1024):
+        self.uart = uart
+        self.size = size
+        self.wrap = 2 * size
+        self.buf = bytearray(size)
+        self.mv = memoryview(self.buf)
+        self.line = bytearray(size)
+        self.line_mv = memoryview(self.line)
+        self.scratch = bytearray(32)    # overflow bytes are read into it and dropped
+        self.written = 0     # producer: bytes into the ring, modulo wrap
+        self.consumed = 0    # consumer: bytes out of the ring, modulo wrap
+        self.complete = 0    # producer: end of the newest complete line, modulo wrap
+        self.scanned = 0     # bytes after the read position known to hold no newline
+        self.rx_dropped = 0     # producer: ring full
+        self.line_dropped = 0   # consumer: line longer than the ring
+        self.high_water = 0
+        self.lines = 0
+        self.irq = False
+        self.irqs = 0
+        self._handler = self._on_rx
+
+    @property
+    def dropped(self):
+        return self.rx_dropped + self.line_dropped
+
+    @property
+    def count(self):
+        """ bytes in the ring """
+        return (self.written - self.consumed) % self.wrap
+
+    def poll(self):
+        """ move the pending UART bytes into the ring, return the number moved """
+        n = self.uart.any()
+        if not n:
+            return 0
+        size = self.size
+        free = size - self.count
+        excess = n - free if n > free else 0
+        n -= excess
+        written = self.written
+        moved = 0
+        while n > 0:
+            head = written % size
+            end = size if head + n > size else head + n
+            got = self.uart.readinto(self.mv[head:end], end - head) or 0
+            if not got:
+                break
+            written = (written + got) % self.wrap
+            moved += got
+            n -= got
+        self.written = written
+        if moved:
+            # the newest newline, usually the last byte received
+            buf = self.buf
+            i = written
+            for _ in range(moved):
+                i = (i - 1) % self.wrap
+                if buf[i % size] == NEWLINE:
+                    self.complete = (i + 1) % self.wrap
+                    break
+        while excess > 0:
+            # no room left: the newest bytes are thrown away
+            got = self.uart.readinto(self.scratch, min(excess, len(self.scratch))) or 0
+            if not got:
+                break
+            self.rx_dropped += got
+            excess -= got
+        count = self.count
+        if count > self.high_water:
+            self.high_water = count
+        return moved
+
+    def _on_rx(self, uart):
+        self.irqs += 1
+        self.poll()
+
+    def start_irq(self):
+        """ fill the ring from the UART RX idle interrupt, False if the port has none """
+        try:
+            self.uart.irq(handler=self._handler, trigger=self.uart.IRQ_RXIDLE)
+        except (AttributeError, TypeError, ValueError):
+            return False
+        self.irq = True
+        self.poll()     # bytes that came before the handler
+        return True
+
+    def stop_irq(self):
+        if self.irq:
+            self.uart.irq(handler=None)
+            self.irq = False
+
+    def ready(self):
+        """ True if a complete line is waiting (after the last poll) """
+        consumed = self.consumed
+        done = (self.complete - consumed) % self.wrap
+        return 0 < done <= (self.written - consumed) % self.wrap
+
+    def _find_newline(self, count):
+        """ offset of the next newline after the read position, -1 if there is none yet """
+        buf = self.mv
+        size = self.size
+        i = self.scanned
+        pos = (self.consumed + i) % size
+        while i < count:
+            if buf[pos] == NEWLINE:
+                return i
+            i += 1
+            pos += 1
+            if pos == size:
+                pos = 0
+        self.scanned = i
+        return -1
+
+    def _consume(self, n):
+        self.consumed = (self.consumed + n) % self.wrap
+        self.scanned = 0
+
+    def readline(self):
+        """ the next complete line without b"\\r\\n" as a memoryview, None if there is none """
+        if not self.irq:
+            self.poll()
+        count = self.count
+        i = -1
+        if not self.irq or self.ready():
+            i = self._find_newline(count)
+        if i < 0:
+            if count == self.size:
+                # a line longer than the ring, resync on the next newline
+                self.line_dropped += count
+                self._consume(count)
+            return None
+        # copy out, the line may wrap around the end of the ring
+        tail = self.consumed % self.size
+        first = self.size - tail
+        if i <= first:
+            self.line_mv[0:i] = self.mv[tail:tail + i]
+        else:
+            self.line_mv[0:first] = self.mv[tail:self.size]
+            self.line_mv[first:i] = self.mv[0:i - first]
+        self._consume(i + 1)
+        self.lines += 1
+        if i and self.line[i - 1] == CR:
+            i -= 1
+        return self.line_mv[0:i]
+
+    def pending(self):
+        """ bytes in the ring or still in the UART, with the RX interrupt: a complete line """
+        if self.irq:
+            return self.ready()
+        return self.count + self.uart.any()
+
+    def describe(self):
+        return "uart rx: %d lines, %d bytes dropped, high water %d/%d bytes%s" % (
+            self.lines, self.dropped, self.high_water, self.size,
+            ", %d rx irqs" % self.irqs if self.irq else "")
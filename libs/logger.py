@@ -0,0 +1,115 @@
+'''
+Buffered logger for log.txt.
+
+log() puts a record into a ring of <capacity> records in RAM and
+returns, it never touches the file system. flush() appends the pending
+records to the file with one open() and write(); main.py flushes from a
+scheduler task, after an exception and in its finally handler:
+
+    log("line track: out of line")   # RAM only
+    logger.flush()                   # one file write
+
+When the ring is full the oldest record is overwritten and counted. A
+file that grows past <max_bytes> is renamed to <path>.1 (replacing the
+previous one) and a new file is started.
+'''
+import os
+import sys
+import time
+import io
+
+LOG_FILE = "log.txt"
+
+
+class Logger():
+    def __init__(self, path=LOG_FILE, capacity=64, max_bytes=64 * 1024, period_ms=1000):
+        self.path = path
+        self.capacity = capacity
+        self.max_bytes = max_bytes
+        self.period_ms = period_ms
+        self.records = [None] * capacity
+        self.head = 0           # next slot written
+        self.count = 0          # records not flushed yet
+        self.overwritten = 0
+        self.flushes = 0
+        self.rotations = 0
+        self.t_flush = time.ticks_ms()
+        try:
+            self.size = os.stat(path)[6]
+        except OSError:
+            self.size = 0
+
+    def write(self, text):
+        """ a raw record, written to the file as it is """
+        self.records[self.head] = text
+        self.head = (self.head + 1) % self.capacity
+        if self.count == self.capacity:
+            self.overwritten += 1
+        else:
+            self.count += 1
+
+    def log(self, msg):
+        self.write('\n> %s' % msg)
+
+    def exception(self, e):
+        """ log the traceback of <e> and flush right away """
+        buf = io.StringIO()
+        sys.print_exception(e, buf)
+        self.write('\n> ' + buf.getvalue())
+        self.flush()
+
+    def _rotate(self):
+        rotated = self.path + ".1"
+        try:
+            os.remove(rotated)
+        except OSError:
+            pass
+        try:
+            os.rename(self.path, rotated)
+        except OSError:
+            pass
+        self.size = 0
+        self.rotations += 1
+
+    def flush(self, dump=None):
+        """ append the pending records, then dump(f) (e.g. StageStats.dump) into the same file """
+        self.t_flush = time.ticks_ms()
+        if not self.count and dump is None:
+            return 0
+        if self.size >= self.max_bytes:
+            self._rotate()
+        written = 0
+        with open(self.path, "a") as f:
+            if self.overwritten:
+                written += f.write('\n> [%d log records lost]' % self.overwritten)
+                self.overwritten = 0
+            i = (self.head - self.count) % self.capacity
+            while self.count:
+                written += f.write(self.records[i])
+                self.records[i] = None
+                i = (i + 1) % self.capacity
+                self.count -= 1
+            if dump is not None:
+                dump(f)
+        self.flushes += 1
+        try:
+            self.size = os.stat(self.path)[6]
+        except OSError:
+            self.size += written
+        return written
+
+    def flush_if_due(self):
+        """ flush if records are pending and <period_ms> passed since the last flush """
+        if self.count and time.ticks_diff(time.ticks_ms(), self.t_flush) >= self.period_ms:
+            self.flush()
+
+    def describe(self):
+        return "log: %d flushes, %d rotations, %d bytes in %s" % (
+            self.flushes, self.rotations, self.size, self.path)
+
+
+logger = Logger()
+
+
+def log(msg):
+    logger.log(msg)
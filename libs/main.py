@@ -20,26 +20,42 @@ from helper import set_debug, get_debug, debug_print
 from classes.speed import Speed
 from classes.grayscale import Grayscale
 from ws import WS_Server
+from logger import logger, log
 from machine import Pin
 from classes.follow import Follow
+from classes.motor import Motor
+from scheduler import Scheduler
+from sensor_frame import Frame
+from stage_stats import StageStats
+from commands import CommandDecoder, MISSING
+from car_state import CarState, LINE_TRACK, EV_START, EV_STOP, EV_LINE_TRACK_ON, EV_LINE_TRACK_OFF, EV_GO, EV_EXIT, EV_FINISH
+from watchdog import LoopWatchdog
+from telemetry import Telemetry, TelemetryScheduler
+from latency import LatencyTrace
+from recorder import Recorder
+from navigator import Navigator, FINISHED, FAILED
+import aio
+from boot_phases import BootPhases
+
+# boot timing since the Pico's reset, logged when the car can drive
+boot = BootPhases(0)
+boot.mark("imports done")
 
 VERSION = '1.3.0'
 print(f"[ Pico-4WD Car App Control {VERSION}]\n")
 
 '''
- "w" mode will clear the previous log first, if you need to keep it,
- please use the "a" mode
+ log() keeps the records in RAM, they are appended to logger.path (log.txt)
+ by the "log" task, after an exception and on exit. The file is rotated
+ to log.txt.1 when it passes LOG_MAX_BYTES
 '''
-LOG_FILE = "log.txt"
+LOG_FLUSH_PERIOD = 1000 # ms
+LOG_MAX_BYTES = 64 * 1024
+logger.period_ms = LOG_FLUSH_PERIOD
+logger.max_bytes = LOG_MAX_BYTES
 
-# "a" mode
-with open(LOG_FILE, "a") as log_f:
-    Separation_Line = "\n" + "-"*30 + "\n"
-    log_f.write(Separation_Line)
-
-# "w" mode
-# with open(LOG_FILE, "w") as log_f:
-#     log_f.write("")
+Separation_Line = "\n" + "-"*30 + "\n"
+logger.write(Separation_Line)
 
 ''' -------------- Onboard led Config -------------'''
 onboard_led = Pin(25, Pin.OUT)
@@ -58,6 +74,29 @@ WIFI_MODE = "sta"
 SSID = "SPE-WLAN"
 PASSWORD = "HeiselAir#1"
 
+'''Binary frames to the ESP8266 instead of JSON lines (framing.py), needs a
+   bridge firmware that answers SET+BINARY, the text link is kept otherwise'''
+BINARY_FRAMING = False
+
+'''Fill the receive buffer from the UART RX idle interrupt, the ws rx task then
+   only runs for complete lines; False polls the UART from the task'''
+UART_RX_IRQ = False
+
+'''Set up the colour sensors on core 1 while the ESP8266 resets and joins the
+   WiFi, False runs the boot phases one after the other'''
+PARALLEL_BOOT = True
+
+'''Read every complete line per ws receive and apply only the newest control
+   packet, so joystick updates queued behind a slow loop are skipped (a packet
+   that changes a button or switch is still applied); the count of skipped
+   packets goes to the app under STALE_KEY (None = not sent)'''
+COALESCE_CONTROL = True
+STALE_KEY = 'U'
+
+'''Decode the app's A..S packets into preallocated slots (control_parser.py),
+   other lines still go to json.loads(); False decodes every line with json.loads()'''
+FAST_CONTROL_DECODE = True
+
 '''Configure steer sensitivity'''
 steer_sensitivity = 0.8 # 0 ~ 1
 
@@ -78,64 +117,102 @@ OBSTACLE_AVOID_TURNING_POWER = 50
 '''Configure the power of the line_track mode'''
 LINE_TRACK_POWER = 30
 
+'''Configure the line track route: hub and destination colour, see navigator.py'''
+HUB_COLOR = "green"
+DESTINATION_COLOR = "terracotta"
+
+'''Run the loop stages as uasyncio tasks, False runs the plain ws.loop()/remote_handler() loop'''
+USE_SCHEDULER = True
+
+'''Configure the scheduler task periods (ms)'''
+WS_RX_PERIOD = 10
+TELEMETRY_PERIOD = 100
+SENSOR_PERIOD = 40      # about the colour sensor integration time
+CONTROL_PERIOD = 20
+LIGHTS_PERIOD = 50
+MOTOR_RAMP_PERIOD = 2   # the ramp moves 1 power step per ms like set_motors_power_gradually()
+
+'''Configure the stage timing: telemetry key of [p50, p99, max] (us) per stage,
+   app key that dumps the histograms to the log'''
+TIMING_KEY = 'T'
+TIMING_DUMP_KEY = 'H'
+
+'''Configure the loop watchdog (ms): the motors are halted while a loop iteration
+   takes longer than WATCHDOG_DEADLINE, the hardware WDT resets the Pico if the
+   loop hangs for WATCHDOG_WDT (0 = off, max 8388)'''
+WATCHDOG_DEADLINE = 250
+WATCHDOG_CHECK_PERIOD = 20
+WATCHDOG_WDT = 8000
+
+'''Configure the telemetry: frames per second at most, TX budget (bytes/s, the
+   UART to the ESP8266 carries about 11500) and the fields only sent in every n-th frame'''
+TELEMETRY_RATE = 10
+TELEMETRY_BUDGET = 4000
+TELEMETRY_PRIORITIES = {'C': 5, 'D': 2, TIMING_KEY: 10, STALE_KEY: 10}
+
+'''Configure the command to PWM latency trace: histograms go to the log with the
+   stage timing, the echo key (e.g. 'Z') sends [the packet's value of that key,
+   rx to PWM us] back to the app, None = no echo'''
+LATENCY_TRACE = True
+LATENCY_ECHO_KEY = None
+
+'''Record the received lines, sensor frames and motor commands to RECORD_FILE
+   for tools/replay.py, recording stops at RECORD_MAX_BYTES'''
+RECORD = False
+RECORD_FILE = "record.bin"
+RECORD_BUFFER = 4096
+RECORD_MAX_BYTES = 256 * 1024
+RECORD_FLUSH_PERIOD = 500
+
+'''Read the sensors on core 1 and only copy the newest frame on core 0, needs USE_SCHEDULER'''
+USE_DUAL_CORE = False
+
 '''Configure singal light'''
 singal_on_color = [255, 255, 0] # amber:[255, 191, 0]
 brake_on_color = [255, 0, 0] 
 
 
 '''------------ Global Variables -------------'''
-led_status = False
-start = False
-_start_printed = False
-start_line_track = False
-_start_line_track_printed = False 
-line_track_active = False
-line_status = None
-hub_started = False
-hub_reached = False
-to_destination = False
-
-lights_brightness = 0.2
 led_rear_min_brightness = 0.08
 led_rear_max_brightness = 1
-
-
-dpad_touched = False
-move_status = 'stop'
-is_move_last  = False
-brake_light_status= False
-brake_light_time = 0
-brake_light_brightness = 255 # 0 ~ 255
-brake_light_brightness_flag = -1 # -1 or 1
-
-# Signal light blinking variables
-signal_blink_state = False
-signal_blink_time = 0
 signal_blink_interval = 0.5  # 500ms blink interval
 
+# all mutable car state and the mode transitions, see car_state.py
+state = CarState()
 
-mode = None
-throttle_power = 0
-steer_power = 0
-
-sonar_on = False
-sonar_angle = 0
-sonar_distance = 0
-avoid_proc = "scan" # obstacle process, "scan", "getdir", "stop", "forward", "left", "right"
-avoid_has_obstacle = False
+# dual-core mode: core 1 acquisition and the core 0 copy of its newest frame
+acquisition = None
+sensor_frame = Frame()
+watchdog = None
+# hub -> line -> destination -> hub route of the line track mode
+navigator = Navigator(HUB_COLOR, DESTINATION_COLOR)
+latency = LatencyTrace(LATENCY_ECHO_KEY) if LATENCY_TRACE else None
+recorder = None
 
 '''------------ Instantiate -------------'''
+def init_sensors():
+    return Follow(target_color="lila")  # Using color name instead of RGB tuple
+
 try:
     speed = Speed(8, 9)
     grayscale = Grayscale(26, 27, 28)
-    ws = WS_Server(name=NAME, mode=WIFI_MODE, ssid=SSID, password=PASSWORD)
-    sensors = Follow(target_color="lila")  # Using color name instead of RGB tuple
+    # RESET goes out now, the ESP8266 reboots while the sensors are set up
+    ws = WS_Server(name=NAME, mode=WIFI_MODE, ssid=SSID, password=PASSWORD, binary=BINARY_FRAMING,
+                   wait_reset=False, rx_irq=UART_RX_IRQ, coalesce=COALESCE_CONTROL,
+                   fast_decode=FAST_CONTROL_DECODE)
+    if PARALLEL_BOOT:
+        boot.background("colour sensors", init_sensors)
+        boot.run("esp8266 reset", ws.wait_reset)
+        ws_started = boot.run("wifi", ws.start)
+        sensors = boot.join()
+    else:
+        sensors = boot.run("colour sensors", init_sensors)
+        boot.run("esp8266 reset", ws.wait_reset)
+        ws_started = boot.run("wifi", ws.start)
 except Exception as e:
     onboard_led.off()
     sys.print_exception(e)
-    with open(LOG_FILE, "a") as log_f:
-        log_f.write('\n> ')
-        sys.print_exception(e, log_f)
+    logger.exception(e)
     sys.exit(1) # if ws init failed, exit
     
 
@@ -153,43 +230,43 @@ def should_exit_operation(operation_type="general"):
     Returns:
         bool: True if operation should exit, False otherwise
     """
-    global start, start_line_track, mode, move_status
+    s = state
     
     # Base exit conditions - always check these first
     if not ws.is_connected():
         stop()
-        move_status = 'stop'
+        s.move_status = 'stop'
         if get_debug():
             debug_print("Exit: WebSocket disconnected", action="exit_check", msg="Connection Lost")
         return True
     
-    if not start:
+    if not s.start:
         stop()
-        move_status = 'stop'
+        s.move_status = 'stop'
         if get_debug():
             debug_print("Exit: Car stopped", action="exit_check", msg="Car Stop")
         return True
     
     # Operation-specific exit conditions
     if operation_type == "line_track":
-        if not start_line_track:
+        if not s.start_line_track:
             stop()
-            move_status = 'stop'
+            s.move_status = 'stop'
             if get_debug():
                 debug_print("Exit: Line track disabled", action="exit_check", msg="Line Track Stop")
             return True
         
-        if mode != 'line track' and mode != 'line track enabled':
+        if s.mode != LINE_TRACK:
             stop()
-            move_status = 'stop'
+            s.move_status = 'stop'
             if get_debug():
                 debug_print("Exit: Mode changed from line track", action="exit_check", msg="Mode Change")
             return True
     
     elif operation_type == "obstacle_avoid":
-        if mode != 'obstacle avoid':
+        if s.mode != 'obstacle avoid':
             stop()
-            move_status = 'stop'
+            s.move_status = 'stop'
             if get_debug():
                 debug_print("Exit: Mode changed from obstacle avoid", action="exit_check", msg="Mode Change")
             return True
@@ -220,21 +297,18 @@ def should_exit_with_cleanup(operation_type="general", cleanup_function=None):
 
 def cleanup_line_track():
     """Cleanup actions for exiting line track mode."""
-    global move_status, line_status, line_track_active, mode
     stop()
-    move_status = 'stop'
-    mode = None
-    line_status = None
-    line_track_active = False
+    state.dispatch(EV_EXIT)
+    state.move_status = 'stop'
+    state.line_status = None
     if get_debug():
         debug_print("Line track cleanup executed", action="cleanup", msg="Line Track")
 
 def cleanup_lights():
     """Cleanup actions for lights (e.g., turn off or reset brightness)."""
-    global lights_brightness, brake_light_status, signal_blink_state
-    lights_brightness = led_rear_min_brightness
-    brake_light_status = False
-    signal_blink_state = False
+    state.lights_brightness = led_rear_min_brightness
+    state.brake_light_status = False
+    state.signal_blink_state = False
     # Add hardware-specific light-off code here if needed
     lights.set_off()
     if get_debug():
@@ -269,68 +343,30 @@ def my_car_move(throttle_power, steer_power, gradually=False):
 
 
 def line_track():
-    global line_out_time, move_status, line_status, line_track_active, to_destination, hub_reached
-    _power = LINE_TRACK_POWER
+    s = state
 
     if should_exit_with_cleanup("line_track", cleanup_line_track):
         return
 
-    direction = sensors.follow_line(_power)
-
-    # Move in the direction returned from the method follow_line()
-    if direction is None:
-        direction = "stop"
-    move(direction, _power)
-    line_track_active = True
-
-    if direction == "stop":
-        line_status = "out of line"
-        return    
-    if to_destination:
-        stop()
-        line_status = "line end"
-    if hub_reached:
-        stop()
-        line_status = "finish"
-        to_destination = False
-        hub_reached = False
-
-
-# TODO: Mit der Gruppe absprechen wie wir am ende einer Farbigen Linie das auto drehen. 
-def line_track_end():
-    global move_status, line_status, left_color, middle_color, right_color
-    _power = LINE_TRACK_POWER
-    
-    while not (left_color == sensors.target_color or middle_color == sensors.target_color or right_color == sensors.target_color):
-        # Check exit conditions in the loop
-        if should_exit_with_cleanup("line_track", cleanup_line_track):
-            return
-
-        if middle_color == 'terracotta':
-            move('forward', _power)
-            move_status = 'forward'
-        elif right_color == 'terracotta':
-            move('right', _power)
-            move_status = 'right'
-        elif left_color == 'terracotta':
-            move('left', _power)
-            move_status = 'left'
-        
-        # Update sensor readings
-        left_color = sensors.get_color_str()[0]
-        middle_color = sensors.get_color_str()[1]
-        right_color = sensors.get_color_str()[2]
-        
-        # Small delay to make loop responsive
-        time.sleep(0.01)
-        
-    line_status = "way back"
+    if USE_SCHEDULER and s.sensor_raw is None:
+        return # no reading from the sensor task yet
+    # one set of colour names per tick, from the sensor task's frame if there is one
+    colors = sensors.get_color_str(s.sensor_raw)
+    now = time.ticks_ms()
+    if not navigator.active:
+        navigator.start(sensors.target_color, colors, now)
+    direction = navigator.step(colors, now)
+    move(direction, LINE_TRACK_POWER)
+    s.move_status = direction
+    s.line_status = navigator.status
+    if navigator.event == FAILED:
+        log("line track: " + navigator.failure)
 
 
 '''----------------- singal_lights_handler ---------------------'''
 def singal_lights_handler():
     """ Blink left or Right depending on the direction the car is moving """
-    global signal_blink_state, signal_blink_time, signal_blink_interval
+    s = state
 
     # Early exit check - but still update timing for consistency
     should_exit = should_exit_operation("general")
@@ -338,9 +374,9 @@ def singal_lights_handler():
     current_time = time.time()
     
     # Always update timing to prevent drift
-    if current_time - signal_blink_time >= signal_blink_interval:
-        signal_blink_state = not signal_blink_state
-        signal_blink_time = current_time
+    if current_time - s.signal_blink_time >= signal_blink_interval:
+        s.signal_blink_state = not s.signal_blink_state
+        s.signal_blink_time = current_time
     
     # Exit after timing update but before hardware operations
     if should_exit:
@@ -348,15 +384,15 @@ def singal_lights_handler():
         return
     
     # Set the signal lights based on move_status and blink state
-    if move_status == 'left':
-        if signal_blink_state:
+    if s.move_status == 'left':
+        if s.signal_blink_state:
             lights.set_rear_left_color(singal_on_color)
         else:
             lights.set_rear_left_color(0x000000)
         lights.set_rear_right_color(0x000000)
-    elif move_status == 'right':
+    elif s.move_status == 'right':
         lights.set_rear_left_color(0x000000)
-        if signal_blink_state:
+        if s.signal_blink_state:
             lights.set_rear_right_color(singal_on_color)
         else:
             lights.set_rear_right_color(0x000000)
@@ -365,265 +401,419 @@ def singal_lights_handler():
         lights.set_rear_right_color(0x000000)
 
 def brake_lights_handler():
-    global is_move_last , brake_light_status, brake_light_time, led_status, brake_light_brightness
-    global brake_light_brightness, brake_light_brightness_flag
+    s = state
 
     if should_exit_with_cleanup("general", cleanup_lights):
         return
 
-    if move_status == 'stop':
-        if brake_light_brightness_flag == 1:
-            brake_light_brightness += 5
-            if brake_light_brightness > 255:
-                brake_light_brightness = 255
-                brake_light_brightness_flag = -1
-        elif brake_light_brightness_flag == -1:
-            brake_light_brightness -= 5
-            if brake_light_brightness < 0:
-                brake_light_brightness = 0
-                brake_light_brightness_flag = 1          
-        brake_on_color = [brake_light_brightness, 0, 0]
+    if s.move_status == 'stop':
+        if s.brake_light_brightness_flag == 1:
+            s.brake_light_brightness += 5
+            if s.brake_light_brightness > 255:
+                s.brake_light_brightness = 255
+                s.brake_light_brightness_flag = -1
+        elif s.brake_light_brightness_flag == -1:
+            s.brake_light_brightness -= 5
+            if s.brake_light_brightness < 0:
+                s.brake_light_brightness = 0
+                s.brake_light_brightness_flag = 1          
+        brake_on_color = [s.brake_light_brightness, 0, 0]
         lights.set_rear_color(brake_on_color)
     else:
-        if is_move_last:
+        if s.is_move_last:
             lights.set_rear_middle_color(0x000000)
         else:
             lights.set_rear_color(0x000000)
-        is_move_last = True
-        brake_light_brightness = 255
+        s.is_move_last = True
+        s.brake_light_brightness = 255
 
 
 '''----------------- on_receive (ws.loop()) ---------------------'''
 def on_receive(data):
-    global throttle_power, steer_power, move_status, is_move_last , mode, dpad_touched, line_status, line_track_active
-    global sonar_on
-    global start, prev_modes, start_line_track
+    if latency is not None:
+        latency.decoded(data)
 
     if RECEIVE_PRINT:
         print("recv_data: %s"%data)
     
     # print(f"Received data: {data['A']}")
 
-    ''' if not connected, skip & stop '''
-    if not ws.is_connected():
-        sonar.servo.set_angle(0)
-        car.move('stop', 0)
-        return
-
-    ''' data to display'''
-    # Color track
-    # ws.send_dict['A'] = sensors.color_match(sensors.target_color, current_mode=mode) # uint: 0 or 1
-    # Speed measurement
-    ws.send_dict['B'] = round(speed.get_speed(), 2) # uint: cm/s
-    # Speed mileage
-    ws.send_dict['C'] = speed.get_mileage() # unit: meter
-    # # sonar and distance
-    ws.send_dict['D'] = [sonar_angle, sonar_distance]
-    ws.send_dict['J'] = sonar_distance
-    # ws.send_dict['M'] = sensors.get_color_rgb_convert()[0] # Red component
-    # ws.send_dict['Q'] = sensors.get_color_rgb_convert()[1] # Green component
-    # ws.send_dict['R'] = sensors.get_color_rgb_convert()[2] # Blue component
-    # 0 = Line Color off, 1 = Line Color on
-    ws.send_dict['J'] = 1 if sensors.color_match(sensors.__get_color_rgb(current_mode=mode), sensors.target_color_rgb) else 0
+    # No hardware access here: stopping on a lost connection is up to
+    # control_handler(), the data to display comes from publish_telemetry()
 
     ''' remote control'''
+    commands.apply(data)
+
+
+''' command handlers, see the table below '''
+def cmd_throttle(value):
     # Move - power
-    if 'Q' in data.keys() and isinstance(data['Q'], int):
-        throttle_power = data['Q']
-    else:
-        throttle_power = 0
-
-    # Move - direction
-    if 'K' in data.keys() and start:
-        if data['K'] == "left":
-            dpad_touched = True
-            move_status = 'left'
-            if steer_power > 0:
-                steer_power = 0
-            steer_power -= int(throttle_power/2)
-            if steer_power < -100:
-                steer_power = -100
-        elif data['K'] == "right":
-            dpad_touched = True
-            move_status = 'right'
-            if steer_power < 0:
-                steer_power = 0
-            steer_power += int(throttle_power/2)
-            if steer_power > 100:
-                steer_power = 100
-        elif data['K'] == "forward":
-            dpad_touched = True
-            move_status = 'forward'
-            steer_power = 0
-        elif data['K'] == "backward":
-            dpad_touched = True
-            move_status = 'backward'
-            steer_power = 0
-            throttle_power = -throttle_power
+    state.throttle_power = value if isinstance(value, int) else 0
+
+def cmd_direction(value):
+    s = state
+    # Move - direction, anything else than a direction (e.g. null) releases the d-pad
+    if value is not MISSING and s.start:
+        if value == "left":
+            s.dpad_touched = True
+            s.move_status = 'left'
+            if s.steer_power > 0:
+                s.steer_power = 0
+            s.steer_power -= int(s.throttle_power/2)
+            if s.steer_power < -100:
+                s.steer_power = -100
+        elif value == "right":
+            s.dpad_touched = True
+            s.move_status = 'right'
+            if s.steer_power < 0:
+                s.steer_power = 0
+            s.steer_power += int(s.throttle_power/2)
+            if s.steer_power > 100:
+                s.steer_power = 100
+        elif value == "forward":
+            s.dpad_touched = True
+            s.move_status = 'forward'
+            s.steer_power = 0
+        elif value == "backward":
+            s.dpad_touched = True
+            s.move_status = 'backward'
+            s.steer_power = 0
+            s.throttle_power = -s.throttle_power
         else:
-            dpad_touched = False
-            move_status = 'stop'
-            steer_power = 0
+            s.dpad_touched = False
+            s.move_status = 'stop'
+            s.steer_power = 0
 
-    if throttle_power == 0:
-        move_status = 'stop'
+    if s.throttle_power == 0:
+        s.move_status = 'stop'
 
     # rear LEDs brightness
-    if throttle_power < 0:
-        lights_brightness = (-throttle_power)/100
+    if s.throttle_power < 0:
+        lights_brightness = (-s.throttle_power)/100
     else:
-        lights_brightness = throttle_power/100
+        lights_brightness = s.throttle_power/100
     if lights_brightness < led_rear_min_brightness:
         lights_brightness = led_rear_min_brightness
     elif lights_brightness > led_rear_max_brightness:
         lights_brightness = led_rear_max_brightness
+    s.lights_brightness = lights_brightness
 
-    if 'G' in data.keys() and start:
-        if data['G'] is True:
-            if not start_line_track:
-                start_line_track = True
-                # Print once to indicate start
-                global _start_line_track_printed
-                if not _start_line_track_printed:
-                    print("Line Track Mode Enabled")
-                    _start_line_track_printed = True
-        else:
-            if start_line_track:
-                start_line_track = False
-                _start_line_track_printed = False
-                mode = None
-                line_track_active = False
-                line_status = None
-                print("Line Track Mode Disabled")
-
-    # TODO: adapt to the new follow_line method (Follow class - line track functions)
-    # start line color tracking until returned to hub
-    if 'I' in data.keys() and start and start_line_track and data['I']:
-        if not line_track_active:
-            mode = 'line track'
-            print('line track enabled')
-            line_status = None
-        # if line_track_active and line_status is None:
-        #     line_status = "start"
+def cmd_start(value):
+    if value is MISSING:
+        return
+    if state.dispatch(EV_START if value is True else EV_STOP):
+        # the switches still hold their old values, apply them to the new mode
+        commands.forget('G', 'I', 'F')
 
-            
+def cmd_line_track(value):
+    # Line track switch, retried until the car is started
+    if value is MISSING:
+        return
+    state.dispatch(EV_LINE_TRACK_ON if value is True else EV_LINE_TRACK_OFF)
+    return state.start
 
+def cmd_go(value):
+    # TODO: adapt to the new follow_line method (Follow class - line track functions)
+    # start line color tracking until returned to hub, only while line track is armed
+    if value is not MISSING and value:
+        state.dispatch(EV_GO)
+        return state.line_track_active
 
+def color_button(name):
     # color select: Purple, Blue, Yellow, Orange, Terracotta
-    # Set target color based on received buttons
-    if start:
-        if 'N' in data.keys() and data['N']:
-            # sensors.target_color = "Purple"
-            print("purple")
-            # print(f"Set target color to {sensors.target_color.upper()} with RGB values of {sensors.target_color_rgb}")
-        if 'O' in data.keys() and data['O']:
-            # sensors.target_color = "Blue"
-            print("blue")
+    def handler(value):
+        if value is not MISSING and value:
+            if not state.start:
+                return False
+            # sensors.target_color = name
+            print(name)
             # print(f"Set target color to {sensors.target_color.upper()} with RGB values of {sensors.target_color_rgb}")
-        if 'P' in data.keys() and data['P']:
-            # sensors.target_color = "Yellow"
-            print("yellow")
-            # print(f"Set target color to {sensors.target_color.upper()} with RGB values of {sensors.target_color_rgb}")
-        if 'S' in data.keys() and data['S']:
-            # sensors.target_color = "Orange"
-            print("orange")
-            # print(f"Set target color to {sensors.target_color.upper()} with RGB values of {sensors.target_color_rgb}")
-
+    return handler
 
+def cmd_dump_timing(value):
+    # Dump the stage timing to the log once per press
+    if value is True:
+        dump_stage_stats()
 
+def cmd_debug(value):
     # Debug mode - Only Print Actions
-    if 'F' in data.keys() and start and isinstance(data['F'], bool):
-        set_debug(data['F'])
-
-            
-    # if 'G' in data.keys() and data['G']:
-    #     micropython.mem_info()
-    #     machine.freq() # get current frequency
-    
-    if 'E' in data.keys():
-        if data['E'] is True:
-            if not start:
-                start = True
-                # Print once to indicate start
-                global _start_printed
-                if not _start_printed:
-                    print("Car started")
-                    _start_printed = True
-        else:
-            if start:
-                start = False
-                _start_printed = False
-                print("Car stopped")
+    if isinstance(value, bool):
+        if not state.start:
+            return False
+        set_debug(value)
+
+# if 'G' in data.keys() and data['G']:
+#     micropython.mem_info()
+#     machine.freq() # get current frequency
+
+# (key, handler, level): level keys are applied on every packet, the others
+# only when their value changed. E first, so the other keys of the same
+# packet see the new mode.
+commands = CommandDecoder((
+    ('E', cmd_start, False),
+    ('Q', cmd_throttle, True),
+    ('K', cmd_direction, True),
+    ('G', cmd_line_track, False),
+    ('I', cmd_go, False),
+    ('N', color_button("purple"), False),
+    ('O', color_button("blue"), False),
+    ('P', color_button("yellow"), False),
+    ('S', color_button("orange"), False),
+    (TIMING_DUMP_KEY, cmd_dump_timing, False),
+    ('F', cmd_debug, False),
+))
 
 
 '''----------------- remote_handler ---------------------'''
-def remote_handler():
-    global mode, throttle_power, steer_power, move_status, dpad_touched
-    global sonar_angle, sonar_distance
-    global lights_brightness
-    global left_color, middle_color, right_color, start_line_track, line_track_active, line_status
+def control_handler():
+    """ mode handling and control law, return False if the car is not running """
+    s = state
 
     ''' if not connected, skip & stop '''
-    if not ws.is_connected() or not start:
+    if not ws.is_connected() or not s.start:
         sonar.servo.set_angle(0)
         car.move('stop', 0)
-        mode = None
-        return
+        s.dispatch(EV_EXIT)
+        return False
 
 
 
     ''' mode: Line Track or Obstacle Avoid or Follow '''
-    if not dpad_touched and start_line_track:
-        if mode == 'line track':
-            # INFO: debug 
-            # hub()
-            line_status = 'target found'
-            line_track()
-            # if line_status == 'target found' or line_status == "line end":
-                # line_track()
-            if line_status == "out of line":
-                # TODO: mit der Gruppe besprechen was passieren soll wenn das auto die farbige linie verloren hat. 
-                pass
-            if line_status == "finish":
-                print("line track finished")
-                line_status = None
+    if not s.dpad_touched and s.mode == LINE_TRACK:
+        line_track()
+        if s.line_status == FAILED:
+            # TODO: mit der Gruppe besprechen was passieren soll wenn das auto die farbige linie verloren hat. 
+            pass
+        if navigator.event == FINISHED:
+            s.dispatch(EV_FINISH)
+    elif s.mode != LINE_TRACK:
+        # the next go starts a new route
+        navigator.reset()
 
 
 
     ''' no operation '''
-    if not dpad_touched and mode == None: 
-        move_status = "stop"
+    if not s.dpad_touched and s.mode != LINE_TRACK: 
+        s.move_status = "stop"
         car.move('stop')
+    return True
 
+def lights_handler():
     # ''' Singal lights '''
     singal_lights_handler()
     # ''' Brake lights '''
     brake_lights_handler()
 
+def remote_handler():
+    if control_handler():
+        lights_handler()
+
+'''----------------- scheduler tasks ---------------------'''
+def ws_rx_task():
+    # lines may wait in the reader's ring buffer with the UART already empty,
+    # with UART_RX_IRQ this is only True for a complete line,
+    # with COALESCE_CONTROL one receive() reads all of them
+    if ws.pending():
+        ws.receive()
+
+def sample_speed():
+    # the encoder counts are summed up by the Speed timer, this only copies them
+    sensor_frame.speed = speed.get_speed()
+    sensor_frame.mileage = speed.get_mileage()
+
+def publish_frame(raw):
+    for i in range(3):
+        sensor_frame.set_color(i, raw[i])
+    sample_speed()
+    sensor_frame.ticks_ms = time.ticks_ms()
+    sensor_frame.seq += 1
+    state.sensor_raw = sensor_frame.raw
+
+def sample_sensors():
+    # sensor_task for the plain loop, the colours are only read while line tracking
+    seq = sensor_frame.seq
+    if state.mode == LINE_TRACK:
+        publish_frame(sensors.read_raw_all())
+    else:
+        sample_speed()
+        # line_track() reads the sensors itself on its first tick
+        state.sensor_raw = None
+    if recorder is not None and sensor_frame.seq != seq:
+        recorder.frame(sensor_frame, state.sonar_distance)
+
+async def sensor_task():
+    seq = sensor_frame.seq
+    if acquisition is not None:
+        if acquisition.frames.read(sensor_frame):
+            state.sensor_raw = sensor_frame.raw
+    else:
+        publish_frame(await aio.read_colors(sensors))
+    if state.sonar_on:
+        state.sonar_distance = await aio.get_distance(sonar.ultrasonic)
+    if recorder is not None and sensor_frame.seq != seq:
+        recorder.frame(sensor_frame, state.sonar_distance)
+
+def publish_telemetry():
+    telemetry.update()
+    ws.send_data()
+
+def lights_task():
+    if ws.is_connected() and state.start:
+        lights_handler()
+
+def motor_ramp_task():
+    car.ramp_step(MOTOR_RAMP_PERIOD)
+
+'''----------------- stage timing ---------------------'''
+# ws is ws.loop() or the ws rx task, it includes on_receive
+STAGES = ("ws", "on_receive", "line_track", "signal_lights", "brake_lights")
+STAGE_WS = 0
+stage_stats = StageStats(STAGES)
+
+# the callers look these up by name, so they use the timed versions
+on_receive = stage_stats.timed(1, on_receive)
+line_track = stage_stats.timed(2, line_track)
+singal_lights_handler = stage_stats.timed(3, singal_lights_handler)
+brake_lights_handler = stage_stats.timed(4, brake_lights_handler)
+ws_rx_task = stage_stats.timed(STAGE_WS, ws_rx_task)
+
+# app display data from the cached sensor frame and the car state
+telemetry = Telemetry(ws.send_dict, state, sensor_frame, sensors, stage_stats, TIMING_KEY)
+telemetry.latency = latency
+
+def write_stage_stats(log_f):
+    stage_stats.dump(log_f)
+    if latency is not None:
+        latency.dump(log_f)
+
+def dump_stage_stats():
+    logger.flush(write_stage_stats)
+
+def log_link_stats():
+    log(ws.describe())
+    if ws.tx_scheduler is not None:
+        log(ws.tx_scheduler.describe())
+    log(ws.send_dict.describe())
+    log(logger.describe())
+
+def cleanup(fn, *args):
+    """ one step of the exit handler, a failing step doesn't skip the next ones """
+    if watchdog is not None:
+        # the hardware WDT can't be stopped, the flash writes and the RESET take a while
+        watchdog.feed_hw()
+    try:
+        fn(*args)
+    except Exception as e:
+        sys.print_exception(e)
+        log("cleanup %s: %r" % (fn, e))
+
+def start_watchdog():
+    global watchdog
+    watchdog = LoopWatchdog(WATCHDOG_DEADLINE, WATCHDOG_CHECK_PERIOD, WATCHDOG_WDT, stage_stats)
+
+def watchdog_task():
+    if watchdog.feed():
+        log(watchdog.describe())
+
+def start_recorder():
+    global recorder
+    recorder = Recorder(RECORD_FILE, RECORD_BUFFER, RECORD_MAX_BYTES)
+    ws.recorder = recorder
+    car.recorder = recorder
+
+def recorder_task():
+    recorder.flush_if_due()
+
+def start_acquisition():
+    global acquisition
+    from acquisition import Acquisition
+    acquisition = Acquisition(sensors, grayscale, speed, SENSOR_PERIOD)
+    acquisition.start()
+
+def build_scheduler():
+    sched = Scheduler()
+    sched.add("ws rx", ws_rx_task, WS_RX_PERIOD)
+    sched.add("telemetry", publish_telemetry, TELEMETRY_PERIOD)
+    sched.add("sensors", sensor_task, SENSOR_PERIOD)
+    sched.add("control", control_handler, CONTROL_PERIOD)
+    sched.add("lights", lights_task, LIGHTS_PERIOD)
+    sched.add("motors", motor_ramp_task, MOTOR_RAMP_PERIOD)
+    if watchdog is not None:
+        sched.watchdog = watchdog
+        sched.add("watchdog", watchdog_task, WATCHDOG_CHECK_PERIOD)
+    if recorder is not None:
+        sched.add("recorder", recorder_task, RECORD_FLUSH_PERIOD)
+    sched.add("log", logger.flush, LOG_FLUSH_PERIOD)
+    return sched
+
 '''----------------- main ---------------------'''
 def main():
     sonar.servo.set_angle(0)
     car.move('stop')
     ws.on_receive = on_receive
-    if ws.start():
+    ws.tx_scheduler = TelemetryScheduler(TELEMETRY_RATE, TELEMETRY_BUDGET, TELEMETRY_PRIORITIES)
+    ws.stale_key = STALE_KEY
+    ws.edge_keys = commands.edges
+    if latency is not None:
+        ws.trace = latency
+        Motor.trace = latency
+    if ws_started:
         onboard_led.on()
-        while True:
-            ws.loop()
-            remote_handler()
+        start_watchdog()
+        if RECORD:
+            start_recorder()
+        boot.mark("drivable")
+        print(boot.describe())
+        log(boot.describe())
+        if USE_SCHEDULER:
+            if USE_DUAL_CORE:
+                start_acquisition()
+            car.set_background_ramp(True)
+            build_scheduler().run()
+        else:
+            ws_loop = stage_stats.timed(STAGE_WS, ws.loop)
+            while True:
+                # ws.loop() replies with send_dict, refresh it from the cache first
+                sample_sensors()
+                telemetry.update()
+                watchdog.enter("ws.loop")
+                ws_loop()
+                watchdog.enter("remote_handler")
+                remote_handler()
+                if recorder is not None:
+                    recorder.flush_if_due()
+                logger.flush_if_due()
+                if watchdog.feed():
+                    log(watchdog.describe())
 
 if __name__ == "__main__":
     try:
         main()
     except Exception as e:
         sys.print_exception(e)
-        with open(LOG_FILE, "a") as log_f:
-            log_f.write('\n> ')
-            sys.print_exception(e, log_f)
+        logger.exception(e)
     finally:
-        car.move("stop")
-        lights.set_off()
-        ws.set("RESET", timeout=25000)
+        # the motors and lights first, the diagnostics below write to flash
+        cleanup(car.set_background_ramp, False)
+        cleanup(car.move, "stop")
+        cleanup(lights.set_off)
+        if watchdog is not None:
+            cleanup(watchdog.deinit)
+            # the RESET below polls for up to 4 x 25 s
+            ws.idle = watchdog.feed_hw
+        if acquisition is not None:
+            cleanup(acquisition.stop)
+        if recorder is not None:
+            cleanup(recorder.close)
+            log(recorder.describe())
+        cleanup(log_link_stats)
+        # everything logged so far and the stage timing, before the RESET can fail
+        cleanup(dump_stage_stats)
+        cleanup(ws.set, "RESET", None, 25000)
+        cleanup(logger.flush)
         while True: # pico onboard led blinking indicates error
+            if watchdog is not None:
+                watchdog.feed_hw()
             time.sleep(0.25)
             onboard_led.off()
             time.sleep(0.25)
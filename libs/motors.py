@@ -7,15 +7,73 @@ left_rear   = Motor(13, 12, dir=-1)
 right_rear  = Motor(11, 10, dir= 1)
 motors = [left_front, right_front, left_rear, right_rear]
 
+# With background ramp set_motors_power_gradually() only sets the target
+# powers, ramp_step() (a scheduler task) moves the motors there
+background_ramp = False
+target_powers = [0, 0, 0, 0]
+
+# Set by the loop watchdog, the motors stay stopped until resume()
+halted = False
+
+# Recorder logging the commanded powers, None = off
+recorder = None
+
+def _set_targets(powers):
+    for i in range(4):
+        target_powers[i] = powers[i]
+        motors[i].target_power = powers[i]
+    if Motor.trace is not None:
+        Motor.trace.targets_set()
+
+def set_background_ramp(enabled):
+    global background_ramp
+    background_ramp = enabled
+
+def halt():
+    '''
+        stop all motors and ignore new powers until resume(), safe to call from a timer callback
+    '''
+    global halted
+    halted = True
+    if Motor.trace is not None:
+        Motor.trace.targets_halted()
+    for i in range(4):
+        target_powers[i] = 0
+        motors[i].target_power = 0
+        motors[i].run(0)
+
+def _undo_if_halted():
+    '''
+        halt() may run between the duty writes (the watchdog timer callback), in
+        which case the loop wrote old powers after it; stop the motors again
+    '''
+    if halted:
+        for i in range(4):
+            target_powers[i] = 0
+            motors[i].target_power = 0
+            motors[i].run(0)
+        return True
+    return False
+
+def resume():
+    global halted
+    halted = False
+
 def set_motors_power(powers:list):
     ''' set motors power 
         powers list, 1*4 list powers of each motor, the order is [left_front, right_front, left_rear, right_rear]
     '''
     if len(powers) != 4:
         raise ValueError("powers should be a 1*4 list.")
+    if recorder is not None:
+        recorder.motors(powers)
+    if halted:
+        return
 
+    _set_targets(powers)
     for i, motor in enumerate(motors):
         motor.run(powers[i])
+    _undo_if_halted()
 
 def set_motors_power_gradually(powers:list):
     '''
@@ -23,9 +81,20 @@ def set_motors_power_gradually(powers:list):
     '''
     if len(powers) != 4:
         raise ValueError("powers should be a 1*4 list.")
+    if recorder is not None:
+        recorder.motors(powers)
+
+    if halted:
+        return
+    _set_targets(powers)
+    if background_ramp:
+        _undo_if_halted()
+        return
 
     flags = [True, True, True, True]
     while flags[0] or flags[1] or flags[2] or flags[3]:
+        if halted:
+            return
         for i, motor in enumerate(motors):
             if motor.current_power > powers[i]:
                 motor.run(motor.current_power - 1)
@@ -33,8 +102,31 @@ def set_motors_power_gradually(powers:list):
                 motor.run(motor.current_power + 1)
             else:
                 flags[i] = False
+        if _undo_if_halted():
+            return
         time.sleep_ms(1)
 
+def ramp_step(step=1):
+    '''
+        move each motor <step> closer to its target power, return True while ramping
+    '''
+    if halted:
+        return False
+    ramping = False
+    for i, motor in enumerate(motors):
+        diff = target_powers[i] - motor.current_power
+        if diff > step:
+            motor.run(motor.current_power + step)
+            ramping = True
+        elif diff < -step:
+            motor.run(motor.current_power - step)
+            ramping = True
+        elif diff != 0:
+            motor.run(target_powers[i])
+    if _undo_if_halted():
+        return False
+    return ramping
+
 def stop():
     set_motors_power([0, 0, 0, 0])
 
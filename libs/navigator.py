@@ -0,0 +1,142 @@
+'''
+Non-blocking route navigator for the line track mode.
+
+The car drives a route of legs: out of the hub, along the coloured line
+to the destination, turn there and back along the line to the hub. Each
+leg follows one colour, or spins in place, until its exit colour is seen.
+step() takes the (left, middle, right) colour names of one sensor frame
+and returns the direction to move for this tick, so the main loop is
+never held up.
+Every leg has a timeout and the line may only be lost for LOST_MS, the
+navigator then fails and stops instead of searching forever.
+
+Colours in the route are roles, resolved when a route starts:
+
+    nav = Navigator(hub="green", destination="terracotta")
+    nav.start("lila", colors, time.ticks_ms())
+    move(nav.step(colors, time.ticks_ms()), power)
+'''
+import time
+
+# Colour roles
+HUB = "hub"
+TARGET = "target"
+DESTINATION = "destination"
+
+# Exit when any or when all of the sensors see the exit colour, AGAIN: any
+# sensor sees it after none did, for a leg that starts on its exit colour
+ANY = 0
+ALL = 1
+AGAIN = 2
+
+'''Time the line may be out of sight before the route fails (ms)'''
+LOST_MS = 2000
+
+# (leg, colour to follow, exit colour, ANY/ALL/AGAIN, timeout ms, spin), the leg
+# name is the line status main.py reports while driving it. A leg with a spin
+# direction returns it every tick until the exit fires instead of following
+ROUTE = (
+    ("leave hub", HUB, TARGET, ANY, 5000, None),
+    ("to destination", TARGET, TARGET, ALL, 30000, None),  # all sensors on the colour mark the line end
+    ("turn", None, TARGET, AGAIN, 8000, "turn in place left"),  # starts on the line end
+    ("way back", TARGET, HUB, ANY, 30000, None),
+)
+
+# Status outside of the legs
+IDLE = "idle"
+FINISHED = "finish"
+FAILED = "out of line"
+
+
+class Navigator():
+    def __init__(self, hub="green", destination="terracotta", route=ROUTE, lost_ms=LOST_MS):
+        self.route = route
+        self.lost_ms = lost_ms
+        self.roles = {HUB: hub, TARGET: None, DESTINATION: destination}
+        self.failure = None     # why the last route failed
+        self.reset()
+
+    def reset(self):
+        self.leg = -1
+        self.status = IDLE
+        self.event = None       # FINISHED or FAILED in the tick it happened
+        self.leg_start = 0
+        self.lost_since = None
+        self.armed = False      # AGAIN: the exit colour was out of sight
+        self.direction = "stop"
+
+    @property
+    def active(self):
+        """ True from start() until reset(), also once finished or failed """
+        return self.status != IDLE
+
+    def start(self, target, colors, now):
+        """ start the route to <target>, at the hub leg only if a sensor sees the hub """
+        self.reset()
+        self.failure = None
+        self.roles[TARGET] = target
+        hub = self.roles[HUB]
+        in_hub = colors[0] == hub or colors[1] == hub or colors[2] == hub
+        self._enter(0 if in_hub else 1, now)
+
+    def _enter(self, leg, now):
+        self.leg = leg
+        self.status = self.route[leg][0]
+        self.leg_start = now
+        self.lost_since = None
+        self.armed = False
+
+    def _stop(self, status, failure=None):
+        self.status = status
+        self.event = status
+        self.failure = failure
+        self.direction = "stop"
+        return "stop"
+
+    def step(self, colors, now):
+        """ direction ('forward', 'left', 'right', 'stop' or the spin of the leg)
+            for the (left, middle, right) colour names """
+        self.event = None
+        if self.leg < 0 or self.status == FINISHED or self.status == FAILED:
+            return "stop"
+
+        name, follow, exit_color, mode, timeout, spin = self.route[self.leg]
+        roles = self.roles
+        exit_color = roles[exit_color]
+        left, middle, right = colors
+        if mode == ALL:
+            done = left == exit_color and middle == exit_color and right == exit_color
+        else:
+            done = left == exit_color or middle == exit_color or right == exit_color
+            if mode == AGAIN and not self.armed:
+                self.armed = not done
+                done = False
+        if done:
+            if self.leg + 1 >= len(self.route):
+                return self._stop(FINISHED)
+            self._enter(self.leg + 1, now)
+            name, follow, exit_color, mode, timeout, spin = self.route[self.leg]
+        elif time.ticks_diff(now, self.leg_start) > timeout:
+            return self._stop(FAILED, "timeout in " + name)
+
+        if spin is not None:
+            self.direction = spin
+            return spin
+
+        color = roles[follow]
+        if middle == color:
+            direction = "forward"
+        elif right == color:
+            direction = "right"
+        elif left == color:
+            direction = "left"
+        else:
+            # keep going the last way until the line shows up again
+            if self.lost_since is None:
+                self.lost_since = now
+            elif time.ticks_diff(now, self.lost_since) > self.lost_ms:
+                return self._stop(FAILED, "line lost in " + name)
+            return self.direction
+        self.lost_since = None
+        self.direction = direction
+        return direction
@@ -0,0 +1,156 @@
+'''
+Recorder for the car's inputs and motor commands.
+
+Every inbound websocket line, sensor frame and motor command is packed
+with its time into a preallocated RAM buffer. The buffer goes to flash
+in one write when it is half full (flush_if_due(), a low priority
+task) or, if a record does not fit any more, right away. The host
+replayer (tools/replay.py) feeds a recording back through main.py.
+
+Layout (little endian):
+
+    header   <4sBBH   magic b"PREC", version, reserved, reserved
+    record   <BIH     kind, ms since the recording started, payload length,
+                      followed by the payload
+
+    KIND_MESSAGE   the line as read by WS_Server, utf-8
+    KIND_FRAME     <12H3Hfff   12H raw colours (l, m, r x r, g, b, clear),
+                               3H grayscale, f sonar distance (float cm,
+                               -1 on timeout), f speed, f mileage
+    KIND_MOTORS    <4b         commanded powers, only recorded on change
+'''
+import struct
+import time
+
+RECORD_FILE = "record.bin"
+
+MAGIC = b"PREC"
+VERSION = 1
+
+KIND_MESSAGE = 1
+KIND_FRAME = 2
+KIND_MOTORS = 3
+
+_HEADER = "<4sBBH"
+_RECORD = "<BIH"
+_FRAME = "<12H3Hfff"
+_MOTORS = "<4b"
+_RECORD_SIZE = struct.calcsize(_RECORD)
+_FRAME_SIZE = struct.calcsize(_FRAME)
+_MOTORS_SIZE = struct.calcsize(_MOTORS)
+
+
+class Recorder():
+    def __init__(self, path=RECORD_FILE, buffer_size=4096, max_bytes=256 * 1024):
+        self.buf = bytearray(buffer_size)
+        self.mv = memoryview(self.buf)
+        self.pos = 0
+        self.max_bytes = max_bytes
+        self.last_powers = [None, None, None, None]
+        self.records = 0
+        self.dropped = 0     # records over max_bytes or larger than the buffer
+        self.flushes = 0
+        self.file = open(path, "wb")
+        header = struct.pack(_HEADER, MAGIC, VERSION, 0, 0)
+        self.file.write(header)
+        self.written = len(header)
+        self.t0 = time.ticks_ms()
+
+    def _reserve(self, kind, length):
+        """ write a record header, return the payload offset or -1 if the record is dropped """
+        size = _RECORD_SIZE + length
+        if self.file is None or self.written + self.pos + size > self.max_bytes or size > len(self.buf):
+            self.dropped += 1
+            return -1
+        if self.pos + size > len(self.buf):
+            self.flush()
+        struct.pack_into(_RECORD, self.buf, self.pos, kind,
+                         time.ticks_diff(time.ticks_ms(), self.t0), length)
+        offset = self.pos + _RECORD_SIZE
+        self.pos += size
+        self.records += 1
+        return offset
+
+    def message(self, line):
+        data = line.encode()
+        offset = self._reserve(KIND_MESSAGE, len(data))
+        if offset >= 0:
+            self.buf[offset:offset + len(data)] = data
+
+    def frame(self, frame, sonar_distance=0):
+        offset = self._reserve(KIND_FRAME, _FRAME_SIZE)
+        if offset >= 0:
+            c = frame.colors
+            g = frame.grayscale
+            struct.pack_into(_FRAME, self.buf, offset,
+                             c[0], c[1], c[2], c[3], c[4], c[5], c[6], c[7], c[8], c[9], c[10], c[11],
+                             g[0], g[1], g[2], sonar_distance, frame.speed, frame.mileage)
+
+    def motors(self, powers):
+        last = self.last_powers
+        if last[0] == powers[0] and last[1] == powers[1] and last[2] == powers[2] and last[3] == powers[3]:
+            return
+        for i in range(4):
+            last[i] = powers[i]
+        offset = self._reserve(KIND_MOTORS, _MOTORS_SIZE)
+        if offset >= 0:
+            struct.pack_into(_MOTORS, self.buf, offset, powers[0], powers[1], powers[2], powers[3])
+
+    def flush(self):
+        if self.pos and self.file is not None:
+            self.file.write(self.mv[:self.pos])
+            self.written += self.pos
+            self.pos = 0
+            self.flushes += 1
+
+    def flush_if_due(self):
+        if self.pos >= len(self.buf) // 2:
+            self.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def describe(self):
+        return "recorder: %d records, %d bytes, %d flushes, %d dropped" % (
+            self.records, self.written + self.pos, self.flushes, self.dropped)
+
+
+def loads(buf):
+    '''Unpack a recording into a list of (kind, ms, value) tuples.
+
+    value is the line (str) for KIND_MESSAGE, the tuple of _FRAME fields
+    for KIND_FRAME and the 4 powers for KIND_MOTORS.
+    '''
+    buf = memoryview(buf)
+    magic, version, _, _ = struct.unpack_from(_HEADER, buf, 0)
+    if magic != MAGIC:
+        raise ValueError("Not a recording")
+    if version != VERSION:
+        raise ValueError("Unsupported recording version %d" % version)
+    offset = struct.calcsize(_HEADER)
+    records = []
+    while offset + _RECORD_SIZE <= len(buf):
+        kind, ms, length = struct.unpack_from(_RECORD, buf, offset)
+        offset += _RECORD_SIZE
+        if offset + length > len(buf):
+            break  # cut off by a reset before the last flush completed
+        payload = buf[offset:offset + length]
+        offset += length
+        if kind == KIND_MESSAGE:
+            value = bytes(payload).decode()
+        elif kind == KIND_FRAME:
+            value = struct.unpack(_FRAME, payload)
+        elif kind == KIND_MOTORS:
+            value = struct.unpack(_MOTORS, payload)
+        else:
+            continue
+        records.append((kind, ms, value))
+    return records
+
+
+def load(path=RECORD_FILE):
+    with open(path, "rb") as f:
+        return loads(f.read())
@@ -0,0 +1,106 @@
+'''
+Cooperative scheduler for the main control loop, built on (u)asyncio.
+
+Every stage of the loop runs as its own task with its own period, so a
+slow stage only delays itself:
+
+    sched = Scheduler()
+    sched.add("ws rx", ws.receive, 10)
+    sched.add("control", control_handler, 20)
+    sched.run()
+
+Task functions may be plain functions or coroutine functions; blocking
+drivers have awaitable wrappers in aio.py.
+'''
+import time
+
+try:
+    import asyncio
+except ImportError:
+    import uasyncio as asyncio
+
+
+class Task():
+    """ Periodic task, <fn> is called every <period_ms> ms.
+        Keeps the deviation of the actual start interval from the period.
+    """
+    def __init__(self, name, fn, period_ms):
+        self.name = name
+        self.fn = fn
+        self.period_ms = period_ms
+        self.runs = 0
+        self.overruns = 0
+        self.max_jitter_us = 0
+        self.jitter_sum_us = 0
+        self._last_start = None
+
+    def _record(self, start):
+        if self._last_start is not None:
+            jitter = abs(time.ticks_diff(start, self._last_start) - self.period_ms * 1000)
+            self.jitter_sum_us += jitter
+            if jitter > self.max_jitter_us:
+                self.max_jitter_us = jitter
+        self._last_start = start
+
+    async def run(self, scheduler):
+        deadline = time.ticks_ms()
+        while scheduler.running:
+            self._record(time.ticks_us())
+            if scheduler.watchdog is not None:
+                scheduler.watchdog.stage = self.name
+            result = self.fn()
+            if result is not None and hasattr(result, "send"):
+                await result
+            self.runs += 1
+
+            deadline = time.ticks_add(deadline, self.period_ms)
+            delay = time.ticks_diff(deadline, time.ticks_ms())
+            if delay < 0:
+                # overran the period, start again from now instead of bursting
+                self.overruns += 1
+                deadline = time.ticks_ms()
+                delay = 0
+            await asyncio.sleep(delay / 1000)
+
+    def stats(self):
+        n = self.runs - 1 if self.runs > 1 else 1
+        return {
+            "runs": self.runs,
+            "overruns": self.overruns,
+            "mean_jitter_us": self.jitter_sum_us // n,
+            "max_jitter_us": self.max_jitter_us,
+        }
+
+
+class Scheduler():
+    def __init__(self):
+        self.tasks = []
+        self.running = False
+        # LoopWatchdog told which task runs, see watchdog.py
+        self.watchdog = None
+
+    def add(self, name, fn, period_ms):
+        """ add a periodic task, return the Task """
+        task = Task(name, fn, period_ms)
+        self.tasks.append(task)
+        return task
+
+    async def start(self):
+        """ run all tasks until stop() is called or a task raises """
+        self.running = True
+        try:
+            await asyncio.gather(*[task.run(self) for task in self.tasks])
+        finally:
+            self.running = False
+
+    def run(self):
+        asyncio.run(self.start())
+
+    def stop(self):
+        self.running = False
+
+    def report(self):
+        for task in self.tasks:
+            s = task.stats()
+            print("%-10s period %4d ms  runs %6d  overruns %4d  jitter mean %6d us  max %6d us" % (
+                task.name, task.period_ms, s["runs"], s["overruns"], s["mean_jitter_us"], s["max_jitter_us"]))
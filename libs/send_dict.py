@@ -0,0 +1,156 @@
+'''
+Telemetry dict that remembers which fields changed since the last frame.
+
+SendDict is filled like the plain send_dict (d[key] = value). The
+constant fields (Name/Type/Check) are encoded to JSON once and go into
+every frame, the other fields only while they changed since they were
+last sent. encode() writes the frame into a preallocated buffer with a
+single json.dumps() of the changed fields:
+
+    d = SendDict({'Name': 'car', 'Type': 'PICO-4WD Car', 'Check': 'SC'})
+    d['B'] = 12.5
+    n = d.encode(b"WS+")    # d.out[:n] == b'WS+{"Name":"car",...,"B": 12.5}\\n'
+    n = d.encode(b"WS+")    # only the constant fields
+
+A list (e.g. the sonar [angle, distance] updated in place) counts as
+changed whenever it is set. refresh() sends every field again, e.g. to
+a newly connected app.
+'''
+import json
+
+
+class SendDict():
+    def __init__(self, constant=None, size=256):
+        self.constant = {}
+        self.head = b"{"        # '{' and the encoded constant fields
+        self.head_changed = True
+        self.values = {}
+        self.dirty = {}         # key -> value, changed since last sent
+        self.frame = {}         # the fields of one frame, reused
+        self.out = bytearray(size)
+        self.out_mv = memoryview(self.out)
+        self.frames = 0
+        self.sent_fields = 0
+        self.unchanged = 0      # fields left out because they did not change
+        if constant:
+            for key in constant:
+                self.set_constant(key, constant[key])
+
+    def set_constant(self, key, value):
+        """ a field sent in every frame, encoded once """
+        self.constant[key] = value
+        head = "{"
+        for k in self.constant:
+            if len(head) > 1:
+                head += ","
+            head += "%s:%s" % (json.dumps(k), json.dumps(self.constant[k]))
+        self.head = head.encode()
+        self.head_changed = True
+
+    def __setitem__(self, key, value):
+        values = self.values
+        if key in self.constant:
+            if self.constant[key] != value:
+                self.set_constant(key, value)
+            return
+        if key in values:
+            old = values[key]
+            if type(value) is type(old) and type(value) is not list and old == value:
+                return
+        values[key] = value
+        self.dirty[key] = value
+
+    def __getitem__(self, key):
+        if key in self.constant:
+            return self.constant[key]
+        return self.values[key]
+
+    def __contains__(self, key):
+        return key in self.constant or key in self.values
+
+    def __iter__(self):
+        for key in self.constant:
+            yield key
+        for key in self.values:
+            yield key
+
+    def __len__(self):
+        return len(self.constant) + len(self.values)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def changed(self):
+        """ keys changed since they were last sent """
+        return list(self.dirty)
+
+    def any_changed(self, include):
+        """ True if a changed field passes include(key) """
+        for key in self.dirty:
+            if include(key):
+                return True
+        return False
+
+    def clear_changed(self, keys):
+        """ mark <keys> as sent by other means """
+        dirty = self.dirty
+        for key in keys:
+            if key in dirty:
+                del dirty[key]
+
+    def refresh(self):
+        """ send every field in the next frames again """
+        self.head_changed = True
+        for key in self.values:
+            self.dirty[key] = self.values[key]
+
+    def _put(self, data, n):
+        end = n + len(data)
+        if end > len(self.out):
+            # grows once to the largest frame seen
+            out = bytearray(end + 64)
+            out[0:n] = self.out_mv[0:n]
+            self.out = out
+            self.out_mv = memoryview(out)
+        self.out_mv[n:end] = data
+        return end
+
+    def encode(self, prefix=b"", include=None, head=True):
+        """ write prefix + the JSON object + b"\\n" into out, return its length;
+            include(key) -> False keeps a changed field for a later frame,
+            head=False leaves out the constant fields """
+        dirty = self.dirty
+        frame = dirty
+        if include is not None:
+            frame = self.frame
+            frame.clear()
+            for key in dirty:
+                if include(key):
+                    frame[key] = dirty[key]
+        n = self._put(prefix, 0)
+        if head:
+            n = self._put(self.head, n)
+            self.head_changed = False
+        else:
+            n = self._put(b"{", n)
+        if frame:
+            if head and len(self.head) > 1:
+                n = self._put(b",", n)
+            # '{"B": 12.5, ...}' without its '{'
+            n = self._put(json.dumps(frame)[1:].encode(), n)
+        else:
+            n = self._put(b"}", n)
+        n = self._put(b"\n", n)
+        self.frames += 1
+        self.sent_fields += len(frame)
+        self.unchanged += len(self.values) - len(dirty)
+        if frame is dirty:
+            dirty.clear()
+        else:
+            for key in frame:
+                del dirty[key]
+        return n
+
+    def describe(self):
+        return "send_dict: %d frames, %d fields sent, %d unchanged fields left out" % (
+            self.frames, self.sent_fields, self.unchanged)
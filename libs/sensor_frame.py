@@ -0,0 +1,77 @@
+'''
+Sensor frame shared between the acquisition (core 1) and the control loop (core 0).
+
+FrameBuffer is a lock-free double buffer: the writer fills the back frame
+and publishes it by incrementing the sequence counter, which also flips
+which frame is in front. A reader copies the front frame and retries if
+the counter moved meanwhile, so neither side ever waits on the other.
+'''
+from array import array
+
+
+class Frame():
+    """ One set of readings, all storage is allocated up front """
+    def __init__(self):
+        # raw (r, g, b, clear) of the left, middle and right colour sensor
+        self.colors = array('H', [0] * 12)
+        self.grayscale = array('H', [0] * 3)
+        self.speed = 0.0     # cm/s
+        self.mileage = 0.0   # m
+        self.ticks_ms = 0    # when the frame was taken
+        self.seq = 0
+        mv = memoryview(self.colors)
+        # (left, middle, right) views, accepted as raw readings by Follow
+        self.raw = (mv[0:4], mv[4:8], mv[8:12])
+
+    def set_color(self, index, raw):
+        j = index * 4
+        colors = self.colors
+        colors[j] = raw[0]
+        colors[j + 1] = raw[1]
+        colors[j + 2] = raw[2]
+        colors[j + 3] = raw[3]
+
+    def copy_from(self, other):
+        self.colors[:] = other.colors
+        self.grayscale[:] = other.grayscale
+        self.speed = other.speed
+        self.mileage = other.mileage
+        self.ticks_ms = other.ticks_ms
+        self.seq = other.seq
+
+
+class FrameBuffer():
+    """ Single writer, any number of readers """
+    RETRIES = 3
+
+    def __init__(self):
+        self.frames = (Frame(), Frame())
+        self.seq = 0     # number of published frames, frames[seq & 1] is in front
+        self.torn = 0    # reads that had to be retried
+        self.failed = 0  # reads that gave up, the reader kept its previous frame
+        self.scratch = Frame()
+
+    def back(self):
+        """ the frame to fill before publish() """
+        return self.frames[(self.seq + 1) & 1]
+
+    def publish(self):
+        frame = self.frames[(self.seq + 1) & 1]
+        frame.seq = self.seq + 1
+        self.seq = frame.seq
+
+    def read(self, dst):
+        """ copy the newest frame into <dst>, return its sequence number (0: nothing published yet).
+            Gives up after RETRIES only if the writer publishes faster than one copy takes,
+            then returns 0 and leaves <dst> as it was.
+        """
+        scratch = self.scratch
+        for _ in range(self.RETRIES):
+            seq = self.seq
+            scratch.copy_from(self.frames[seq & 1])
+            if self.seq == seq:
+                dst.copy_from(scratch)
+                return seq
+            self.torn += 1
+        self.failed += 1
+        return 0
@@ -0,0 +1,66 @@
+'''
+Handle of a queued ESP8266 SET command.
+
+WS_Server.submit() queues a SetCommand and returns it at once. The
+server sends one command at a time and completes the handle when the
+[OK] reply arrives, from its receive()/poll() calls:
+
+    cmd = ws.submit("PORT", 8765, timeout=10000)
+    while not cmd.done():
+        ws.poll()
+    port = cmd.result()     # the text after [OK], raises on failure
+
+[ERROR] and garbled replies are retried, a timeout too. After <retries>
+retries result() raises the TimeoutError or a ValueError with the reply.
+'''
+import time
+
+QUEUED = 0
+SENT = 1
+DONE = 2
+FAILED = 3
+
+
+class SetCommand():
+    def __init__(self, command, value=None, timeout=None, retries=3):
+        self.command = command
+        self.value = value
+        self.timeout = timeout      # ms per try, None waits for ever
+        self.retries = retries
+        self.tries = 0
+        self.state = QUEUED
+        self.t_sent = 0
+        self.t_queued = time.ticks_ms()
+        self.elapsed_ms = 0         # queued to done/failed
+        self.reply = None
+        self.error = None
+
+    def done(self):
+        """ True once the command succeeded or failed """
+        return self.state >= DONE
+
+    def result(self):
+        if self.state == FAILED:
+            raise self.error
+        if self.state != DONE:
+            raise ValueError("SET+%s not done yet" % self.command)
+        return self.reply
+
+    def sent(self, now):
+        self.state = SENT
+        self.tries += 1
+        self.t_sent = now
+
+    def expired(self, now):
+        return (self.state == SENT and self.timeout is not None
+                and time.ticks_diff(now, self.t_sent) > self.timeout)
+
+    def finish(self, reply, now):
+        self.state = DONE
+        self.reply = reply
+        self.elapsed_ms = time.ticks_diff(now, self.t_queued)
+
+    def fail(self, error, now):
+        self.state = FAILED
+        self.error = error
+        self.elapsed_ms = time.ticks_diff(now, self.t_queued)
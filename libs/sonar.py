@@ -13,7 +13,7 @@ SONAR_MIN_ANGLE = -90
 SONAR_REFERENCE = 20
 
 sonar_data =[]
-for i in range((SONAR_MAX_ANGLE-SONAR_MIN_ANGLE)/sonar_step+1):
+for i in range((SONAR_MAX_ANGLE-SONAR_MIN_ANGLE)//sonar_step+1):
     sonar_data.append(None)
 
 def get_distance_at(angle):
@@ -0,0 +1,115 @@
+'''
+Always-on timing of the main loop stages.
+
+Every stage call is timed with time.ticks_us() and counted in a fixed
+bucket histogram. All counts live in one preallocated array, so adding
+a sample allocates nothing:
+
+    stats = StageStats(("ws", "on_receive"))
+    on_receive = stats.timed(1, on_receive)
+    ...
+    stats.summary()   # [p50, p99, max] per stage in us
+'''
+import time
+from array import array
+
+# Bucket upper edges (us), the last bucket takes everything above
+BUCKET_EDGES = array('L', (
+    20, 50, 100, 200, 500,
+    1000, 2000, 5000, 10000, 20000,
+    50000, 100000, 200000, 500000, 1000000,
+))
+N_BUCKETS = len(BUCKET_EDGES) + 1
+
+
+class StageStats():
+    def __init__(self, stages):
+        self.stages = stages
+        self.counts = array('L', [0] * (len(stages) * N_BUCKETS))
+        self.max_us = array('L', [0] * len(stages))
+        self.current = -1    # innermost timed stage running now
+        # [p50, p99, max] per stage, filled in place by summary()
+        self.last_summary = [0] * (3 * len(stages))
+        self.summary_changed = False
+
+    def add(self, stage, us):
+        """ count one <us> long call of <stage> (index into stages) """
+        if us > self.max_us[stage]:
+            self.max_us[stage] = us
+        b = 0
+        edges = BUCKET_EDGES
+        while b < N_BUCKETS - 1 and us > edges[b]:
+            b += 1
+        self.counts[stage * N_BUCKETS + b] += 1
+
+    def timed(self, stage, fn):
+        """ wrap <fn> so every call is added to <stage> """
+        add = self.add
+
+        def wrapper(*args):
+            prev = self.current
+            self.current = stage
+            t = time.ticks_us()
+            try:
+                return fn(*args)
+            finally:
+                add(stage, time.ticks_diff(time.ticks_us(), t))
+                self.current = prev
+        return wrapper
+
+    def count(self, stage):
+        base = stage * N_BUCKETS
+        n = 0
+        for b in range(N_BUCKETS):
+            n += self.counts[base + b]
+        return n
+
+    def percentile(self, stage, q):
+        """ upper edge of the bucket holding the <q> (0..100) percentile,
+            never more than the measured maximum, 0 without samples
+        """
+        n = self.count(stage)
+        if n == 0:
+            return 0
+        rank = (n * q + 99) // 100
+        base = stage * N_BUCKETS
+        seen = 0
+        for b in range(N_BUCKETS - 1):
+            seen += self.counts[base + b]
+            if seen >= rank:
+                return min(BUCKET_EDGES[b], self.max_us[stage])
+        return self.max_us[stage]
+
+    def summary(self):
+        """ flat [p50, p99, max] per stage (us), for the telemetry.
+            Always the same list, summary_changed tells if a value changed
+        """
+        result = self.last_summary
+        changed = False
+        for i in range(len(self.stages)):
+            j = 3 * i
+            p50 = self.percentile(i, 50)
+            p99 = self.percentile(i, 99)
+            if result[j] != p50 or result[j + 1] != p99 or result[j + 2] != self.max_us[i]:
+                result[j] = p50
+                result[j + 1] = p99
+                result[j + 2] = self.max_us[i]
+                changed = True
+        self.summary_changed = changed
+        return result
+
+    def dump(self, f):
+        """ write the histograms to the open file <f> """
+        f.write("\n> stage timing (us): calls p50 p99 max | bucket counts up to %s\n"
+                % ",".join(str(e) for e in BUCKET_EDGES))
+        for i, name in enumerate(self.stages):
+            base = i * N_BUCKETS
+            f.write("%-14s %7d %7d %7d %7d | %s\n" % (
+                name, self.count(i), self.percentile(i, 50), self.percentile(i, 99),
+                self.max_us[i], " ".join(str(c) for c in self.counts[base:base + N_BUCKETS])))
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        for i in range(len(self.max_us)):
+            self.max_us[i] = 0
@@ -0,0 +1,137 @@
+'''
+Telemetry for the app, built from cached readings only.
+
+Telemetry.update() fills send_dict from the newest sensor Frame and the
+CarState. It never reads a sensor or the encoders, so it can run from
+the receive path or a scheduler task without waiting on I2C:
+
+    telemetry = Telemetry(ws.send_dict, state, sensor_frame, sensors)
+    telemetry.update()
+    ws.send_data()
+
+TelemetryScheduler decides when WS_Server.send_data() really sends and
+which fields go into a frame: at most rate_hz frames per second, within
+a TX budget in bytes per second, and a field of priority n only in every
+n-th frame.
+'''
+import time
+
+from car_state import LINE_TRACK
+
+# Field priorities: the field is sent in every n-th frame
+EVERY_FRAME = 1
+
+
+class Telemetry():
+    def __init__(self, send_dict, state, frame, follow, stage_stats=None, timing_key='T'):
+        self.send_dict = send_dict
+        self.state = state
+        self.frame = frame
+        self.follow = follow
+        self.stage_stats = stage_stats
+        self.timing_key = timing_key
+        self.sonar = [0, 0]     # 'D', updated in place
+        self.latency = None     # LatencyTrace echoing into send_dict
+        self.updates = 0
+
+    def line_color(self):
+        """ 1 if the middle sensor of the cached frame sees the target colour while line tracking """
+        if self.state.mode != LINE_TRACK or self.frame.seq == 0:
+            return 0
+        # only the middle sensor, the other two are not reported
+        return 1 if self.follow.raw_color_match(self.frame.raw[1]) else 0
+
+    def update(self):
+        s = self.state
+        frame = self.frame
+        d = self.send_dict
+        # Speed measurement
+        d['B'] = round(frame.speed, 2) # unit: cm/s
+        # Speed mileage
+        d['C'] = frame.mileage # unit: meter
+        # sonar and distance
+        self.sonar[0] = s.sonar_angle
+        self.sonar[1] = s.sonar_distance
+        d['D'] = self.sonar
+        # 0 = Line Color off, 1 = Line Color on
+        d['J'] = self.line_color()
+        # Stage timing
+        stats = self.stage_stats
+        if stats is not None:
+            # the list is filled in place, only set it again when it changed
+            timing = stats.summary()
+            if stats.summary_changed or self.timing_key not in d:
+                d[self.timing_key] = timing
+        if self.latency is not None:
+            self.latency.publish(d)
+        self.updates += 1
+
+
+class TelemetryScheduler():
+    """ Rate limit and field selection for WS_Server.send_data() """
+    WINDOW_MS = 1000    # achieved rate measurement window
+
+    def __init__(self, rate_hz=10, budget_bps=4000, priorities=None):
+        self.interval_ms = 1000 // rate_hz
+        self.budget_bps = budget_bps
+        self.priorities = priorities or {}
+        self.tokens = budget_bps    # bytes that may be sent now, one second of burst
+        self.next_send = None
+        self.last_refill = None
+        self.refill_rest = 0        # budget_bps * ms not yet a whole byte, keeps slow budgets refilling
+        self.frames = 0
+        self.bytes = 0
+        self.throttled = 0          # frames held back by the TX budget
+        self.window_start = None
+        self.window_frames = 0
+        self.window_bytes = 0
+        self.rate_hz = 0.0          # achieved over the last window
+        self.bps = 0
+
+    def due(self, now):
+        """ True if a frame may be sent at <now> (ms) """
+        if self.last_refill is not None:
+            gained = self.budget_bps * time.ticks_diff(now, self.last_refill) + self.refill_rest
+            self.tokens += gained // 1000
+            self.refill_rest = gained % 1000
+            if self.tokens > self.budget_bps:
+                self.tokens = self.budget_bps
+                self.refill_rest = 0
+        self.last_refill = now
+        # a little early is fine, the caller's own period jitters too
+        if self.next_send is not None and time.ticks_diff(self.next_send, now) > self.interval_ms // 8:
+            return False
+        if self.tokens <= 0:
+            self.throttled += 1
+            return False
+        return True
+
+    def wanted(self, key):
+        """ True if the field <key> goes into this frame, for SendDict.encode() """
+        return self.frames % self.priorities.get(key, EVERY_FRAME) == 0
+
+    def sent(self, nbytes, now):
+        """ account a frame of <nbytes> sent at <now> """
+        if self.next_send is None or time.ticks_diff(now, self.next_send) > self.interval_ms:
+            self.next_send = now    # fell behind, don't catch up with a burst
+        self.next_send = time.ticks_add(self.next_send, self.interval_ms)
+        self.tokens -= nbytes
+        self.frames += 1
+        self.bytes += nbytes
+        if self.window_start is None:
+            self.window_start = now
+            return
+        # frames after the one that opened the window
+        self.window_frames += 1
+        self.window_bytes += nbytes
+        elapsed = time.ticks_diff(now, self.window_start)
+        if elapsed >= self.WINDOW_MS:
+            self.rate_hz = self.window_frames * 1000 / elapsed
+            self.bps = self.window_bytes * 1000 // elapsed
+            self.window_start = now
+            self.window_frames = 0
+            self.window_bytes = 0
+
+    def describe(self):
+        return "telemetry: %d frames, %d bytes, %.1f Hz %d B/s achieved, %d throttled by the budget" % (
+            self.frames, self.bytes, self.rate_hz, self.bps, self.throttled)
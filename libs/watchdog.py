@@ -0,0 +1,82 @@
+'''
+Loop deadline watchdog.
+
+The main loop calls feed() once per iteration. A periodic Timer checks
+that the last feed is at most <deadline_ms> old. On overrun the callback
+halts the motors at once and records the stage that was running. The
+motors stay halted until the loop feeds again. A machine.WDT, fed only
+from feed(), resets the Pico if the loop never comes back.
+
+rp2 Timer callbacks are soft interrupts. They run between bytecodes and
+during sleep_ms()/UART waits, so a Python loop stuck in while/sleep is
+covered. A single long C call (time_pulse_us, up to 18 ms) delays the
+check by its length.
+'''
+import time
+from machine import Timer, WDT
+
+import motors
+
+
+class LoopWatchdog():
+    def __init__(self, deadline_ms=250, check_ms=20, wdt_timeout_ms=0, stage_stats=None):
+        """ <wdt_timeout_ms> 0 leaves the hardware WDT off, once started it can't be stopped.
+            <stage_stats> (StageStats) adds the innermost timed stage to the record.
+        """
+        self.deadline_ms = deadline_ms
+        self.stage_stats = stage_stats
+        self.stage = None          # set by the loop before each stage
+        self.t_feed = time.ticks_ms()
+        self.tripped = False
+        self.overruns = 0
+        self.overrun_stage = None
+        self.overrun_inner = -1
+        self.overrun_ms = 0
+        self.worst_ms = 0
+        self.wdt = WDT(timeout=wdt_timeout_ms) if wdt_timeout_ms else None
+        self.timer = Timer(mode=Timer.PERIODIC, period=check_ms, callback=self._check)
+
+    def _check(self, timer):
+        if self.tripped:
+            return
+        if time.ticks_diff(time.ticks_ms(), self.t_feed) > self.deadline_ms:
+            motors.halt()
+            self.tripped = True
+            self.overruns += 1
+            self.overrun_stage = self.stage
+            if self.stage_stats is not None:
+                self.overrun_inner = self.stage_stats.current
+
+    def enter(self, stage):
+        self.stage = stage
+
+    def feed(self):
+        """ end of a loop iteration, return True if it overran the deadline """
+        now = time.ticks_ms()
+        elapsed = time.ticks_diff(now, self.t_feed)
+        self.t_feed = now
+        self.feed_hw()
+        if elapsed > self.worst_ms:
+            self.worst_ms = elapsed
+        if self.tripped:
+            self.overrun_ms = elapsed
+            self.tripped = False
+            motors.resume()
+            return True
+        return False
+
+    def feed_hw(self):
+        """ only keep the hardware WDT from resetting, e.g. while blinking an error """
+        if self.wdt is not None:
+            self.wdt.feed()
+
+    def describe(self):
+        inner = ""
+        if self.overrun_inner >= 0:
+            inner = "/" + self.stage_stats.stages[self.overrun_inner]
+        return "loop overran the %d ms deadline in %s%s, took %d ms (%d overruns, worst %d ms)" % (
+            self.deadline_ms, self.overrun_stage, inner, self.overrun_ms, self.overruns, self.worst_ms)
+
+    def deinit(self):
+        """ stop the deadline check, the hardware WDT keeps running: go on calling feed_hw() """
+        self.timer.deinit()
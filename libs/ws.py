@@ -1,34 +1,40 @@
-from machine import UART
-from typing import Any, Dict
+from machine import UART, Timer
 import time
 import json
 
+from line_reader import LineReader
+from logger import log
+from send_dict import SendDict
+from framing import FrameReader, ControlDecoder, TelemetryFramer, CONTROL, TEXT
+from set_command import SetCommand, QUEUED, SENT
+from control_parser import ControlParser
+
 from machine import Pin
 onboard_led_ws = Pin(25, Pin.OUT)
 
+# a key missing from a packet, unlike null
+_ABSENT = object()
+
 "custom Exception"
 class TimeoutError(Exception):
     pass
 
-LOG_FILE = "log.txt"
-
-
-def log(msg):
-    with open(LOG_FILE, "a") as log_f:
-        log_f.write(f'\n> {msg}')
-        time.sleep(0.01)
-
 class WS_Server():
     WS_TIMEOUT = 10000 # ms
     SEND_INTERVAL = 100 # ms
+    RX_BUFFER = 1024 # bytes, ring buffer of the line reader
+    LED_PERIOD = 100 # ms, onboard LED toggle while SET commands are pending
+    MAX_DRAIN = 16 # lines read by one coalescing receive()
 
-    send_dict: Dict[str, Any] = {
+    # only the fields changed since the last frame are encoded again
+    send_dict = SendDict({
         'Name': '',
         'Type': 'PICO-4WD Car',
         'Check': 'SC',
-        }
+        })
 
-    def __init__(self, name=None, ssid=None, password='', mode=None, port=8765):
+    def __init__(self, name=None, ssid=None, password='', mode=None, port=8765, binary=False, wait_reset=True,
+                 rx_irq=False, coalesce=False, fast_decode=False):
         self.name = name
         self.ssid = ssid
         if self.ssid == None or self.ssid == "":
@@ -37,7 +43,33 @@ class WS_Server():
         self.mode = mode.lower()
         self.port = port
         # self.uart = UART(1, 115200, timeout=100, timeout_char=10)
-        self.uart = UART(1, 115200, timeout=10, timeout_char=5)
+        if rx_irq:
+            # room for a burst until the RX idle interrupt drains it
+            self.uart = UART(1, 115200, timeout=10, timeout_char=5, rxbuf=self.RX_BUFFER // 2)
+        else:
+            self.uart = UART(1, 115200, timeout=10, timeout_char=5)
+        # drains uart.any() into a ring buffer, read() never waits on the UART
+        self.reader = LineReader(self.uart, self.RX_BUFFER)
+        # rx_irq: the UART RX idle interrupt fills the ring, the loop only sees complete lines
+        self.rx_irq = rx_irq and self.reader.start_irq()
+        if rx_irq and not self.rx_irq:
+            log("UART has no RX idle interrupt, polling")
+        # binary framing, asked for after START, see framing.py
+        self.binary = binary
+        self.frames = None      # FrameReader while the link is framed
+        self.control = ControlDecoder()
+        self.framer = TelemetryFramer()
+        # coalesce: receive() drains the lines and applies only the newest control packet
+        self.coalesce = coalesce
+        self.latest = None      # the newest control packet of this receive()
+        self.latest_rx = 0      # and when it was read
+        self.stale = 0          # control packets replaced before they were applied
+        self.stale_key = None   # send_dict key of the stale count, None = not sent
+        # keys handled on a change only (CommandDecoder.edges): a packet that changes
+        # one of them is applied even if a newer one follows
+        self.edge_keys = ()
+        # fast_decode: A..S packets go into preallocated slots, other lines to json.loads()
+        self.parser = ControlParser() if fast_decode else None
 
         self.listen_s = None
         self.client_s = None
@@ -45,35 +77,103 @@ class WS_Server():
         self.wlan = None
         self._is_connected = False
         # self.last_send_time = 0
+        self.trace = None   # LatencyTrace stamped with the read time of each applied packet
+        self.rx_us = 0      # when the last line was read, only with a trace
+        self.recorder = None   # Recorder logging every received line
+        self.tx_scheduler = None   # TelemetryScheduler limiting send_data()
+        self.queue = []            # SetCommands, the first one is in flight
+        self.led_timer = None
+        self.idle = None           # called while wait() polls, e.g. to feed a watchdog
 
         self.send_dict["Name"] = self.name
         print('reset ESP8266 module ...')
-        esp8266_version = self.set("RESET", timeout=25000)
+        # wait_reset=False returns while the ESP8266 resets, start() waits for it
+        self.reset_cmd = self.submit("RESET", timeout=25000)
+        if wait_reset:
+            self.wait_reset()
+
+    def wait_reset(self):
+        """ wait for the RESET sent by __init__(), raise TimeoutError if it failed """
+        if self.reset_cmd is None:
+            return
+        self.wait(self.reset_cmd)
+        esp8266_version = self.reset_cmd.result()
+        self.reset_cmd = None
         print(f'ESP8266 module firmware version {esp8266_version}')
 
     def read(self, block=False):
-        buf = ""
+        """ the next line, in binary mode also the dict of a CONTROL frame """
+        if self.frames is not None:
+            return self._read_frame(block)
         while True: 
-            buf = self.uart.readline()
-            if buf == None:
+            line = self.reader.readline()
+            if line is None:
                 if block:
                     time.sleep_ms(1)
                     continue
                 else:
                     return None
 
-            if buf[0] < 0x31 or buf[0] > 0xfe:
-                buf = buf[1:]
-                log("bufxx: %s" % buf)
-                if buf == '':
-                    buf = "GARBLED" # Garbled characters
-                    return buf
-                     
-            buf = buf.decode().replace("\r\n", "")
+            if len(line) and (line[0] < 0x31 or line[0] > 0xfe):
+                line = line[1:]
+                log("bufxx: %s" % bytes(line))
+                if not len(line):
+                    return "GARBLED" # Garbled characters
+
+            buf = str(line, "utf-8")
             if buf.startswith("[DEBUG] "):
-                buf = buf.replace("[DEBUG]", "[ESP8266]")
-            else:
-                return buf
+                continue
+            if self.trace is not None:
+                self.rx_us = time.ticks_us()
+            return buf
+
+    def _read_frame(self, block):
+        while True:
+            frame = self.frames.read()
+            if frame is None:
+                if block:
+                    time.sleep_ms(1)
+                    continue
+                return None
+            kind, payload = frame
+            if kind == CONTROL:
+                if self.trace is not None:
+                    self.rx_us = time.ticks_us()
+                return self.control.decode(payload)
+            if kind == TEXT:
+                buf = str(payload, "utf-8")
+                if not buf.startswith("[DEBUG] "):
+                    return buf
+
+    def pending(self):
+        """ bytes received and not read yet, a complete line with rx_irq """
+        if self.frames is not None:
+            return self.frames.pending()
+        return self.reader.pending()
+
+    def start_binary(self):
+        """ switch the link to binary frames, False if the ESP8266 firmware stays on text """
+        try:
+            self.set("BINARY", 1, timeout=self.WS_TIMEOUT)
+        except (TimeoutError, ValueError):
+            log("ESP8266 has no binary framing, staying on text")
+            return False
+        # bytes after the [OK] line still in the line reader are lost, the frame reader resyncs
+        self.reader.stop_irq()
+        self.frames = FrameReader(self.uart, self.RX_BUFFER // 2)
+        self.send_dict.refresh()
+        return True
+
+    def describe(self):
+        if self.frames is not None:
+            text = self.frames.describe()
+        else:
+            text = self.reader.describe()
+        if self.coalesce:
+            text += ", %d stale control packets skipped" % self.stale
+        if self.parser is not None:
+            text += ", " + self.parser.describe()
+        return text
 
     def write(self, value):
         value = "%s\n" % value
@@ -81,88 +181,116 @@ class WS_Server():
         self.uart.write(value)
 
     def send_data(self):
-        data = json.dumps(self.send_dict)
-        self._command("WS", data)
+        """ send send_dict, with a tx_scheduler only when a frame is due, return True if sent """
+        tx = self.tx_scheduler
+        d = self.send_dict
+        include = None
+        if tx is not None:
+            now = time.ticks_ms()
+            if not tx.due(now):
+                return False
+            include = tx.wanted
+        if self.frames is not None:
+            n = self.framer.encode(d, include)
+            self.uart.write(self.framer.out_mv[0:n])
+        else:
+            n = d.encode(b"WS+", include)
+            self.uart.write(d.out_mv[0:n])
+        if tx is not None:
+            tx.sent(n, now)
+        return True
 
     def _command(self, mode, command, value=None):
         command += str(value) if value != None else ""
         command = "%s+%s" % (mode, command)
         self.write(command)
 
+    def submit(self, command, value=None, timeout=None):
+        """ queue SET+<command><value> and return its SetCommand at once,
+            receive()/poll() send it and match the reply """
+        cmd = SetCommand(command, value, timeout)
+        self.queue.append(cmd)
+        if len(self.queue) == 1:
+            self._blink(True)
+            self._advance(time.ticks_ms())
+        return cmd
+
+    def wait(self, *cmds):
+        """ poll until all <cmds> are done """
+        while not all(cmd.done() for cmd in cmds):
+            self.poll()
+            if self.idle is not None:
+                self.idle()
+            if not self.pending():
+                time.sleep_ms(1)
+
     def set(self, command, value=None, timeout=None):
-        result = None
-        flag = 0
-        retry_count = 0
-        retry_max_count = 3
-        t_s = 0
-
-        # retry function
-        def retry():
-            nonlocal  t_s, retry_count
-            self._command("SET", command, value)
-            t_s = time.ticks_ms()
-            retry_count = retry_count + 1
-
-        # send command
-        self._command("SET", command, value)
-        # get start time
-        t_s = time.ticks_ms()
+        """ SET and wait for the reply, return the text after [OK] """
+        cmd = self.submit(command, value, timeout)
+        self.wait(cmd)
+        return cmd.result()
 
-        while True:
-            # onboard LED flash
-            if flag == 0:
-                onboard_led_ws.on()
-                flag = 1
-                time.sleep(0.1)
-            else:
-                onboard_led_ws.off()
-                flag = 0
-                time.sleep(0.1)
-
-            # Timeout handle
-            if timeout != None:
-                if(time.ticks_ms() - t_s > timeout):
-                    if retry_count < retry_max_count:
-                        log(f"TimeoutError. retry {retry_count} ...     ")
-                        retry()
-                        continue
-                    raise TimeoutError('Set timeout %s ms'%timeout)
-
-            # UnicodeError
-            try:
-                result = self.read(block=False)
-            except UnicodeError:
-                if retry_count < retry_max_count:
-                    log(f"UnicodeError retry {retry_count} ...")
-                    retry()
-                    continue
-                log("UnicodeError")
-            
-            # result
-            if result == None:
-                continue
-            elif result.startswith("[ERROR]"):
-                if retry_count < retry_max_count:
-                    log(f"{result} retry {retry_count} ...")
-                    retry()
-                    continue
-                log("result == [ERROR]")
-                
-            elif result == 'GARBLED':
-                if retry_count < retry_max_count:
-                    log(f"result GARBLED retry {retry_count} ...")
-                    retry()
-                    continue
-                log("result GARBLED ")
+    def _blink(self, on):
+        # the onboard LED flashes from a Timer while commands are queued
+        if on and self.led_timer is None:
+            self.led_timer = Timer(mode=Timer.PERIODIC, period=self.LED_PERIOD, callback=self._toggle_led)
+        elif not on and self.led_timer is not None:
+            self.led_timer.deinit()
+            self.led_timer = None
+            onboard_led_ws.off()
 
-            elif result.startswith("[OK]"):
-                result = result[4:]
-                result = result.strip(" ")
-                break
-            else:
+    def _toggle_led(self, timer):
+        onboard_led_ws.toggle()
+
+    def _send_set(self, cmd, now):
+        if cmd.command == "RESET" and self.frames is not None:
+            # the ESP8266 comes back on the text link
+            self.frames = None
+            if self.rx_irq:
+                self.reader.start_irq()
+        self._command("SET", cmd.command, cmd.value)
+        cmd.sent(now)
+
+    def _done(self, cmd):
+        self.queue.pop(0)
+        if not self.queue:
+            self._blink(False)
+
+    def _retry(self, cmd, reason, error, now):
+        if cmd.tries <= cmd.retries:
+            log(f"{reason} retry {cmd.tries - 1} ...")
+            self._send_set(cmd, now)
+        else:
+            log(f"SET+{cmd.command}: {reason}")
+            cmd.fail(error, now)
+            self._done(cmd)
+
+    def _advance(self, now):
+        """ send the next queued command, retry or fail an expired one """
+        queue = self.queue
+        while queue:
+            cmd = queue[0]
+            if cmd.state == QUEUED:
+                self._send_set(cmd, now)
+            elif cmd.expired(now):
+                self._retry(cmd, "TimeoutError", TimeoutError('Set timeout %s ms' % cmd.timeout), now)
                 continue
+            return
 
-        return result
+    def _reply(self, line, now):
+        """ complete the command in flight with <line>, False if it is no reply """
+        cmd = self.queue[0]
+        if cmd.state != SENT:
+            return False
+        if line.startswith("[OK]"):
+            cmd.finish(line[4:].strip(" "), now)
+            self._done(cmd)
+            self._advance(now)
+        elif line.startswith("[ERROR]") or line == "GARBLED":
+            self._retry(cmd, line, ValueError(line), now)
+        else:
+            return False
+        return True
 
     def _get(self, command):
         self._command("GET", command)
@@ -170,15 +298,20 @@ class WS_Server():
         return result
 
     def start(self):
+        self.wait_reset()
         try:
+            cmds = []
             if self.mode == "sta":
-                self.set("MODE", 1, timeout=self.WS_TIMEOUT)
+                cmds.append(self.submit("MODE", 1, timeout=self.WS_TIMEOUT))
             elif self.mode == "ap":
-                self.set("MODE", 2, timeout=self.WS_TIMEOUT)
-            self.set("SSID", self.ssid, timeout=self.WS_TIMEOUT)
-            self.set("PSK", self.password, timeout=self.WS_TIMEOUT)
-            self.set("PORT", self.port, timeout=self.WS_TIMEOUT)
-        except TimeoutError as e:
+                cmds.append(self.submit("MODE", 2, timeout=self.WS_TIMEOUT))
+            cmds.append(self.submit("SSID", self.ssid, timeout=self.WS_TIMEOUT))
+            cmds.append(self.submit("PSK", self.password, timeout=self.WS_TIMEOUT))
+            cmds.append(self.submit("PORT", self.port, timeout=self.WS_TIMEOUT))
+            self.wait(*cmds)
+            for cmd in cmds:
+                cmd.result()
+        except (TimeoutError, ValueError) as e:
             print(e)
             print("Configuring WiFi Timeout.Please check whether the ESP8266 module is working.")
             return False
@@ -190,6 +323,8 @@ class WS_Server():
                 print("open AP %s ... "%self.ssid)
             ip = self.set("START", timeout=None)
             print("WebServer started on ws://%s:%d" % (ip, self.port))
+            if self.binary:
+                self.start_binary()
             return True
         except ValueError as e:
             print(e)
@@ -202,34 +337,139 @@ class WS_Server():
     def on_receive(self, data):
         pass
 
-    def loop(self):
-        receive = self.read()
+    def receive(self):
+        """ read and handle one line without sending, advance the SET queue,
+            return True if a reply is due (nothing received, connected or data).
+            With coalesce every complete line is read and only the newest
+            control packet is applied.
+        """
+        if not self.coalesce:
+            due = self._receive_one()
+            return True if due is None else due
+        due = None
+        for _ in range(self.MAX_DRAIN):
+            got = self._receive_one()
+            if got is None:
+                break
+            due = got
+        latest = self.latest
+        if latest is not None:
+            self.latest = None
+            due = self._apply(latest, self.latest_rx)
+            if self.stale_key is not None:
+                self.send_dict[self.stale_key] = self.stale
+        return True if due is None else due
+
+    def _hold(self, packet):
+        """ keep <packet> for receive() to apply. The one it replaces is stale,
+            unless an edge key differs: then it is applied now, so no press is lost.
+        """
+        held = self.latest
+        if held is not None:
+            for key in self.edge_keys:
+                if held.get(key, _ABSENT) != packet.get(key, _ABSENT):
+                    self._apply(held, self.latest_rx)
+                    break
+            else:
+                self.stale += 1
+        self.latest = packet
+        self.latest_rx = self.rx_us
+
+    def _drop_held(self):
+        """ a connection event makes the control packet before it stale """
+        if self.latest is not None:
+            self.stale += 1
+            self.latest = None
+
+    def _decode(self, data):
+        """ the packet of a JSON line (dict or ControlSlots), None if it isn't one """
+        if self.parser is not None:
+            packet = self.parser.decode(data)
+            if packet is not None:
+                return packet
+        try:
+            data = json.loads(data)
+            if isinstance(data, str):
+                data = json.loads(data)
+        except ValueError as e:
+            pass
+            print("\033[0;31m[%s\033[0m"%e)
+            return None
+        return data
+
+    def _apply(self, data, rx_us=None):
+        """ hand a control packet (a dict, ControlSlots or a JSON line) read at <rx_us>
+            (default: the line just read) to on_receive()
+        """
+        if isinstance(data, str):
+            data = self._decode(data)
+            if data is None:
+                return False
+        if self.trace is not None:
+            self.trace.received(self.rx_us if rx_us is None else rx_us)
+        self._is_connected = True
+        if self.parser is not None:
+            # CommandDecoder compares the next packet with this one
+            self.parser.kept = data
+        self.on_receive(data)
+        return True
+
+    def _receive_one(self):
+        """ read and handle one line, None if there was none, else True if a reply is due """
+        queue = self.queue
+        if queue:
+            now = time.ticks_ms()
+            self._advance(now)
+        try:
+            receive = self.read()
+        except UnicodeError:
+            if not queue or queue[0].state != SENT:
+                raise
+            self._retry(queue[0], "UnicodeError", ValueError("UnicodeError"), now)
+            return False
+        if receive is not None and self.recorder is not None:
+            self.recorder.message(receive if isinstance(receive, str) else json.dumps(receive))
+        if queue and isinstance(receive, str) and self._reply(receive, now):
+            return False
         # if receive is not None:
         #     print(f"ws.loop received: {receive}")
             
         if receive == None:
-            self.send_data()
-            return
+            return None
+        elif isinstance(receive, dict) or receive.startswith("{") or receive.startswith('"'):
+            # a CONTROL frame, decoded without JSON, or a JSON line
+            if not self.coalesce:
+                return self._apply(receive)
+            if isinstance(receive, str):
+                receive = self._decode(receive)
+                if receive is None:
+                    return False
+            self._hold(receive)
+            return True
         elif receive.startswith("[CONNECTED]"):
+            self._drop_held()
             self._is_connected = True
+            # the new client has none of the unchanged fields yet
+            self.send_dict.refresh()
             print("Connected from %s" % receive.split(" ")[1])
-            self.send_data()
+            return True
         elif receive.startswith("[DISCONNECTED]"):
+            self._drop_held()
             self._is_connected = False
             print("Disconnected from %s" % receive.split(" ")[1])
         elif receive.startswith("[APPSTOP]"):
+            self._drop_held()
             self._is_connected = False
         else:
-            try:
-                data = json.loads(receive)
-                if isinstance(data, str):
-                    data = json.loads(data)
-                self._is_connected = True
-                self.on_receive(data)
-                self.send_data()
-            except ValueError as e:
-                pass
-                print("\033[0;31m[%s\033[0m"%e)
+            # not JSON either (e.g. GARBLED), reported by _apply()
+            return self._apply(receive)
+        return False
+
+    poll = receive
+
+    def loop(self):
+        if self.receive():
+            self.send_data()
         
         # if (time.ticks_ms() - self.last_send_time > self.SEND_INTERVAL):
         #     self.last_sent_time = None
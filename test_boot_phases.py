@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Test script for the concurrent boot phases (libs/boot_phases.py).
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import time
+
+from boot_phases import BootPhases
+
+
+def test_background_phase_overlaps():
+    boot = BootPhases()
+    boot.background("sensors", lambda: time.sleep_ms(150) or "follow")
+    boot.run("esp8266", time.sleep_ms, 100)
+    assert boot.join() == "follow"
+    boot.mark("drivable")
+    sensors, esp, drivable = boot.phases
+    assert sensors[3] == 1 and esp[3] == 0
+    assert esp[1] < sensors[2]                 # both ran at the same time
+    assert drivable[1] < 150 + 100
+    text = boot.describe()
+    assert "sensors" in text and "core 1" in text and "drivable at" in text
+    print("✓ " + text)
+
+
+def test_background_error_is_raised_by_join():
+    boot = BootPhases()
+
+    def broken():
+        raise OSError("no sensor")
+
+    boot.background("sensors", broken)
+    try:
+        boot.join()
+        assert False, "join() must raise the phase's exception"
+    except OSError as e:
+        assert "no sensor" in str(e)
+    print("✓ Background phase error raised by join()")
+
+
+if __name__ == "__main__":
+    test_background_phase_overlaps()
+    test_background_error_is_raised_by_join()
+    print("✓ All boot phase tests passed!")
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Test script for the binary calibration store (libs/calibration_store.py).
+
+Runs on the PC, the store only needs struct, array and binascii.
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append('libs')
+
+import calibration_store
+
+
+SAMPLE = {
+    "colors": ["terracotta", "green", "lila"],
+    "centroids": {
+        "all": {"terracotta": (149, 144, 130), "green": (142, 153, 110), "lila": (139, 146, 137)},
+        "left": {"terracotta": (150, 140, 131), "green": (140, 150, 112), "lila": (138, 147, 136)},
+    },
+    "threshold": 40,
+    "tables": {"lila_min": [150, 140, 110, 350], "lila_max": [200, 190, 160, 600]},
+}
+
+
+def test_round_trip():
+    """Everything written by save() comes back from load()"""
+    path = os.path.join(tempfile.mkdtemp(), "calibration.bin")
+    size = calibration_store.save(path, SAMPLE)
+    print(f"Calibration packed into {size} bytes")
+
+    data = calibration_store.load(path)
+    assert data["colors"] == SAMPLE["colors"]
+    assert data["centroids"] == SAMPLE["centroids"]
+    assert data["threshold"] == 40
+    assert list(data["tables"]["lila_max"]) == SAMPLE["tables"]["lila_max"]
+
+
+def test_corruption_detected():
+    """A flipped bit or truncated file is rejected instead of loaded"""
+    blob = bytearray(calibration_store.dumps(SAMPLE))
+    blob[10] ^= 0x01
+    for bad in (bytes(blob), calibration_store.dumps(SAMPLE)[:-6], b"not a calibration"):
+        try:
+            calibration_store.loads(bad)
+        except ValueError as e:
+            print(f"✓ Rejected: {e}")
+        else:
+            raise AssertionError("Corrupted calibration was accepted")
+
+
+if __name__ == "__main__":
+    test_round_trip()
+    test_corruption_detected()
+    print("✓ All calibration store tests passed!")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Test script for the car state and mode transition table (libs/car_state.py).
+"""
+
+import sys
+sys.path.append('libs')
+
+from car_state import (CarState, TRANSITIONS, STOPPED, IDLE, ARMED, LINE_TRACK,
+                       EV_START, EV_STOP, EV_LINE_TRACK_ON, EV_LINE_TRACK_OFF,
+                       EV_GO, EV_EXIT, EV_FINISH)
+
+
+def test_line_track_session():
+    """start -> line track on -> go -> lost connection -> go -> off -> stop"""
+    s = CarState()
+    assert s.mode == STOPPED and not s.start
+
+    # G and I are ignored until the car is started
+    assert not s.dispatch(EV_LINE_TRACK_ON)
+    assert not s.dispatch(EV_GO)
+
+    assert s.dispatch(EV_START)
+    assert s.mode == IDLE and s.start and not s.start_line_track
+    assert not s.dispatch(EV_START)   # repeated packets change nothing
+
+    assert s.dispatch(EV_LINE_TRACK_ON)
+    assert s.mode == ARMED and s.start_line_track and not s.line_track_active
+    assert s.dispatch(EV_GO)
+    assert s.mode == LINE_TRACK and s.line_track_active
+
+    s.move_status = 'left'
+    s.line_status = 'target found'
+    assert s.dispatch(EV_EXIT)
+    assert s.mode == ARMED
+    assert s.move_status == 'stop' and s.line_status is None
+
+    assert s.dispatch(EV_GO)
+    assert s.dispatch(EV_LINE_TRACK_OFF)
+    assert s.mode == IDLE
+    assert not s.dispatch(EV_LINE_TRACK_OFF)
+    assert s.dispatch(EV_STOP)
+    assert s.mode == STOPPED
+    assert s.transitions == 7 and s.last_event == EV_STOP
+    print("✓ Line track session")
+
+
+def test_finish_resets_the_route_flags():
+    s = CarState()
+    for event in (EV_START, EV_LINE_TRACK_ON, EV_GO):
+        s.dispatch(event)
+    s.line_status = "finish"
+    s.hub_reached = True
+    s.to_destination = True
+    assert s.dispatch(EV_FINISH)
+    assert s.mode == LINE_TRACK
+    assert s.line_status is None and not s.hub_reached and not s.to_destination
+    print("✓ Finish")
+
+
+def test_table_handlers_exist():
+    """Every transition targets a known mode and an existing handler"""
+    modes = (STOPPED, IDLE, ARMED, LINE_TRACK)
+    s = CarState()
+    for (mode, event), (next_mode, handler) in TRANSITIONS.items():
+        assert mode in modes and next_mode in modes
+        assert callable(getattr(s, handler)), handler
+    try:
+        s.unknown = 1
+        assert False, "CarState should only accept its slots"
+    except AttributeError:
+        pass
+    print("✓ Transition table")
+
+
+if __name__ == "__main__":
+    test_line_track_session()
+    test_finish_resets_the_route_flags()
+    test_table_handlers_exist()
+    print("✓ All car state tests passed!")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Test script for the coalescing WS_Server.receive() (coalesce=True):
+queued control packets are drained and only the newest is applied,
+using the fake UART and the ESP8266 bridge stand-in.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import ws as ws_module
+from send_dict import SendDict
+from esp_bridge import EspBridge
+
+
+def make_server(uart, **kwargs):
+    ws_module.UART = lambda *args, **kw: uart
+    try:
+        server = ws_module.WS_Server(name="test", mode="sta", coalesce=True, **kwargs)
+    finally:
+        ws_module.UART = fake_hw.UART
+    received = []
+    server.on_receive = received.append
+    return server, received
+
+
+def test_only_the_newest_packet_is_applied():
+    uart = fake_hw.esp8266_uart()
+    server, received = make_server(uart)
+    server.send_dict = SendDict()      # not the class wide one other tests see
+    server.stale_key = 'U'
+    uart.inject(b'{"Q": 1}\r\n{"Q": 2}\r\n{"Q": 3}\r\n')
+    assert server.receive() and received == [{'Q': 3}]
+    assert server.stale == 2 and server.send_dict['U'] == 2
+    assert server.is_connected() and server.pending() == 0
+    # nothing queued: nothing applied, a reply is still due
+    assert server.receive() and len(received) == 1
+    uart.inject(b'{"Q": 4}\r\n')
+    assert server.receive() and received[-1] == {'Q': 4} and server.stale == 2
+    assert "2 stale control packets skipped" in server.describe()
+    print("✓ only the newest control packet is applied")
+
+
+def test_connection_events_are_always_handled():
+    uart = fake_hw.esp8266_uart()
+    server, received = make_server(uart)
+    uart.inject(b'[CONNECTED] 192.168.4.2\r\n{"Q": 1}\r\n{"Q": 2}\r\n')
+    assert server.receive() and server.is_connected() and received == [{'Q': 2}]
+    # the packet before the disconnect must not reconnect the car
+    uart.inject(b'{"Q": 5}\r\n[DISCONNECTED] 192.168.4.2\r\n')
+    assert not server.receive() and not server.is_connected()
+    assert received == [{'Q': 2}] and server.stale == 2
+    uart.inject(b'[CONNECTED] 192.168.4.3\r\n{"Q": 6}\r\n')
+    assert server.receive() and server.is_connected() and received[-1] == {'Q': 6}
+    print("✓ connection events are handled in every drain")
+
+
+def test_drain_is_bounded():
+    uart = fake_hw.esp8266_uart()
+    server, received = make_server(uart)
+    n = server.MAX_DRAIN + 4
+    uart.inject(b"".join(b'{"Q": %d}\r\n' % i for i in range(n)))
+    server.receive()
+    assert received == [{'Q': server.MAX_DRAIN - 1}] and server.pending()
+    server.receive()
+    assert received[-1] == {'Q': n - 1} and server.stale == n - 2
+    print("✓ one receive() reads at most MAX_DRAIN lines")
+
+
+def test_a_press_in_a_dropped_packet_is_kept():
+    """ an edge key (CommandDecoder applies it on a change only) is never coalesced away """
+    from commands import CommandDecoder
+    uart = fake_hw.esp8266_uart()
+    server, received = make_server(uart, fast_decode=True)
+    pressed = []
+    throttle = []
+    commands = CommandDecoder((('Q', throttle.append, True), ('I', pressed.append, False)))
+    server.edge_keys = commands.edges
+
+    def on_receive(data):
+        received.append(data.dict())
+        commands.apply(data)
+
+    server.on_receive = on_receive
+    uart.inject(b'{"Q": 1, "I": false}\r\n{"Q": 2, "I": false}\r\n{"Q": 3, "I": true}\r\n'
+                b'{"Q": 4, "I": false}\r\n{"Q": 5, "I": false}\r\n')
+    assert server.receive()
+    # Q 1 and 4 are stale, the press and its release get through
+    assert [d['Q'] for d in received] == [2, 3, 5] and server.stale == 2
+    assert pressed == [False, True, False] and throttle == [2, 3, 5]
+    # packets decoded and dropped after the last applied one don't disturb the comparison
+    uart.inject(b'{"Q": 6, "I": false}\r\n{"Q": 7, "I": false}\r\n{"Q": 8, "I": true}\r\n')
+    server.receive()
+    assert pressed == [False, True, False, True] and throttle[-1] == 8
+    print("✓ a press in an intermediate packet is applied")
+
+
+def test_latency_is_stamped_for_the_applied_packet():
+    """ the trace gets the read time of the packet applied, not of the lines after it """
+    class Trace():
+        def __init__(self):
+            self.stamps = []
+
+        def received(self, rx_us=None):
+            self.stamps.append(rx_us)
+
+        def decoded(self, data=None):
+            pass
+
+    uart = fake_hw.esp8266_uart()
+    server, received = make_server(uart)
+    server.trace = Trace()
+    ticks_us = ws_module.time.ticks_us
+    clock = iter(range(100, 1000, 100))
+    ws_module.time.ticks_us = lambda: next(clock)
+    try:
+        uart.inject(b'{"Q": 1}\r\n{"Q": 2}\r\nGARBLED\r\n')
+        server.receive()
+    finally:
+        ws_module.time.ticks_us = ticks_us
+    # read at 100, 200 and 300 us: Q 2 was read at 200
+    assert received == [{'Q': 2}] and server.trace.stamps == [200]
+    print("✓ the latency trace starts at the applied packet")
+
+
+def test_binary_control_frames():
+    uart = fake_hw.UART(1)
+    bridge = EspBridge(uart)
+    server, received = make_server(uart, binary=True)
+    assert server.start() and server.frames is not None
+    bridge.connect()
+    for q in (10, 20, 30):
+        bridge.app_send({"Q": q, "K": "forward"})
+    assert server.receive() and server.is_connected()
+    assert len(received) == 1 and received[0]['Q'] == 30 and server.stale == 2
+    print("✓ binary CONTROL frames are coalesced too")
+
+
+if __name__ == "__main__":
+    test_only_the_newest_packet_is_applied()
+    test_connection_events_are_always_handled()
+    test_drain_is_bounded()
+    test_a_press_in_a_dropped_packet_is_kept()
+    test_latency_is_stamped_for_the_applied_packet()
+    test_binary_control_frames()
+    print("✓ All coalescing tests passed!")
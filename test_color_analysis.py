@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Test script for the host-side colour analysis tool (tools/color_analysis.py).
+
+Needs NumPy, the tests are skipped without it.
+"""
+
+import os
+import sys
+import tempfile
+import time
+sys.path.insert(0, 'tools')
+
+import pytest
+
+np = pytest.importorskip("numpy")
+import color_analysis
+
+import fake_hw
+fake_hw.install()
+import calibration_store
+from classes.follow import Follow
+
+
+def test_conversions_match_follow():
+    """The vectorized conversions give the same RGB as the Follow methods"""
+    rng = np.random.default_rng(1)
+    raw = rng.integers(0, 3000, (2000, 4))
+    raw[:20, 3] = 0
+    raw[20:40, :3] = 0
+    for name, convert in color_analysis.CONVERSIONS.items():
+        method = getattr(Follow, name)
+        expected = np.array([method(None, *map(int, row)) for row in raw])
+        assert (convert(raw) == expected).all(), name
+    print("✓ Vectorized conversions match Follow")
+
+
+def test_analysis_writes_loadable_calibration():
+    """Synthetic logs are classified well and produce a valid calibration file"""
+    raw, sensors, labels = color_analysis.synthetic(200000)
+    t0 = time.perf_counter()
+    calibration, summary = color_analysis.analyze(raw, sensors, labels, verbose=False)
+    print(f"Analysis of {len(raw)} samples took {time.perf_counter() - t0:.2f} s")
+    assert max(summary["accuracy"].values()) > 0.9 or summary["box_accuracy"] > 0.9
+
+    path = os.path.join(tempfile.mkdtemp(), "calibration.bin")
+    calibration_store.save(path, calibration)
+    data = calibration_store.load(path)
+    assert data["colors"] == calibration["colors"]
+    assert set(data["centroids"]) == {"all", "left", "middle", "right"}
+    assert color_analysis.ALGORITHMS[data["tables"]["rgb_algorithm"][0]] == summary["best"]
+    assert len(data["tables"]["box_lo"]) == len(calibration["colors"]) * 3 * 4
+
+
+def test_load_csv():
+    """CSV logs with a header and sensor names are parsed"""
+    path = os.path.join(tempfile.mkdtemp(), "log.csv")
+    with open(path, "w") as f:
+        f.write("r,g,b,c,sensor,label\n614,572,481,1644,left,Lila\n319,313,277,851,2,blue\n")
+    raw, sensors, labels = color_analysis.load_csv([path])
+    assert raw.tolist() == [[614, 572, 481, 1644], [319, 313, 277, 851]]
+    assert sensors.tolist() == [0, 2]
+    assert labels.tolist() == ["lila", "blue"]
+
+
+if __name__ == "__main__":
+    test_conversions_match_follow()
+    test_analysis_writes_loadable_calibration()
+    test_load_csv()
+    print("✓ All colour analysis tests passed!")
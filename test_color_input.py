@@ -28,6 +28,7 @@ class MockTCS34725:
 
 # Mock the hardware modules for PC testing
 import sys
+sys.path.append('libs')
 class MockMachine:
     Pin = MockPin
     SoftI2C = MockSoftI2C
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Test script for the diff-based command decoder (libs/commands.py).
+"""
+
+import sys
+sys.path.append('libs')
+
+from commands import CommandDecoder, MISSING
+
+
+def recorder(calls, key, result=None):
+    def handler(value):
+        calls.append((key, value))
+        return result() if callable(result) else result
+    return handler
+
+
+def test_only_changed_keys_are_dispatched():
+    calls = []
+    decoder = CommandDecoder((
+        ('Q', recorder(calls, 'Q'), True),
+        ('G', recorder(calls, 'G'), False),
+        ('N', recorder(calls, 'N'), False),
+    ))
+    packet = {'Q': 50, 'G': True, 'N': False}
+    decoder.apply(packet)
+    assert calls == [('Q', 50), ('G', True), ('N', False)]
+
+    # identical packets only run the level keys
+    del calls[:]
+    for _ in range(3):
+        decoder.apply(dict(packet))
+    assert calls == [('Q', 50)] * 3
+
+    del calls[:]
+    decoder.apply({'Q': 0, 'G': True, 'N': True})
+    assert calls == [('Q', 0), ('N', True)]
+
+    # a missing key is passed as MISSING once, null as None
+    del calls[:]
+    decoder.apply({'Q': 0, 'N': True})
+    decoder.apply({'Q': 0, 'N': True})
+    assert calls == [('Q', 0), ('G', MISSING), ('Q', 0)]
+    decoder.apply({'Q': 0, 'G': None, 'N': True})
+    assert calls[-1] == ('G', None)
+    assert decoder.skipped > 0
+    print(f"✓ {decoder.calls} handler calls, {decoder.skipped} skipped")
+
+
+def test_retry_and_forget():
+    """A handler returning False is retried, forget() re-applies a key"""
+    calls = []
+    started = []
+    decoder = CommandDecoder((
+        ('E', recorder(calls, 'E'), False),
+        ('G', recorder(calls, 'G', lambda: bool(started)), False),
+    ))
+    packet = {'E': False, 'G': True}
+    decoder.apply(packet)
+    decoder.apply(dict(packet))
+    assert calls.count(('G', True)) == 2
+
+    started.append(True)
+    decoder.apply(dict(packet))
+    decoder.apply(dict(packet))
+    assert calls.count(('G', True)) == 3
+
+    decoder.forget('G')
+    decoder.apply(dict(packet))
+    assert calls.count(('G', True)) == 4
+    assert calls.count(('E', False)) == 1
+    print("✓ Retry and forget")
+
+
+def test_null_direction_releases_the_dpad():
+    """K: null after a direction releases the d-pad, a packet without K does not"""
+    sys.path.insert(0, 'tools')
+    import fake_hw
+    fake_hw.install()
+    import tempfile
+    import replay
+    main = replay.import_main(tempfile.mkdtemp())
+    replay.reset_main(main)
+    try:
+        main.on_receive({"E": True, "K": "forward", "Q": 50})
+        assert main.state.start and main.state.dpad_touched
+        assert main.state.move_status == 'forward'
+        main.on_receive({"E": True, "K": None, "Q": 50})
+        assert not main.state.dpad_touched and main.state.move_status == 'stop'
+        # a packet without K leaves the d-pad alone
+        main.on_receive({"E": True, "K": "left", "Q": 50})
+        main.on_receive({"E": True, "Q": 50})
+        assert main.state.dpad_touched and main.state.move_status == 'left'
+    finally:
+        replay.reset_main(main)
+    print("✓ K: null releases the d-pad")
+
+
+if __name__ == "__main__":
+    test_only_changed_keys_are_dispatched()
+    test_retry_and_forget()
+    test_null_direction_releases_the_dpad()
+    print("✓ All command decoder tests passed!")
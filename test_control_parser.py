@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Test script for the fast-path control packet decoder (libs/control_parser.py)
+and WS_Server(fast_decode=True), using the fake UART.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import json
+
+from control_parser import ControlParser, ControlSlots
+from commands import CommandDecoder
+import ws as ws_module
+
+APP_PACKET = {
+    "A": 0, "B": 0, "C": 0, "D": 0, "E": True, "F": False, "G": True,
+    "H": False, "I": False, "J": 0, "K": "forward", "L": 0, "M": False,
+    "N": False, "O": False, "P": False, "Q": 60, "R": 0, "S": None,
+}
+
+
+def test_same_result_as_json():
+    parser = ControlParser()
+    lines = [
+        json.dumps(APP_PACKET),
+        json.dumps(dict(APP_PACKET, Q=-100)),
+        json.dumps(dict(APP_PACKET, Q=-100, K="left", E=False)),
+        '{"Q":5,"K":"stop"}',                       # other shape, no blanks
+        '{"K": "stop", "Q": 5}',                    # other key order
+        json.dumps(APP_PACKET),
+    ]
+    for line in lines:
+        data = parser.decode(line)
+        assert isinstance(data, ControlSlots), line
+        assert data == json.loads(line) and data.dict() == json.loads(line)
+    assert data.get('Q') == 60 and data['K'] == "forward" and data.get('S', 1) is None
+    assert 'E' in data and 'T' not in data and data.get('Z', 7) == 7
+    assert parser.fallbacks == 0
+    print("✓ ControlParser decodes like json.loads()")
+
+
+def test_fallback_to_json():
+    parser = ControlParser()
+    for line in ('{"Q": 1.5}', '{"D": [1, 2]}', '{"K": "a\\"b"}', '{"Z": 1}',
+                 '"{\\"Q\\": 1}"', '{}', '{"K": "x, y"}', 'GARBLED'):
+        assert parser.decode(line) is None, line
+    assert parser.fallbacks == 8
+    # a good line after a fallback is decoded in full again
+    assert parser.decode('{"Q": 3}') == {'Q': 3}
+    print("✓ other shapes are left to json.loads()")
+
+
+def test_command_decoder_sees_changes():
+    parser = ControlParser()
+    seen = []
+    commands = CommandDecoder((('Q', seen.append, False),))
+    line = json.dumps(APP_PACKET)
+    first = parser.decode(line)
+    commands.apply(first)
+    assert parser.decode(line) is first and parser.repeated == 1
+    commands.apply(first)
+    second = parser.decode(json.dumps(dict(APP_PACKET, Q=61)))
+    assert second is not first and second != first
+    commands.apply(second)
+    assert seen == [60, 61] and first.get('Q') == 60
+    print("✓ the last packet stays valid for CommandDecoder")
+
+
+def test_ws_server_fast_decode():
+    uart = fake_hw.esp8266_uart()
+    ws_module.UART = lambda *args, **kwargs: uart
+    try:
+        server = ws_module.WS_Server(name="test", mode="sta", fast_decode=True)
+    finally:
+        ws_module.UART = fake_hw.UART
+    received = []
+    server.on_receive = received.append
+    uart.inject(b'{"Q": 40, "K": "left"}\r\n{"Q": 0.5}\r\n')
+    assert server.receive() and isinstance(received[0], ControlSlots)
+    assert received[0] == {'Q': 40, 'K': "left"}
+    assert server.receive() and received[1] == {'Q': 0.5}
+    assert "1 decoded" in server.describe() and "1 to json.loads()" in server.describe()
+    print("✓ WS_Server fast_decode")
+
+
+if __name__ == "__main__":
+    test_same_result_as_json()
+    test_fallback_to_json()
+    test_command_decoder_sees_changes()
+    test_ws_server_fast_decode()
+    print("✓ All control parser tests passed!")
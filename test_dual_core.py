@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Test script for the dual-core acquisition: the _thread backed Lockable,
+the double-buffered sensor frame and the core 1 acquisition loop.
+Threads stand in for the second core.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import threading
+import time
+
+from acquisition import Acquisition
+from classes.lock import Lockable
+from sensor_frame import Frame, FrameBuffer
+
+
+class FakeTCS():
+    def __init__(self, base):
+        self.base = base
+        self.n = 0
+        self._active = False
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = value
+
+    def read(self):
+        self.n += 1
+        time.sleep(0.002)
+        return (self.base + self.n, self.base + self.n, self.base + self.n, self.base + self.n)
+
+
+class FakeFollow():
+    def __init__(self):
+        self.left_sensor = FakeTCS(0)
+        self.middle_sensor = FakeTCS(1000)
+        self.right_sensor = FakeTCS(2000)
+
+
+def test_lockable_between_threads():
+    """try_lock fails while another thread holds the lock"""
+    resource = Lockable()
+    assert resource.try_lock()
+    assert resource._locked
+    results = []
+    t = threading.Thread(target=lambda: results.append(resource.try_lock()))
+    t.start()
+    t.join()
+    assert results == [False]
+
+    t = threading.Thread(target=lambda: results.append(resource.lock(1)))
+    t.start()
+    time.sleep(0.05)
+    resource.unlock()
+    t.join()
+    assert results == [False, True]
+    resource.unlock()
+    assert not resource._locked
+    assert Lockable()._get_lock() is not resource._get_lock()
+
+    # a holder that never lets go: lock(timeout) gives up instead of hanging
+    assert resource.try_lock()
+    t = threading.Thread(target=lambda: results.append(resource.lock(0.05)))
+    t0 = time.time()
+    t.start()
+    t.join(1)
+    assert not t.is_alive() and results[-1] is False and time.time() - t0 < 0.5
+    resource.unlock()
+    print("✓ Lockable holds across threads")
+
+
+def test_frame_buffer_never_returns_torn_frames():
+    """Readers only see complete frames while the writer publishes"""
+    frames = FrameBuffer()
+    stop = []
+
+    def writer():
+        n = 0
+        while not stop:
+            n += 1
+            frame = frames.back()
+            for i in range(12):
+                frame.colors[i] = n & 0xFFFF
+                if i == 6:
+                    time.sleep(0)
+            frame.grayscale[0] = n & 0xFFFF
+            frames.publish()
+
+    frame = Frame()
+    assert frames.read(frame) == 0
+    t = threading.Thread(target=writer)
+    t.start()
+    reads = 0
+    try:
+        t_end = time.time() + 0.3
+        while time.time() < t_end:
+            seq = frames.read(frame)
+            if seq and frame.seq == seq:
+                reads += 1
+                assert len(set(frame.colors)) == 1, list(frame.colors)
+                assert frame.grayscale[0] == frame.colors[0]
+    finally:
+        stop.append(True)
+        t.join()
+    print(f"✓ {reads} consistent reads, {frames.torn} retried")
+
+
+def test_frame_buffer_gives_up_without_touching_the_reader():
+    """After RETRIES torn copies read() returns 0 and the reader keeps its frame"""
+    frames = FrameBuffer()
+    frames.back().colors[0] = 7
+    frames.publish()
+    frame = Frame()
+    assert frames.read(frame) == 1 and frame.colors[0] == 7
+
+    class Racing(Frame):
+        # the writer publishes during every copy
+        def copy_from(self, other):
+            Frame.copy_from(self, other)
+            frames.back().colors[0] = 9
+            frames.publish()
+
+    frames.scratch = Racing()
+    assert frames.read(frame) == 0
+    assert frame.seq == 1 and frame.colors[0] == 7
+    assert frames.failed == 1 and frames.torn == FrameBuffer.RETRIES
+    print("✓ a read that can't get a whole frame keeps the previous one")
+
+
+def test_acquisition_thread():
+    """Acquisition publishes frames from its own thread until stopped"""
+    follow = FakeFollow()
+    acq = Acquisition(follow, period_ms=5)
+    acq.start()
+    time.sleep(0.2)
+    assert acq.stop()
+    assert follow.left_sensor.active()
+
+    frame = Frame()
+    seq = acq.frames.read(frame)
+    assert seq > 5, seq
+    assert acq.errors == 0
+    left, middle, right = frame.raw
+    assert tuple(left) == (follow.left_sensor.n,) * 4
+    assert tuple(right) == (2000 + follow.right_sensor.n,) * 4
+
+    # no frames after stop()
+    time.sleep(0.05)
+    assert acq.frames.seq == seq
+    print(f"✓ Acquisition published {seq} frames")
+
+
+if __name__ == "__main__":
+    test_lockable_between_threads()
+    test_frame_buffer_never_returns_torn_frames()
+    test_frame_buffer_gives_up_without_touching_the_reader()
+    test_acquisition_thread()
+    print("✓ All dual-core tests passed!")
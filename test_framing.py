@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""
+Test script for the binary Pico <-> ESP8266 framing (libs/framing.py),
+WS_Server on the binary link and the host bridge (tools/esp_bridge.py).
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import json
+import os
+import tempfile
+
+import framing
+from esp_bridge import EspBridge, APP_PACKET
+import ws as ws_module
+import logger as logger_module
+
+
+def test_frames_survive_noise():
+    assert framing.crc16(b"123456789") == 0x29B1
+    uart = fake_hw.UART(1)
+    reader = framing.FrameReader(uart, size=64)
+    good = framing.frame(framing.TEXT, b"[CONNECTED] 1.2.3.4")
+    bad = bytearray(framing.frame(framing.TEXT, b"garbage"))
+    bad[5] ^= 0xFF
+    uart.inject(b"\x00\x42" + bytes(bad) + good[:7])
+    assert reader.read() is None               # the good frame is incomplete
+    uart.inject(good[7:] + good)
+    kind, payload = reader.read()
+    assert kind == framing.TEXT and bytes(payload) == b"[CONNECTED] 1.2.3.4"
+    assert reader.read() is not None and reader.read() is None
+    assert reader.crc_errors == 1 and reader.frames == 2
+    print("✓ " + reader.describe())
+
+
+def test_control_round_trip():
+    decoder = framing.ControlDecoder()
+    payload = framing.pack_control(APP_PACKET)
+    assert len(payload) == 14
+    data = decoder.decode(memoryview(payload))
+    assert data['Q'] == 60 and data['K'] == "forward"
+    assert data['E'] is True and data['S'] is False and 'A' not in data
+    assert decoder.decode(payload) is data     # unchanged packet, same dict
+    other = decoder.decode(framing.pack_control({'K': "sideways", 'Q': 500}))
+    assert other == {'K': "stop", 'Q': 127}
+    print("✓ Control packet %d bytes" % len(payload))
+
+
+def test_null_values_cross_the_link():
+    """null is kept apart from a missing key and from false"""
+    decoder = framing.ControlDecoder()
+    assert decoder.decode(framing.pack_control({'K': None})) == {'K': None}
+    assert decoder.decode(framing.pack_control({'E': None, 'G': False, 'Q': None})) == \
+        {'E': None, 'G': False, 'Q': None}
+    assert decoder.decode(framing.pack_control({})) == {}
+    print("✓ null values")
+
+
+def server_on(bridge, binary=True):
+    ws_module.UART = lambda *args, **kwargs: bridge.uart
+    try:
+        server = ws_module.WS_Server(name="car", mode="ap", binary=binary)
+    finally:
+        ws_module.UART = fake_hw.UART
+    assert server.start()
+    return server
+
+
+def test_ws_server_binary_link():
+    bridge = EspBridge(fake_hw.UART(1))
+    server = server_on(bridge)
+    assert bridge.binary and server.frames is not None
+    received = []
+    server.on_receive = received.append
+    bridge.connect()
+    assert server.receive() and server.is_connected()
+    bridge.app_send(dict(APP_PACKET, Q=-20))
+    assert server.receive() and received[0]['Q'] == -20
+
+    d = server.send_dict
+    d['B'] = 12.34
+    d['C'] = 1.5
+    d['D'] = [30, 42]
+    d['J'] = 1
+    d['T'] = [1, 2, 3]
+    server.send_data()
+    app = json.loads(bridge.app_frames[-1])
+    assert app == {'Name': "car", 'Type': "PICO-4WD Car", 'Check': "SC",
+                   'B': 12.34, 'C': 1.5, 'D': [30, 42], 'J': 1, 'T': [1, 2, 3]}
+    sent = bridge.pico_bytes
+    d['B'] = 3.0
+    server.send_data()
+    assert bridge.pico_bytes - sent == 16      # only the TELEMETRY frame
+    assert json.loads(bridge.app_frames[-1])['B'] == 3.0
+
+    # the ESP8266 comes back on text after a reset
+    server.set("RESET", timeout=1000)
+    assert not bridge.binary and server.frames is None
+    bridge.app_send({'Q': 5})
+    assert server.receive() and received[-1] == {'Q': 5}
+    print("✓ WS_Server on the binary link")
+
+
+def test_null_direction_over_the_bridge():
+    """main.py releases the d-pad on "K": null sent by the app over the binary link"""
+    import replay
+    main = replay.import_main(tempfile.mkdtemp())
+    replay.reset_main(main)
+    bridge = EspBridge(fake_hw.UART(1))
+    server = server_on(bridge)
+    server.on_receive = main.on_receive
+    try:
+        bridge.connect()
+        server.receive()
+        bridge.app_send({"E": True, "K": "forward", "Q": 50})
+        assert server.receive()
+        assert main.state.start and main.state.dpad_touched
+        bridge.app_send({"E": True, "K": None, "Q": 50})
+        assert server.receive()
+        assert not main.state.dpad_touched and main.state.move_status == 'stop'
+    finally:
+        replay.reset_main(main)
+    print("✓ K: null releases the d-pad on the binary link")
+
+
+def test_text_firmware_fallback():
+    bridge = EspBridge(fake_hw.UART(1), binary_supported=False)
+    timeout = ws_module.WS_Server.WS_TIMEOUT
+    ws_module.WS_Server.WS_TIMEOUT = 300       # the retries of SET+BINARY
+    # log() goes to a temporary file, not to the repository's log.txt
+    shared = logger_module.logger
+    logger = logger_module.logger = logger_module.Logger(os.path.join(tempfile.mkdtemp(), "log.txt"))
+    try:
+        server = server_on(bridge)
+        logger.flush()
+    finally:
+        ws_module.WS_Server.WS_TIMEOUT = timeout
+        logger_module.logger = shared
+    with open(logger.path) as f:
+        assert "no binary framing" in f.read()
+    assert server.frames is None and not bridge.binary
+    bridge.app_send({'Q': 7})
+    received = []
+    server.on_receive = received.append
+    assert server.receive() and received == [{'Q': 7}]
+    print("✓ Text link kept without firmware support")
+
+
+if __name__ == "__main__":
+    test_frames_survive_noise()
+    test_control_round_trip()
+    test_null_values_cross_the_link()
+    test_ws_server_binary_link()
+    test_null_direction_over_the_bridge()
+    test_text_firmware_fallback()
+    print("✓ All framing tests passed!")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for the command to PWM latency trace (libs/latency.py) and
+the fake UART harness (tools/latency_harness.py).
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+from classes.motor import Motor
+from latency import LatencyTrace
+import latency_harness
+
+
+def test_first_duty_change_closes_the_packet():
+    trace = LatencyTrace(echo_key='Z')
+    motor = Motor(17, 16)
+    Motor.trace = trace
+    try:
+        motor.run(10)                  # no packet pending, not counted
+        trace.received()
+        trace.decoded({'Q': 10, 'Z': 7})
+        motor.run(20)                  # toward the old target, before the packet set one
+        assert trace.pending
+        motor.target_power = 30
+        trace.targets_set()
+        motor.run(30)
+        motor.run(25)                  # the same packet only counts once
+        assert trace.actuated_packets == 1 and not trace.pending
+        assert trace.stats.count(2) == 1 and trace.last_us >= 0
+
+        # a packet without a duty change before the next one
+        trace.received()
+        trace.decoded({'Q': 30})
+        trace.received()
+        trace.decoded({'Q': 30})
+        assert trace.unactuated == 1 and trace.packets == 3
+    finally:
+        Motor.trace = None
+
+    send_dict = {}
+    trace.publish(send_dict)
+    assert send_dict['Z'] == [3, trace.last_us]   # no 'Z' in the packet: its number
+    print("✓ " + trace.describe())
+
+
+def test_rewriting_the_duty_does_not_close_the_packet():
+    """ the idle stop() of every control period rewrites run(0), that is no actuation """
+    import motors
+    trace = LatencyTrace()
+    Motor.trace = trace
+    try:
+        motors.stop()
+        trace.received()
+        trace.decoded({'Q': 0})
+        for _ in range(3):
+            motors.stop()              # targets set, but every duty stays 0
+        assert trace.pending and trace.actuated_packets == 0
+        motors.halt()                  # the watchdog is not the packet either
+        motors.resume()
+        assert trace.pending and trace.actuated_packets == 0
+        motors.set_motors_power([40, 40, 40, 40])
+        assert not trace.pending and trace.actuated_packets == 1
+        trace.received()
+        trace.decoded({'Q': 40})
+        trace.received()
+        trace.decoded({'Q': 40})
+        assert trace.unactuated == 1
+    finally:
+        Motor.trace = None
+        motors.stop()
+    print("✓ only a duty change toward a new target closes a packet")
+
+
+def test_harness_over_fake_uart():
+    trace = latency_harness.run(duration=0.3)
+    assert trace.packets >= 4
+    assert trace.actuated_packets + trace.unactuated >= trace.packets - 1
+    assert trace.app.count(0) == trace.actuated_packets
+    assert Motor.trace is None
+    print("✓ Harness: " + trace.describe())
+
+
+if __name__ == "__main__":
+    test_first_duty_change_closes_the_packet()
+    test_rewriting_the_duty_does_not_close_the_packet()
+    test_harness_over_fake_uart()
+    print("✓ All latency tests passed!")
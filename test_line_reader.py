@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test script for the ring-buffered UART line reader (libs/line_reader.py)
+and WS_Server.read() on top of it, polled and from the RX interrupt,
+using the fake UART.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+from line_reader import LineReader
+import ws as ws_module
+
+
+def test_partial_and_wrapped_lines():
+    uart = fake_hw.UART(1)
+    reader = LineReader(uart, size=32)
+    assert reader.readline() is None
+
+    uart.inject(b'{"A": 1')
+    assert reader.readline() is None          # incomplete, nothing blocks
+    uart.inject(b'}\r\n{"B": 2}\n')
+    assert bytes(reader.readline()) == b'{"A": 1}'
+    assert bytes(reader.readline()) == b'{"B": 2}'
+    assert reader.readline() is None
+
+    # lines crossing the end of the ring come out in one piece
+    for n in range(10):
+        line = b'{"Q": %d}' % (n * 1111)
+        uart.inject(line + b"\r\n")
+        assert bytes(reader.readline()) == line
+    assert reader.lines == 12 and reader.dropped == 0
+    assert 0 < reader.high_water <= 32
+    print("✓ " + reader.describe())
+
+
+def test_overflow_is_counted():
+    uart = fake_hw.UART(1)
+    reader = LineReader(uart, size=16)
+    uart.inject(b"0123456789\n0123456789\n")
+    assert bytes(reader.readline()) == b"0123456789"
+    assert reader.dropped == 6 and reader.high_water == 16
+    assert reader.readline() is None          # the cut off second line stays until its end
+
+    # a line longer than the ring is dropped, the next one is read again
+    reader = LineReader(uart, size=24)
+    for _ in range(8):
+        uart.inject(b"x" * 8)
+        assert reader.readline() is None
+    uart.inject(b"\n")
+    assert bytes(reader.readline()) == b"x" * 16   # the rest after the resync
+    uart.inject(b"[CONNECTED] 1.2.3.4\r\n")
+    assert bytes(reader.readline()) == b"[CONNECTED] 1.2.3.4"
+    assert reader.dropped == 48
+    print("✓ Overflow: " + reader.describe())
+
+
+def test_ws_server_read():
+    uart = fake_hw.esp8266_uart()
+    ws_module.UART = lambda *args, **kwargs: uart
+    try:
+        server = ws_module.WS_Server(name="test", mode="sta")
+    finally:
+        ws_module.UART = fake_hw.UART
+    uart.inject(b"[DEBUG] esp log\r\n[CONNECTED] 192.168.4.2\r\n")
+    assert server.read() == "[CONNECTED] 192.168.4.2"
+    uart.inject(b'{"E": true}\r\n')
+    assert server.read() == '{"E": true}'
+    assert server.read() is None
+    print("✓ WS_Server.read()")
+
+
+def test_irq_fills_the_ring():
+    uart = fake_hw.UART(1)
+    reader = LineReader(uart, size=32)
+    assert reader.start_irq()
+    uart.inject(b'{"A": 1')                  # the fake UART calls the handler
+    assert not reader.pending() and reader.readline() is None
+    uart.inject(b'}\r\n{"B": 2}\n{"C"')
+    assert reader.pending()
+    assert bytes(reader.readline()) == b'{"A": 1}'
+    assert bytes(reader.readline()) == b'{"B": 2}'
+    assert not reader.pending() and reader.readline() is None
+
+    # readline() leaves the UART to the interrupt
+    uart.rx.extend(b': 3}\n')
+    assert reader.readline() is None and uart.any() == 5
+    uart.inject(b"")
+    assert bytes(reader.readline()) == b'{"C": 3}'
+
+    # lines wrapping the ring, and an overflow between two interrupts
+    for n in range(10):
+        uart.inject(b'{"Q": %d}\r\n' % (n * 1111))
+        assert bytes(reader.readline()) == b'{"Q": %d}' % (n * 1111)
+    uart.inject(b"0123456789\n" * 4)
+    assert reader.rx_dropped == 12 and reader.high_water == 32
+    assert [bytes(reader.readline()) for _ in range(2)] == [b"0123456789"] * 2
+    assert reader.readline() is None          # the cut off third line
+    reader.stop_irq()
+    assert uart._irq_handler is None
+    print("✓ IRQ " + reader.describe())
+
+
+def test_ws_server_irq_backend():
+    uart = fake_hw.esp8266_uart()
+    ws_module.UART = lambda *args, **kwargs: uart
+    try:
+        server = ws_module.WS_Server(name="test", mode="sta", rx_irq=True)
+    finally:
+        ws_module.UART = fake_hw.UART
+    assert server.rx_irq and server.reader.irqs > 0     # the RESET reply
+    uart.inject(b'{"E": tr')
+    assert not server.pending()
+    uart.inject(b'ue}\r\n')
+    assert server.pending() and server.read() == '{"E": true}'
+    print("✓ WS_Server rx_irq backend")
+
+
+if __name__ == "__main__":
+    test_partial_and_wrapped_lines()
+    test_overflow_is_counted()
+    test_ws_server_read()
+    test_irq_fills_the_ring()
+    test_ws_server_irq_backend()
+    print("✓ All line reader tests passed!")
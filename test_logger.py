@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Test script for the buffered logger (libs/logger.py).
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import os
+import tempfile
+
+from logger import Logger
+
+
+def test_records_stay_in_ram_until_flushed():
+    path = os.path.join(tempfile.mkdtemp(), "log.txt")
+    logger = Logger(path, capacity=4)
+    for n in range(6):
+        logger.log("event %d" % n)
+    assert not os.path.exists(path)
+    logger.flush(lambda f: f.write("\n> dump"))
+    with open(path) as f:
+        text = f.read()
+    assert text == "\n> [2 log records lost]\n> event 2\n> event 3\n> event 4\n> event 5\n> dump"
+    assert logger.count == 0 and logger.flush() == 0 and logger.flushes == 1
+
+    try:
+        raise ValueError("boom")
+    except ValueError as e:
+        logger.exception(e)                    # written at once
+    with open(path) as f:
+        assert "ValueError: boom" in f.read()
+    print("✓ " + logger.describe())
+
+
+def test_rotation_at_the_size_cap():
+    path = os.path.join(tempfile.mkdtemp(), "log.txt")
+    logger = Logger(path, max_bytes=100)
+    for n in range(3):
+        logger.log("x" * 60)
+        logger.flush()
+    assert logger.rotations == 1
+    assert os.path.getsize(path + ".1") == 126 and os.path.getsize(path) == 63
+    print("✓ Rotated to %s.1" % os.path.basename(path))
+
+
+if __name__ == "__main__":
+    test_records_stay_in_ram_until_flushed()
+    test_rotation_at_the_size_cap()
+    print("✓ All logger tests passed!")
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test script for the route navigator (libs/navigator.py). Every step()
+gets one set of colour names and must return right away.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+from navigator import Navigator, FINISHED, FAILED, IDLE, ROUTE
+
+HUB = "green"
+LINE = "lila"
+DEST = "terracotta"
+NONE = "blue"
+SPIN = ROUTE[2][5]
+
+
+def drive(nav, frames, t0=0, period=20):
+    """ step through (left, middle, right) frames, return the directions """
+    directions = []
+    for i, colors in enumerate(frames):
+        directions.append(nav.step(colors, t0 + i * period))
+    return directions
+
+
+def test_full_route():
+    nav = Navigator(HUB, DEST)
+    start = (HUB, HUB, NONE)
+    nav.start(LINE, start, 0)
+    assert nav.status == "leave hub"
+
+    frames = [
+        (HUB, HUB, NONE),       # follow the hub colour
+        (HUB, NONE, NONE),
+        (HUB, HUB, LINE),       # line seen: to destination
+        (NONE, LINE, NONE),
+        (NONE, NONE, LINE),
+        (LINE, LINE, LINE),     # line end: spin until the line is seen again
+        (DEST, NONE, NONE),
+        (NONE, DEST, NONE),
+        (NONE, LINE, DEST),     # line again: way back
+        (LINE, NONE, NONE),
+        (NONE, HUB, NONE),      # hub reached
+        (NONE, HUB, NONE),
+    ]
+    statuses = []
+    directions = []
+    events = []
+    for i, colors in enumerate(frames):
+        directions.append(nav.step(colors, i * 20))
+        statuses.append(nav.status)
+        events.append(nav.event)
+    assert directions == ["forward", "left", "right", "forward", "right", SPIN,
+                          SPIN, SPIN, "forward", "left", "stop", "stop"], directions
+    assert statuses[2] == "to destination" and statuses[5] == "turn"
+    assert statuses[8] == "way back" and statuses[10] == FINISHED
+    assert events.count(FINISHED) == 1 and events[10] == FINISHED
+    print("✓ Hub -> line -> destination -> hub")
+
+
+def test_turn_waits_for_the_line_to_return():
+    nav = Navigator(HUB, DEST)
+    nav.start(LINE, (NONE, LINE, NONE), 0)
+    # the line end stays under the sensors for a few ticks
+    directions = drive(nav, [(NONE, LINE, NONE)] + [(LINE, LINE, LINE)] * 4)
+    assert nav.status == "turn" and directions[1:] == [SPIN] * 4
+    # the line is out of sight: keep spinning, also past lost_ms
+    directions = drive(nav, [(LINE, DEST, NONE), (DEST, DEST, NONE), (NONE, DEST, NONE)], t0=100)
+    assert directions == [SPIN] * 3
+    assert nav.step((NONE, NONE, NONE), 2500) == SPIN
+    assert nav.status == "turn"
+    assert nav.step((NONE, LINE, NONE), 2520) == "forward" and nav.status == "way back"
+    print("✓ The turn ends only when the line shows up again")
+
+
+def test_start_on_the_line_skips_the_hub():
+    nav = Navigator(HUB, DEST)
+    nav.start(LINE, (NONE, LINE, NONE), 0)
+    assert nav.status == "to destination"
+    assert nav.step((NONE, LINE, NONE), 0) == "forward"
+    print("✓ Start on the line")
+
+
+def test_timeout_and_lost_line_fail():
+    nav = Navigator(HUB, DEST, lost_ms=100)
+    nav.start(LINE, (NONE, LINE, NONE), 0)
+    assert drive(nav, [(NONE, NONE, LINE)] + [(NONE, NONE, NONE)] * 6) == ["right"] * 7
+    assert nav.step((NONE, NONE, NONE), 200) == "stop"
+    assert nav.status == FAILED and nav.event == FAILED
+    assert nav.failure == "line lost in to destination"
+    assert nav.step((NONE, LINE, NONE), 220) == "stop" and nav.event is None
+
+    nav.start(LINE, (NONE, LINE, NONE), 0)
+    # on the line, but the line end never comes
+    assert nav.step((NONE, LINE, NONE), 29000) == "forward"
+    assert nav.step((NONE, LINE, NONE), 30001) == "stop"
+    assert nav.failure == "timeout in to destination"
+
+    nav.reset()
+    assert nav.status == IDLE and not nav.active
+    assert nav.step((NONE, LINE, NONE), 0) == "stop"
+    print("✓ Timeouts")
+
+
+if __name__ == "__main__":
+    test_full_route()
+    test_turn_waits_for_the_line_to_return()
+    test_start_on_the_line_skips_the_hub()
+    test_timeout_and_lost_line_fail()
+    print("✓ All navigator tests passed!")
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Test script for the per-colour range box classifier (libs/classes/range_classifier.py).
+"""
+
+import os
+import sys
+import tempfile
+sys.path.append('libs')
+
+import calibration_store
+from classes.range_classifier import RangeBoxClassifier
+
+
+def make_classifier():
+    boxes = RangeBoxClassifier(["terracotta", "lila", "blue"])
+    boxes.set_box("lila", (150, 140, 110, 350), (200, 190, 160, 600))
+    boxes.set_box("terracotta", (300, 250, 200, 800), (400, 330, 280, 1100))
+    return boxes
+
+
+def test_bitmask_for_all_colors():
+    """One classify() call reports every matching colour as a bit"""
+    boxes = make_classifier()
+    lila = boxes.bit("lila")
+    terracotta = boxes.bit("terracotta")
+
+    assert boxes.classify(0, (170, 160, 130, 400)) == lila
+    assert boxes.classify(2, (350, 300, 250, 900)) == terracotta
+    assert boxes.classify(1, (10, 10, 10, 40)) == 0
+    # blue has no box and never matches
+    assert boxes.bit("blue") and not boxes.has_box("blue")
+    print("✓ Bitmasks match the expected colours")
+
+
+def test_per_sensor_boxes_and_overlap():
+    """Boxes are per sensor, and overlapping boxes disable the fast path"""
+    boxes = make_classifier()
+    assert not boxes.overlaps()
+
+    boxes.set_box("blue", (0, 0, 0, 0), (100, 100, 100, 100), sensor=1)
+    assert boxes.classify(1, (50, 50, 50, 50)) == boxes.bit("blue")
+    assert boxes.classify(0, (50, 50, 50, 50)) == 0
+
+    boxes.set_box("blue", (160, 150, 120, 400), (250, 250, 250, 900), sensor=2)
+    assert boxes.overlaps()
+    print("✓ Overlap detected")
+
+
+def test_fit_and_tables():
+    """fit() builds a box from samples and the tables round trip"""
+    boxes = RangeBoxClassifier(["lila"])
+    samples = [(160, 150, 120, 400), (180, 170, 140, 450), (170, 160, 130, 420)]
+    for sensor in range(3):
+        boxes.fit("lila", sensor, samples, margin=0.1)
+    assert boxes.has_box("lila")
+    assert all(boxes.classify(s, sample) for s in range(3) for sample in samples)
+
+    copy = RangeBoxClassifier(["lila"])
+    assert copy.load_tables(boxes.to_tables())
+    assert list(copy.lo) == list(boxes.lo) and list(copy.hi) == list(boxes.hi)
+    assert not copy.load_tables({"box_lo": [0], "box_hi": [1]})
+
+
+def test_store_without_boxes_disables_the_default_boxes():
+    """A calibration saved without box tables does not keep the built-in lila box"""
+    sys.path.insert(0, 'tools')
+    import fake_hw
+    fake_hw.install()
+    from classes.follow import Follow
+
+    follow = Follow(target_color="lila", standalone=True, calibration_file=None)
+    assert follow.use_range_boxes
+
+    path = os.path.join(tempfile.mkdtemp(), "calibration.bin")
+    colors = {"terracotta": (150, 140, 131), "lila": (120, 150, 140), "blue": (121, 157, 147)}
+    calibration_store.save(path, {"colors": list(colors), "centroids": {"all": colors},
+                                  "threshold": 30, "tables": {}})
+    assert follow.load_color_map(path, verbose=False)
+    assert follow.target_rgb == (120, 150, 140)
+    assert not follow.range_boxes.has_box("lila")
+    assert not follow.use_range_boxes
+    print("✓ Loaded calibration without boxes uses the colour distance")
+
+
+if __name__ == "__main__":
+    test_bitmask_for_all_colors()
+    test_per_sensor_boxes_and_overlap()
+    test_fit_and_tables()
+    test_store_without_boxes_disables_the_default_boxes()
+    print("✓ All range box tests passed!")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test script for the input recorder (libs/recorder.py) and the host
+replayer (tools/replay.py), which runs main.py on fake hardware.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import json
+import os
+import tempfile
+
+from recorder import Recorder, load, KIND_MESSAGE, KIND_FRAME, KIND_MOTORS
+from sensor_frame import Frame
+import replay
+
+
+def test_round_trip_through_the_ram_buffer():
+    path = os.path.join(tempfile.mkdtemp(), "record.bin")
+    rec = Recorder(path, buffer_size=64, max_bytes=400)
+    frame = Frame()
+    frame.set_color(1, (1, 2, 3, 4))
+    frame.grayscale[2] = 500
+    frame.speed = 12.5
+    rec.message('{"A": 1}')
+    rec.frame(frame, sonar_distance=33)
+    rec.motors([10, 10, 10, 10])
+    rec.motors([10, 10, 10, 10])   # unchanged, not recorded
+    rec.motors([-30, 30, -30, 30])
+    assert rec.flushes >= 1        # the frame did not fit behind the message
+    for _ in range(20):
+        rec.message("[CONNECTED] 192.168.4.2")
+    assert rec.dropped > 0
+    rec.close()
+    assert os.path.getsize(path) <= 400
+
+    records = load(path)
+    assert records[0][0] == KIND_MESSAGE and records[0][2] == '{"A": 1}'
+    kind, ms, values = records[1]
+    assert kind == KIND_FRAME and ms >= 0
+    assert values[4:8] == (1, 2, 3, 4) and values[14] == 500
+    assert values[15] == 33 and values[16] == 12.5
+    assert [r[2] for r in records if r[0] == KIND_MOTORS] == [(10, 10, 10, 10), (-30, 30, -30, 30)]
+    assert len(records) == rec.records
+    print("✓ " + rec.describe())
+
+
+def test_sonar_distance_as_float_and_timeout():
+    """ get_distance() returns float cm and -1 on timeout, both round trip """
+    path = os.path.join(tempfile.mkdtemp(), "record.bin")
+    rec = Recorder(path)
+    frame = Frame()
+    rec.frame(frame, sonar_distance=51.25)
+    rec.frame(frame, sonar_distance=-1)
+    rec.close()
+
+    records = load(path)
+    assert [r[2][15] for r in records] == [51.25, -1]
+    print("✓ sonar distances 51.25 and -1 recorded")
+
+
+def session():
+    """ connect, start, line track on, go, frames along the target line, disconnect """
+    main = replay.import_main(tempfile.mkdtemp())
+    sensors = main.sensors
+
+    def raw_of(color):
+        # raw reading that converts back to the colour's calibrated RGB
+        clear = 1000
+        return tuple(int(v * clear / 355) for v in sensors.color_map[color]) + (clear,)
+
+    line = raw_of(sensors.target_color)
+    floor = raw_of("blue")
+    centred = floor + line + floor
+    drifted = floor + floor + line
+    assert sensors.get_color_str((floor, line, floor))[1] == sensors.target_color
+    assert sensors.get_color_str((floor, floor, line))[2] == sensors.target_color
+
+    records = [(KIND_MESSAGE, 0, "[CONNECTED] 192.168.4.2")]
+    packet = {"E": False, "G": False, "I": False, "K": None, "Q": 0}
+    for ms, key in ((30, "E"), (60, "G"), (90, "I")):
+        packet[key] = True
+        records.append((KIND_MESSAGE, ms, json.dumps(packet)))
+    for n in range(30):
+        colors = drifted if n % 4 == 3 else centred
+        records.append((KIND_FRAME, 5 + n * 40, tuple(colors) + (0, 0, 0, 20.0, 10.0, 0.0)))
+    records.append((KIND_MESSAGE, 1250, "[DISCONNECTED] 192.168.4.2"))
+    records.sort(key=lambda r: r[1])
+    return records
+
+
+def test_replay_is_deterministic():
+    """Replaying a session against its own motor commands shows no divergence"""
+    records = session()
+    first = replay.replay(records)
+    commands = first["replayed"]
+    assert len(commands) > 2
+    assert any(powers != (0, 0, 0, 0) for ms, powers in commands)
+
+    recorded = records + [(KIND_MOTORS, ms, powers) for ms, powers in commands]
+    recorded.sort(key=lambda r: r[1])
+    second = replay.replay(recorded)
+    assert second["first_divergence"] is None
+    assert second["max_dt_ms"] == 0
+    assert second["stage_stats"].count(1) == 3   # on_receive per data packet
+
+    # a command the car made differently shows up as a decision divergence
+    ms, powers = commands[1]
+    recorded[recorded.index((KIND_MOTORS, ms, powers))] = (KIND_MOTORS, ms, (99, 99, 99, 99))
+    third = replay.replay(recorded)
+    assert third["first_divergence"] == 1
+    print(f"✓ {len(commands)} motor commands replayed identically")
+
+
+if __name__ == "__main__":
+    test_round_trip_through_the_ram_buffer()
+    test_sonar_distance_as_float_and_timeout()
+    test_replay_is_deterministic()
+    print("✓ All recorder tests passed!")
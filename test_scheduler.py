@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+"""
+Test script for the cooperative scheduler (libs/scheduler.py), the aio
+driver wrappers and the background motor ramp, on CPython asyncio with
+the fake hardware from tools/fake_hw.py.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import asyncio
+
+import aio
+import loop_jitter
+import motors
+from classes.ultrasonic import Ultrasonic
+from scheduler import Scheduler
+
+
+def run_for(sched, seconds):
+    async def stop_after():
+        await asyncio.sleep(seconds)
+        sched.stop()
+
+    async def run():
+        await asyncio.gather(sched.start(), stop_after())
+
+    asyncio.run(run())
+
+
+def test_tasks_keep_their_period():
+    """A slow task does not slow down the others"""
+    sched = Scheduler()
+    fast = sched.add("fast", lambda: None, 5)
+
+    async def slow():
+        await asyncio.sleep(0.03)
+
+    slow_task = sched.add("slow", slow, 10)
+    run_for(sched, 0.3)
+
+    # ratios only, the absolute counts depend on the load of the host
+    assert fast.runs >= 3 * slow_task.runs, (fast.runs, slow_task.runs)
+    assert slow_task.runs <= 11
+    assert slow_task.overruns > 0
+    assert fast.overruns < fast.runs // 2, fast.stats()
+    print(f"✓ fast task {fast.stats()}, slow task {slow_task.stats()}")
+
+
+def test_background_ramp():
+    """With background ramp set_motors_power_gradually() returns at once"""
+    motors.stop()
+    motors.set_background_ramp(True)
+    try:
+        sleeps = []
+        sleep_ms = motors.time.sleep_ms
+        motors.time.sleep_ms = sleeps.append
+        try:
+            motors.set_motors_power_gradually([30, -30, 30, -30])
+        finally:
+            motors.time.sleep_ms = sleep_ms
+        assert sleeps == []
+        assert [m.current_power for m in motors.motors] == [0, 0, 0, 0]
+
+        steps = 0
+        while motors.ramp_step(2):
+            steps += 1
+        assert steps == 14
+        assert [m.current_power for m in motors.motors] == [30, -30, 30, -30]
+
+        motors.stop()
+        assert motors.target_powers == [0, 0, 0, 0]
+        assert not motors.ramp_step()
+    finally:
+        motors.set_background_ramp(False)
+    print("✓ Background motor ramp")
+
+
+def test_sonar_distance_from_edges():
+    """The echo pulse is timed from the pin IRQ edges"""
+    sonar = Ultrasonic(6, 7)
+
+    async def echo():
+        await asyncio.sleep(0.001)
+        assert sonar._echo.hard
+        sonar._echo.value(1)
+        sonar._echo.handler(sonar._echo)
+        await asyncio.sleep(0.003)
+        sonar._echo.value(0)
+        sonar._echo.handler(sonar._echo)
+
+    async def measure():
+        distance, _ = await asyncio.gather(aio.get_distance(sonar), echo())
+        return distance
+
+    distance = asyncio.run(measure())
+    # 3 ms echo is 51 cm, the edges are only seen at the next poll
+    assert 45 < distance < 90, distance
+    assert sonar._echo.handler is None
+    print(f"✓ Sonar distance {distance:.1f} cm")
+
+
+def test_sonar_short_echo():
+    """Both edges of a short echo before the next poll still give a distance"""
+    sonar = Ultrasonic(6, 7)
+
+    async def echo():
+        await asyncio.sleep(0.001)
+        sonar._echo.value(1)
+        sonar._echo.handler(sonar._echo)
+        sonar._echo.value(0)
+        sonar._echo.handler(sonar._echo)
+
+    async def measure():
+        distance, _ = await asyncio.gather(aio.get_distance(sonar), echo())
+        return distance
+
+    distance = asyncio.run(measure())
+    assert 0 <= distance < 5, distance
+    print(f"✓ Short echo {distance:.2f} cm")
+
+
+def test_control_jitter_before_after():
+    """The control law runs at a steadier rate as a scheduler task"""
+    before, after, _ = loop_jitter.compare(duration=0.8, scale=0.2)
+    print(f"before: {before}")
+    print(f"after:  {after}")
+    assert after["runs"] > 3 * before["runs"]
+    assert after["std_ms"] < before["std_ms"]
+    print("✓ Control jitter reduced")
+
+
+if __name__ == "__main__":
+    test_tasks_keep_their_period()
+    test_background_ramp()
+    test_sonar_distance_from_edges()
+    test_sonar_short_echo()
+    test_control_jitter_before_after()
+    print("✓ All scheduler tests passed!")
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Test script for the dirty-tracked telemetry dict (libs/send_dict.py).
+"""
+
+import sys
+sys.path.append('libs')
+
+import json
+
+from send_dict import SendDict
+
+
+def frame(d, n):
+    line = bytes(d.out[:n])
+    assert line.startswith(b"WS+") and line.endswith(b"\n")
+    return json.loads(line[3:])
+
+
+def test_only_changed_fields_are_sent():
+    d = SendDict({'Name': '', 'Type': 'PICO-4WD Car', 'Check': 'SC'})
+    d['Name'] = 'car'
+    head = {'Name': 'car', 'Type': 'PICO-4WD Car', 'Check': 'SC'}
+    sonar = [0, 0]
+    d['B'] = 12.5
+    d['D'] = sonar
+    assert d.changed() == ['B', 'D']
+    assert frame(d, d.encode(b"WS+")) == dict(head, B=12.5, D=[0, 0])
+    assert frame(d, d.encode(b"WS+")) == head
+
+    d['B'] = 12.5           # same value
+    sonar[0] = 30           # a list set again always counts as changed
+    d['D'] = sonar
+    d['J'] = 1
+    d['J'] = True           # same value, other JSON
+    assert d.changed() == ['D', 'J']
+    assert frame(d, d.encode(b"WS+")) == dict(head, D=[30, 0], J=True)
+
+    # a field left out stays changed until it is sent
+    d['B'] = 3.0
+    d['C'] = 0.5
+    assert frame(d, d.encode(b"WS+", lambda key: key != 'B')) == dict(head, C=0.5)
+    assert d.changed() == ['B']
+    assert d['B'] == 3.0 and d['Name'] == 'car' and 'J' in d and len(d) == 7
+
+    d.refresh()
+    assert frame(d, d.encode(b"WS+")) == dict(head, B=3.0, C=0.5, D=[30, 0], J=True)
+    assert d.frames == 5 and d.sent_fields == 9
+    print("✓ " + d.describe())
+
+
+def test_buffer_grows_to_the_largest_frame():
+    d = SendDict(size=16)
+    d['T'] = list(range(40))
+    n = d.encode(b"WS+")
+    assert frame(d, n)['T'] == list(range(40)) and len(d.out) >= n
+    assert d.encode(b"WS+") == 6     # b'WS+{}\n'
+    print("✓ Output buffer grown to %d bytes" % len(d.out))
+
+
+if __name__ == "__main__":
+    test_only_changed_fields_are_sent()
+    test_buffer_grows_to_the_largest_frame()
+    print("✓ All send_dict tests passed!")
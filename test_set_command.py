@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Test script for the queued, non-blocking WS_Server SET commands
+(libs/set_command.py) on a fake UART.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import time
+
+import ws as ws_module
+from set_command import DONE, FAILED
+
+
+def server_on(uart):
+    ws_module.UART = lambda *args, **kwargs: uart
+    try:
+        return ws_module.WS_Server(name="car", mode="ap")
+    finally:
+        ws_module.UART = fake_hw.UART
+
+
+def test_queue_sends_one_command_at_a_time():
+    uart = fake_hw.esp8266_uart()
+    t = time.ticks_ms()
+    server = server_on(uart)                  # blocking set("RESET")
+    assert time.ticks_diff(time.ticks_ms(), t) < 100
+    uart.on_write = None                      # answer by hand from here
+    uart.tx = bytearray()
+
+    cmds = [server.submit("SSID", "car"), server.submit("PORT", 8765)]
+    assert bytes(uart.tx) == b"SET+SSIDcar\n"
+    assert server.led_timer is not None
+    led = ws_module.onboard_led_ws.value()
+    server.led_timer.fire()
+    assert ws_module.onboard_led_ws.value() != led
+
+    uart.inject(b"[CONNECTED] 192.168.4.2\r\n[OK]\r\n")
+    server.poll()                             # not a reply, handled as usual
+    assert server.is_connected() and not cmds[0].done()
+    server.poll()
+    assert cmds[0].state == DONE and cmds[0].result() == ""
+    assert bytes(uart.tx).endswith(b"SET+PORT8765\n")
+    uart.inject(b"[OK] 8765\r\n")
+    server.wait(*cmds)
+    assert cmds[1].result() == "8765" and server.queue == []
+    assert server.led_timer is None and ws_module.onboard_led_ws.value() == 0
+    print("✓ SET queue, replies after %d and %d ms" % (cmds[0].elapsed_ms, cmds[1].elapsed_ms))
+
+
+def test_retries_and_failures():
+    uart = fake_hw.esp8266_uart()
+    server = server_on(uart)
+    uart.on_write = lambda data: uart.inject(b"[ERROR] busy\r\n")
+    cmd = server.submit("MODE", 2, timeout=1000)
+    server.wait(cmd)
+    assert cmd.state == FAILED and cmd.tries == 4
+    try:
+        cmd.result()
+        assert False, "an [ERROR] reply must raise"
+    except ValueError as e:
+        assert "busy" in str(e)
+
+    uart.on_write = None
+    cmd = server.submit("PSK", "secret", timeout=5)
+    server.wait(cmd)
+    assert cmd.state == FAILED and cmd.tries == 4
+    assert isinstance(cmd.error, ws_module.TimeoutError)
+    print("✓ SET retries: [ERROR] and timeout")
+
+
+def test_wait_calls_idle():
+    """ e.g. the exit handler feeding the hardware WDT during a slow RESET """
+    uart = fake_hw.esp8266_uart()
+    server = server_on(uart)
+    uart.on_write = None
+    polls = []
+
+    def idle():
+        polls.append(1)
+        if len(polls) == 5:
+            uart.inject(b"[OK] 1.0\r\n")
+
+    server.idle = idle
+    assert server.set("RESET", timeout=1000) == "1.0" and len(polls) >= 5
+    print("✓ wait() calls idle while it polls")
+
+
+if __name__ == "__main__":
+    test_queue_sends_one_command_at_a_time()
+    test_retries_and_failures()
+    test_wait_calls_idle()
+    print("✓ All SET command tests passed!")
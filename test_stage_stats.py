@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Test script for the stage timing histograms (libs/stage_stats.py).
+"""
+
+import io
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import time
+
+from stage_stats import StageStats, N_BUCKETS
+
+
+def test_percentiles():
+    """p50/p99/max come from the bucket edges and the measured maximum"""
+    stats = StageStats(("a", "b"))
+    for _ in range(98):
+        stats.add(0, 150)       # 100..200 bucket
+    stats.add(0, 4000)          # 2000..5000 bucket
+    stats.add(0, 3000000)       # overflow bucket
+    assert stats.count(0) == 100
+    assert stats.percentile(0, 50) == 200
+    assert stats.percentile(0, 99) == 5000
+    assert stats.percentile(0, 100) == 3000000
+    assert stats.summary() == [200, 5000, 3000000, 0, 0, 0]
+
+    stats.add(1, 7)
+    assert stats.summary()[3:] == [7, 7, 7]
+    assert sum(stats.counts) == 101 and len(stats.counts) == 2 * N_BUCKETS
+
+    summary = stats.summary()
+    assert not stats.summary_changed
+    stats.add(1, 9)
+    assert stats.summary() is summary and stats.summary_changed
+    assert summary[3:] == [9, 9, 9]
+
+    stats.reset()
+    assert stats.summary() == [0] * 6
+    print("✓ Percentiles")
+
+
+def test_timed_wrapper():
+    """timed() counts every call, also when the function raises"""
+    stats = StageStats(("sleep",))
+    # a fake clock, the stage takes exactly <ms> on any host
+    now = [0]
+
+    def slow(ms):
+        now[0] += ms * 1000
+        if ms > 5:
+            raise ValueError
+
+    ticks_us = time.ticks_us
+    time.ticks_us = lambda: now[0]
+    try:
+        timed = stats.timed(0, slow)
+        timed(2)
+        try:
+            timed(10)
+        except ValueError:
+            pass
+    finally:
+        time.ticks_us = ticks_us
+    assert stats.count(0) == 2
+    assert stats.max_us[0] == 10000
+    assert stats.percentile(0, 50) == 2000
+
+    f = io.StringIO()
+    stats.dump(f)
+    assert "sleep" in f.getvalue()
+    print("✓ Timed wrapper")
+
+
+if __name__ == "__main__":
+    test_percentiles()
+    test_timed_wrapper()
+    print("✓ All stage timing tests passed!")
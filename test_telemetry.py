@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test script for the telemetry publisher and scheduler (libs/telemetry.py).
+The follow stand-in fails the test if anything asks it to read the sensors.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import json
+
+from car_state import CarState, EV_START, EV_LINE_TRACK_ON, EV_GO
+from sensor_frame import Frame
+from stage_stats import StageStats
+from telemetry import Telemetry, TelemetryScheduler
+from send_dict import SendDict
+from ws import WS_Server
+
+
+class CachedOnlyFollow():
+    """ matches a raw reading if its red value is above 100 """
+    def __init__(self):
+        self.calls = 0
+
+    def raw_color_match(self, raw):
+        assert raw is not None, "telemetry must not read the sensors"
+        self.calls += 1
+        return raw[0] > 100
+
+
+def test_update_from_frame_and_state():
+    state = CarState()
+    frame = Frame()
+    follow = CachedOnlyFollow()
+    stats = StageStats(("ws",))
+    send_dict = {'Name': 'car'}
+    telemetry = Telemetry(send_dict, state, frame, follow, stats, 'T')
+
+    frame.speed = 12.3456
+    frame.mileage = 1.5
+    frame.set_color(1, (200, 0, 0, 300))
+    state.sonar_angle = 30
+    state.sonar_distance = 42
+    telemetry.update()
+    assert send_dict['B'] == 12.35 and send_dict['C'] == 1.5
+    assert send_dict['D'] == [30, 42]
+    timing = send_dict['T']
+    assert timing == stats.summary() and timing is stats.summary()
+    # no frame published yet and not line tracking
+    assert send_dict['J'] == 0 and follow.calls == 0
+
+    frame.seq = 1
+    for event in (EV_START, EV_LINE_TRACK_ON, EV_GO):
+        state.dispatch(event)
+    telemetry.update()
+    assert send_dict['J'] == 1 and follow.calls == 1
+
+    frame.set_color(1, (10, 0, 0, 300))
+    frame.set_color(0, (200, 0, 0, 300))    # only the middle sensor counts
+    telemetry.update()
+    assert send_dict['J'] == 0 and follow.calls == 2
+    assert send_dict['Name'] == 'car' and telemetry.updates == 3
+    print("✓ Telemetry from the cached frame")
+
+
+def test_unchanged_timing_not_dirty():
+    """ the stage timing list is reused and only marked changed on new values """
+    stats = StageStats(("ws",))
+    send_dict = SendDict()
+    telemetry = Telemetry(send_dict, CarState(), Frame(), CachedOnlyFollow(), stats, 'T')
+    telemetry.update()
+    assert 'T' in send_dict.changed()
+    send_dict.clear_changed(send_dict.changed())
+
+    telemetry.update()
+    assert 'T' not in send_dict.changed()
+    stats.add(0, 300)
+    telemetry.update()
+    assert 'T' in send_dict.changed() and send_dict['T'] == [300, 300, 300]
+    print("✓ Unchanged stage timing is not resent")
+
+
+def test_plain_loop_fills_the_frame():
+    """ without the scheduler main.sample_sensors() stands in for sensor_task """
+    import tempfile
+    import replay
+    main = replay.import_main(tempfile.mkdtemp())
+    replay.reset_main(main)
+    sensors = main.sensors
+    line = tuple(int(v * 1000 / 355) for v in sensors.color_map[sensors.target_color]) + (1000,)
+    reads = []
+
+    def read_raw_all():
+        reads.append(line)
+        return (line, line, line)
+
+    sensors.read_raw_all = read_raw_all
+    try:
+        # not line tracking: the speed only, no sensor reads
+        main.sample_sensors()
+        main.telemetry.update()
+        assert reads == [] and main.sensor_frame.seq == 0
+        assert main.ws.send_dict['J'] == 0
+        for event in (EV_START, EV_LINE_TRACK_ON, EV_GO):
+            main.state.dispatch(event)
+        main.sample_sensors()
+        main.telemetry.update()
+        assert len(reads) == 1 and main.sensor_frame.seq == 1
+        assert main.state.sensor_raw == main.sensor_frame.raw
+        assert main.ws.send_dict['J'] == 1
+        assert sensors.raw_color_match(line) == sensors.color_match_bool(raw=(line, line, line))[1]
+    finally:
+        del sensors.read_raw_all
+        replay.reset_main(main)
+    print("✓ the plain loop publishes a frame while line tracking")
+
+
+def test_scheduler_rate_priorities_and_budget():
+    send_dict = {'Name': 'car', 'B': 1.5, 'C': 0.2, 'T': [1, 2, 3]}
+    sched = TelemetryScheduler(rate_hz=10, budget_bps=100000, priorities={'C': 5, 'T': 10})
+    frames = []
+    for now in range(0, 2000, 7):    # a caller polling every 7 ms
+        if sched.due(now):
+            frames.append(sorted(key for key in send_dict if sched.wanted(key)))
+            sched.sent(60, now)
+    assert 19 <= len(frames) <= 21, len(frames)
+    assert frames[0] == ['B', 'C', 'Name', 'T']
+    assert frames[1] == ['B', 'Name'] and frames[5] == ['B', 'C', 'Name']
+    assert 9.5 <= sched.rate_hz <= 10.5 and sched.throttled == 0
+
+    # 100 byte frames on a 300 B/s budget
+    sched = TelemetryScheduler(rate_hz=10, budget_bps=300)
+    sent = 0
+    for now in range(0, 5000, 10):
+        if sched.due(now):
+            sched.sent(100, now)
+            sent += 1
+    assert sent <= 3 + 5 * 3 + 1, sent
+    assert sched.throttled > 0 and sched.bps <= 400
+    print("✓ " + sched.describe())
+
+
+def test_budget_refills_when_polled_every_ms():
+    """ a budget under 1000 B/s still refills from 1 ms steps """
+    sched = TelemetryScheduler(rate_hz=50, budget_bps=333)
+    sent = 0
+    for now in range(0, 10000):      # the plain loop polls every ~1 ms
+        if sched.due(now):
+            sched.sent(50, now)
+            sent += 50
+    # one second of burst, then the budget
+    assert 333 * 10 <= sent <= 333 * 11 + 50, sent
+    assert 280 <= sched.bps <= 400, sched.bps
+    print("✓ " + sched.describe())
+
+
+def test_send_data_is_rate_limited():
+    server = WS_Server.__new__(WS_Server)
+    server.uart = fake_hw.UART(1)
+    server.frames = None                     # the text link
+    server.send_dict = SendDict({'Name': 'car', 'B': 0})
+    server.tx_scheduler = TelemetryScheduler(rate_hz=5)
+    assert server.send_data()
+    assert not server.send_data()            # within 200 ms of the first
+    line = bytes(server.uart.tx).decode()
+    assert line.startswith("WS+") and json.loads(line[3:]) == {'Name': 'car', 'B': 0}
+    assert server.tx_scheduler.bytes == len(line)
+    print("✓ send_data() rate limited")
+
+
+if __name__ == "__main__":
+    test_update_from_frame_and_state()
+    test_unchanged_timing_not_dirty()
+    test_plain_loop_fills_the_frame()
+    test_scheduler_rate_priorities_and_budget()
+    test_budget_refills_when_polled_every_ms()
+    test_send_data_is_rate_limited()
+    print("✓ All telemetry tests passed!")
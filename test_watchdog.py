@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Test script for the loop deadline watchdog (libs/watchdog.py). The fake
+Timer is fired by hand where the Pico would take the interrupt.
+"""
+
+import sys
+sys.path.insert(0, 'tools')
+
+import fake_hw
+fake_hw.install()
+
+import time
+
+import motors
+from stage_stats import StageStats
+from watchdog import LoopWatchdog
+
+
+def powers():
+    return [m.current_power for m in motors.motors]
+
+
+def test_overrun_halts_motors_until_fed():
+    """A stage blocking past the deadline stops the motors from the timer"""
+    stats = StageStats(("ws", "line_track"))
+    wd = LoopWatchdog(deadline_ms=30, check_ms=10, wdt_timeout_ms=5000, stage_stats=stats)
+    motors.set_motors_power([40, 40, 40, 40])
+
+    def blocking_line_track():
+        # like line_track_end(): a while loop that never gets its exit condition
+        t_end = time.time() + 0.05
+        while time.time() < t_end:
+            wd.timer.fire()
+            motors.set_motors_power_gradually([40, 40, 40, 40])
+            time.sleep(0.005)
+
+    wd.enter("remote_handler")
+    wd.timer.fire()
+    assert not wd.tripped
+    stats.timed(1, blocking_line_track)()
+
+    assert wd.tripped and motors.halted
+    assert powers() == [0, 0, 0, 0]
+    assert wd.overrun_stage == "remote_handler"
+    assert wd.overrun_inner == 1
+
+    assert wd.feed()
+    assert not motors.halted
+    assert wd.overrun_ms >= 50
+    assert wd.wdt.feeds == 1
+    text = wd.describe()
+    assert "remote_handler/line_track" in text, text
+
+    # a healthy iteration
+    motors.set_motors_power([20, 20, 20, 20])
+    wd.timer.fire()
+    assert not wd.feed()
+    assert powers() == [20, 20, 20, 20]
+    assert wd.overruns == 1
+    motors.stop()
+    wd.deinit()
+    print(f"✓ {text}")
+
+
+def test_halt_stops_the_ramp():
+    """While halted neither the blocking nor the background ramp moves the motors"""
+    motors.stop()
+    motors.halt()
+    try:
+        t0 = time.perf_counter()
+        motors.set_motors_power_gradually([50, 50, 50, 50])
+        assert time.perf_counter() - t0 < 0.005
+        motors.set_background_ramp(True)
+        motors.set_motors_power_gradually([50, 50, 50, 50])
+        assert not motors.ramp_step()
+        assert powers() == [0, 0, 0, 0]
+    finally:
+        motors.set_background_ramp(False)
+        motors.resume()
+    print("✓ Halt overrides the motor ramps")
+
+
+def test_halt_during_the_duty_writes():
+    """halt() from the timer callback between two motor writes wins over the old powers"""
+    def halt_on_second_write(motor):
+        run = motor.run
+
+        def run_then_halt(power):
+            run(power)
+            if motor is motors.motors[1] and power:
+                motors.halt()
+        return run_then_halt
+
+    motors.stop()
+    runs = [m.run for m in motors.motors]
+    for m in motors.motors:
+        m.run = halt_on_second_write(m)
+    try:
+        motors.set_motors_power([40, 40, 40, 40])
+        assert powers() == [0, 0, 0, 0]
+        assert motors.target_powers == [0, 0, 0, 0]
+        motors.resume()
+        motors.set_motors_power_gradually([40, 40, 40, 40])
+        assert powers() == [0, 0, 0, 0]
+        motors.resume()
+        motors.set_background_ramp(True)
+        motors.set_motors_power_gradually([40, 40, 40, 40])
+        assert not motors.ramp_step(40)
+        assert powers() == [0, 0, 0, 0]
+    finally:
+        for m, run in zip(motors.motors, runs):
+            m.run = run
+        motors.set_background_ramp(False)
+        motors.resume()
+        motors.stop()
+    print("✓ Halt inside the write loop leaves the motors stopped")
+
+
+if __name__ == "__main__":
+    test_overrun_halts_motors_until_fed()
+    test_halt_stops_the_ramp()
+    test_halt_during_the_duty_writes()
+    print("✓ All watchdog tests passed!")
@@ -0,0 +1,133 @@
+'''
+Decode time of the app's control packets, json.loads() against the
+fast path of control_parser.py.
+
+Run from the repository root, on the MicroPython unix port or CPython:
+
+    micropython tools/bench_control_decode.py [record.bin]
+    python tools/bench_control_decode.py [record.bin]
+
+The packets are the JSON lines of a recording (libs/recorder.py). Without
+one a drive session is made up: every widget in every packet as the app
+sends them, the throttle changing in about every 3rd packet and the
+direction in every 10th. "json" is the old WS_Server path (json.loads(),
+again if the result is a str), "fast" is ControlParser.decode() with the
+json.loads() fallback. Both results are compared packet by packet. The
+heap churn per packet is only measured on MicroPython.
+'''
+import gc
+import json
+import sys
+import time
+
+sys.path.insert(0, "tools")
+import fake_hw
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+if MICROPYTHON:
+    def now_us():
+        return time.ticks_us()
+
+    def churn():
+        return gc.mem_alloc()
+else:
+    def now_us():
+        return int(time.perf_counter() * 1000000)
+
+    def churn():
+        return None
+
+# a packet as the app sends it, see tools/esp_bridge.py
+APP_PACKET = {
+    "A": 0, "B": 0, "C": 0, "D": 0, "E": True, "F": False, "G": True,
+    "H": False, "I": False, "J": 0, "K": "forward", "L": 0, "M": False,
+    "N": False, "O": False, "P": False, "Q": 60, "R": 0, "S": False,
+}
+DIRECTIONS = ("forward", "left", "forward", "right", "stop", "backward")
+
+
+def session(packets):
+    lines = []
+    packet = dict(APP_PACKET)
+    seed = 12345
+    for i in range(packets):
+        # a small LCG, the same packets on every port
+        seed = (seed * 1103515245 + 12345) & 0x7fffffff
+        if seed % 3 == 0:
+            packet["Q"] = seed % 201 - 100
+        if i % 10 == 0:
+            packet["K"] = DIRECTIONS[(i // 10) % len(DIRECTIONS)]
+        lines.append(json.dumps(packet))
+    return lines
+
+
+def recorded(path):
+    from recorder import load, KIND_MESSAGE
+    return [value for kind, ms, value in load(path)
+            if kind == KIND_MESSAGE and value.startswith("{")]
+
+
+def json_path(line):
+    data = json.loads(line)
+    if isinstance(data, str):
+        data = json.loads(data)
+    return data
+
+
+def run(decode, lines):
+    elapsed = 0
+    for line in lines:
+        t = now_us()
+        decode(line)
+        elapsed += now_us() - t
+    return elapsed
+
+
+def measure(label, decode, lines):
+    gc.collect()
+    if MICROPYTHON:
+        gc.disable()
+    start = churn()
+    elapsed = run(decode, lines)
+    end = churn()
+    if MICROPYTHON:
+        gc.enable()
+    line = "%-5s %7.2f us/packet" % (label, elapsed / len(lines))
+    if start is not None:
+        line += " %6d bytes heap/packet" % ((end - start) // len(lines))
+    print(line)
+
+
+def main():
+    fake_hw.install()
+    from control_parser import ControlParser
+    if len(sys.argv) > 1:
+        lines = recorded(sys.argv[1])
+        source = sys.argv[1]
+    else:
+        lines = session(5000)
+        source = "made up session"
+    print("%s, %d packets from %s" % (sys.implementation.name, len(lines), source))
+
+    check = ControlParser()
+    for line in lines:
+        data = check.decode(line)
+        expected = json_path(line)
+        assert data is None or data == expected, line
+
+    parser = ControlParser()
+
+    def fast_path(line):
+        data = parser.decode(line)
+        if data is None:
+            data = json_path(line)
+        return data
+
+    measure("json", json_path, lines)
+    measure("fast", fast_path, lines)
+    print(parser.describe())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+'''
+Measure import time and heap use of `from classes.follow import Follow`.
+
+Run from the repository root, on the MicroPython unix port or CPython:
+
+    micropython tools/bench_follow_import.py
+    python tools/bench_follow_import.py
+
+The interactive calibration tooling is measured separately, it is only
+imported the first time one of its methods is used.
+'''
+import gc
+import sys
+import time
+
+sys.path.insert(0, "tools")
+import fake_hw
+
+MICROPYTHON = sys.implementation.name == "micropython"
+
+if MICROPYTHON:
+    def heap():
+        gc.collect()
+        return gc.mem_alloc()
+
+    def now_us():
+        return time.ticks_us()
+else:
+    import tracemalloc
+    tracemalloc.start()
+
+    def heap():
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+
+    def now_us():
+        return int(time.perf_counter() * 1000000)
+
+
+def measure(label, fn):
+    m0 = heap()
+    t0 = now_us()
+    fn()
+    t1 = now_us()
+    m1 = heap()
+    print("%-32s %8d us %8d bytes" % (label, t1 - t0, m1 - m0))
+
+
+def import_follow():
+    from classes.follow import Follow
+
+
+def import_tools():
+    import classes.follow_tools
+
+
+def mpy_sizes():
+    '''Size of the compiled bytecode, needs mpy-cross on the PATH.'''
+    import os
+    import subprocess
+    import tempfile
+    out = tempfile.mkdtemp()
+    for name in ("follow", "follow_tools"):
+        src = os.path.join(fake_hw.LIBS_PATH, "classes", name + ".py")
+        if not os.path.exists(src):
+            continue
+        dst = os.path.join(out, name + ".mpy")
+        try:
+            subprocess.run(["mpy-cross", "-o", dst, src], check=True)
+        except (OSError, subprocess.CalledProcessError):
+            return
+        print("%-32s %8d bytes" % (name + ".mpy", os.path.getsize(dst)))
+
+
+if __name__ == "__main__":
+    fake_hw.install()
+    # dependencies are shared with the rest of the app, load them first
+    import helper
+    import calibration_store
+    import classes.new_tcs
+    import classes.range_classifier
+
+    measure("from classes.follow import Follow", import_follow)
+    try:
+        measure("import classes.follow_tools", import_tools)
+    except ImportError:
+        pass
+    if not MICROPYTHON:
+        mpy_sizes()
@@ -0,0 +1,108 @@
+'''
+Serialization time and size of the telemetry frame, before and after
+the dirty-tracked send_dict.
+
+Run from the repository root, on the MicroPython unix port or CPython:
+
+    micropython tools/bench_telemetry.py [frames]
+    python tools/bench_telemetry.py [frames]
+
+"before" is json.dumps() of the plain dict and the "WS+%s\\n" string of
+WS_Server._command()/write(), "after" is SendDict.encode() into its
+buffer. Both get the same field updates as Telemetry.update(): speed
+every frame, mileage every 4th, sonar and stage timing lists every frame.
+The heap churn per frame is only measured on MicroPython.
+'''
+import gc
+import json
+import sys
+import time
+
+sys.path.insert(0, "tools")
+import fake_hw
+
+MICROPYTHON = sys.implementation.name == "micropython"
+RATE_HZ = 10    # TELEMETRY_RATE in main.py
+
+if MICROPYTHON:
+    def now_us():
+        return time.ticks_us()
+
+    def churn():
+        return gc.mem_alloc()
+else:
+    def now_us():
+        return int(time.perf_counter() * 1000000)
+
+    def churn():
+        return None
+
+CONSTANT = {'Name': 'my_4wd_car', 'Type': 'PICO-4WD Car', 'Check': 'SC'}
+
+
+def update(d, i, sonar):
+    d['B'] = round(10 + (i % 37) * 0.37, 2)
+    d['C'] = 0.01 * (i // 4)
+    sonar[0] = (i * 5) % 180 - 90
+    sonar[1] = 20 + i % 50
+    d['D'] = sonar
+    d['J'] = 0
+    d['T'] = [200, 950, 1800, 90, 300, 700, 1500, 4100, 9200]
+
+
+def before(frames):
+    d = dict(CONSTANT)
+    sonar = [0, 0]
+    total = 0
+    elapsed = 0
+    for i in range(frames):
+        update(d, i, sonar)
+        t = now_us()
+        data = json.dumps(d)
+        line = ("%s\n" % ("%s+%s" % ("WS", data))).encode()
+        elapsed += now_us() - t
+        total += len(line)
+    return elapsed, total
+
+
+def after(frames):
+    from send_dict import SendDict
+    d = SendDict(CONSTANT)
+    sonar = [0, 0]
+    total = 0
+    elapsed = 0
+    for i in range(frames):
+        update(d, i, sonar)
+        t = now_us()
+        n = d.encode(b"WS+")
+        elapsed += now_us() - t
+        total += n
+    return elapsed, total
+
+
+def measure(label, fn, frames):
+    gc.collect()
+    if MICROPYTHON:
+        gc.disable()
+    start = churn()
+    elapsed, total = fn(frames)
+    end = churn()
+    if MICROPYTHON:
+        gc.enable()
+    line = "%-7s %7.1f us/frame %6.1f bytes/frame %6d bytes/s at %d Hz" % (
+        label, elapsed / frames, total / frames, total * RATE_HZ // frames, RATE_HZ)
+    if start is not None:
+        line += " %6d bytes heap/frame" % ((end - start) // frames)
+    print(line)
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    fake_hw.install()
+    print("%s, %d frames" % (sys.implementation.name, frames))
+    measure("before", before, frames)
+    measure("after", after, frames)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,280 @@
+'''
+Host-side colour analysis for recorded TCS34725 sensor logs.
+
+Reads CSV logs with the columns
+
+    r, g, b, c, sensor, label
+
+(sensor is "left"/"middle"/"right" or 0/1/2, label is the colour the
+sensor was placed on) and evaluates, vectorized with NumPy:
+
+  - the three raw-to-RGB conversions of classes.follow.Follow
+    (_raw_to_rgb, _raw_to_rgb_alternative, _raw_to_rgb_simple)
+  - the nearest-centroid classifier with a match threshold
+  - the raw range box classifier
+
+It prints confusion matrices and margin statistics, then writes a
+calibration file (libs/calibration_store.py format) for the best
+conversion that Follow loads at boot.
+
+    python tools/color_analysis.py samples.csv --out calibration.bin
+    python tools/color_analysis.py --synthetic 1000000
+'''
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "libs"))
+import calibration_store  # noqa: E402
+
+SENSORS = ("left", "middle", "right")
+# Same order as classes.follow.RGB_ALGORITHMS
+ALGORITHMS = ("_raw_to_rgb", "_raw_to_rgb_alternative", "_raw_to_rgb_simple")
+NONE = "none"
+
+
+''' ---------------- loading ---------------- '''
+def load_csv(paths):
+    '''Return (raw uint16 [N, 4], sensor int [N], label str [N]).'''
+    raws, sensors, labels = [], [], []
+    for path in paths:
+        with open(path) as f:
+            first = f.readline()
+        skip = 0 if first.split(",")[0].strip().isdigit() else 1
+        cols = np.loadtxt(path, delimiter=",", dtype=str, skiprows=skip, ndmin=2)
+        raws.append(cols[:, :4].astype(np.int64))
+        sensor = np.char.strip(cols[:, 4])
+        for i, name in enumerate(SENSORS):
+            sensor[sensor == name] = str(i)
+        sensors.append(sensor.astype(np.int64))
+        labels.append(np.char.lower(np.char.strip(cols[:, 5])))
+    return np.concatenate(raws), np.concatenate(sensors), np.concatenate(labels)
+
+
+def synthetic(n, seed=0):
+    '''Generate <n> fake readings around the default color_map, for benchmarks.'''
+    rng = np.random.default_rng(seed)
+    # raw (r, g, b) fractions of clear and the clear level per colour
+    colors = {
+        "terracotta": (0.42, 0.41, 0.37, 1600),
+        "green": (0.40, 0.43, 0.31, 1200),
+        "yellow": (0.43, 0.41, 0.35, 2400),
+        "lila": (0.39, 0.41, 0.39, 1000),
+        "blue": (0.34, 0.44, 0.41, 900),
+    }
+    names = np.array(list(colors))
+    label_idx = rng.integers(0, len(names), n)
+    params = np.array(list(colors.values()))[label_idx]
+    clear = params[:, 3] * rng.normal(1.0, 0.05, n)
+    rgb = params[:, :3] * clear[:, None] * rng.normal(1.0, 0.01, (n, 3))
+    raw = np.column_stack([rgb, clear]).clip(0, 65535).astype(np.int64)
+    return raw, rng.integers(0, 3, n), names[label_idx]
+
+
+''' ---------------- conversions (match classes.follow) ---------------- '''
+def raw_to_rgb(raw):
+    r, g, b, c = raw.T.astype(np.float64)
+    out = np.zeros((len(raw), 3), dtype=np.int64)
+    ok = c != 0
+    ratios = np.column_stack([r, g, b])[ok] / c[ok, None]
+    out[ok] = np.trunc(ratios * 355).clip(0, 255)
+    return out
+
+
+def raw_to_rgb_alternative(raw):
+    r, g, b, c = raw.T.astype(np.float64)
+    rgb = np.column_stack([r, g, b])
+    illumination = c - rgb.max(axis=1)
+    corrected = np.maximum(0, rgb - illumination[:, None] * 0.3)
+    total = corrected.sum(axis=1)
+    out = np.full((len(raw), 3), 85, dtype=np.int64)
+    ok = total != 0
+    out[ok] = np.trunc(corrected[ok] * (255 / total[ok])[:, None]).clip(0, 255)
+    out[c == 0] = 0
+    return out
+
+
+def raw_to_rgb_simple(raw):
+    rgb = raw[:, :3].astype(np.float64)
+    max_val = rgb.max(axis=1)
+    out = np.zeros((len(raw), 3), dtype=np.int64)
+    ok = max_val != 0
+    out[ok] = np.trunc(rgb[ok] * (255 / max_val[ok])[:, None])
+    return out
+
+
+CONVERSIONS = dict(zip(ALGORITHMS, (raw_to_rgb, raw_to_rgb_alternative, raw_to_rgb_simple)))
+
+
+''' ---------------- classifiers ---------------- '''
+def fit_centroids(rgb, labels_idx, n_colors):
+    '''Mean RGB per colour, rounded like the colour map (uint8).'''
+    sums = np.zeros((n_colors, 3))
+    np.add.at(sums, labels_idx, rgb)
+    counts = np.bincount(labels_idx, minlength=n_colors)[:, None]
+    return np.rint(sums / np.maximum(counts, 1)).clip(0, 255).astype(np.int64)
+
+
+def nearest_centroid(rgb, centroids, threshold):
+    '''Return (predicted index or -1, distance to closest, margin to second).'''
+    d = np.sqrt(((rgb[:, None, :] - centroids[None, :, :]) ** 2).sum(axis=2))
+    order = np.argsort(d, axis=1)
+    rows = np.arange(len(rgb))
+    best = d[rows, order[:, 0]]
+    second = d[rows, order[:, 1]] if centroids.shape[0] > 1 else np.full(len(rgb), np.inf)
+    pred = np.where(best < threshold, order[:, 0], -1)
+    return pred, best, second - best
+
+
+def fit_boxes(raw, sensors, labels_idx, n_colors, quantile=0.005, margin=0.05):
+    '''Raw range boxes per colour and sensor, same layout as RangeBoxClassifier.'''
+    lo = np.full((n_colors, 3, 4), 0xFFFF, dtype=np.int64)
+    hi = np.zeros((n_colors, 3, 4), dtype=np.int64)
+    for color in range(n_colors):
+        for sensor in range(3):
+            sel = raw[(labels_idx == color) & (sensors == sensor)]
+            if len(sel) == 0:
+                continue
+            q_lo, q_hi = np.quantile(sel, [quantile, 1 - quantile], axis=0)
+            lo[color, sensor] = np.floor(q_lo * (1 - margin)).clip(0, 0xFFFF)
+            hi[color, sensor] = np.ceil(q_hi * (1 + margin)).clip(0, 0xFFFF)
+    return lo, hi
+
+
+def classify_boxes(raw, sensors, lo, hi):
+    '''Predicted colour index, -1 when no box or more than one box matches.'''
+    inside = ((raw[:, None, :] >= lo[:, sensors].transpose(1, 0, 2))
+              & (raw[:, None, :] <= hi[:, sensors].transpose(1, 0, 2))).all(axis=2)
+    hits = inside.sum(axis=1)
+    return np.where(hits == 1, inside.argmax(axis=1), -1)
+
+
+def boxes_overlap(lo, hi):
+    n = lo.shape[0]
+    for sensor in range(3):
+        for a in range(n):
+            for b in range(a + 1, n):
+                if (lo[a, sensor] <= hi[b, sensor]).all() and (lo[b, sensor] <= hi[a, sensor]).all():
+                    return True
+    return False
+
+
+''' ---------------- report ---------------- '''
+def confusion(truth, pred, n_colors):
+    '''[truth, predicted] counts, the last column counts "none" predictions.'''
+    pred = np.where(pred < 0, n_colors, pred)
+    return np.bincount(truth * (n_colors + 1) + pred,
+                       minlength=n_colors * (n_colors + 1)).reshape(n_colors, n_colors + 1)
+
+
+def print_confusion(title, matrix, colors):
+    print("\n%s" % title)
+    names = list(colors) + [NONE]
+    width = max(len(n) for n in names) + 2
+    print(" " * width + "".join(n[:8].rjust(9) for n in names))
+    for name, row in zip(colors, matrix):
+        print(name.ljust(width) + "".join(str(v).rjust(9) for v in row))
+    accuracy = np.trace(matrix[:, :len(colors)]) / max(matrix.sum(), 1)
+    print("accuracy: %.4f" % accuracy)
+    return accuracy
+
+
+def analyze(raw, sensors, labels, holdout=0.2, threshold_quantile=0.99, seed=0, verbose=True):
+    '''Evaluate every conversion and classifier, return the calibration dict
+    for the best conversion and a result summary.'''
+    colors = sorted(set(labels.tolist()))
+    labels_idx = np.searchsorted(colors, labels)
+    n_colors = len(colors)
+
+    rng = np.random.default_rng(seed)
+    test = rng.random(len(raw)) < holdout
+    train = ~test
+    if not test.any():
+        test = train
+
+    results = {}
+    for name in ALGORITHMS:
+        rgb = CONVERSIONS[name](raw)
+        centroids = fit_centroids(rgb[train], labels_idx[train], n_colors)
+        own = np.sqrt(((rgb[train] - centroids[labels_idx[train]]) ** 2).sum(axis=1))
+        threshold = max(1, int(np.ceil(np.quantile(own, threshold_quantile))))
+        pred, best, margin = nearest_centroid(rgb[test], centroids, threshold)
+        matrix = confusion(labels_idx[test], pred, n_colors)
+        per_sensor = {}
+        for s in range(3):
+            sel = train & (sensors == s)
+            if sel.any():
+                per_sensor[SENSORS[s]] = fit_centroids(rgb[sel], labels_idx[sel], n_colors)
+        if verbose:
+            accuracy = print_confusion("%s, nearest centroid (threshold %d)" % (name, threshold),
+                                       matrix, colors)
+            print("margin to 2nd centroid: min %.2f  p5 %.2f  median %.2f"
+                  % (margin.min(), np.quantile(margin, 0.05), np.median(margin)))
+        else:
+            accuracy = np.trace(matrix[:, :n_colors]) / max(matrix.sum(), 1)
+        results[name] = {"accuracy": accuracy, "threshold": threshold,
+                         "centroids": centroids, "per_sensor": per_sensor}
+
+    lo, hi = fit_boxes(raw[train], sensors[train], labels_idx[train], n_colors)
+    box_pred = classify_boxes(raw[test], sensors[test], lo, hi)
+    box_matrix = confusion(labels_idx[test], box_pred, n_colors)
+    overlap = boxes_overlap(lo, hi)
+    if verbose:
+        box_accuracy = print_confusion("raw range boxes", box_matrix, colors)
+        print("boxes overlap: %s" % overlap)
+    else:
+        box_accuracy = np.trace(box_matrix[:, :n_colors]) / max(box_matrix.sum(), 1)
+
+    best = max(ALGORITHMS, key=lambda n: results[n]["accuracy"])
+    chosen = results[best]
+    centroids = {"all": {c: tuple(int(v) for v in chosen["centroids"][i]) for i, c in enumerate(colors)}}
+    for sensor, values in chosen["per_sensor"].items():
+        centroids[sensor] = {c: tuple(int(v) for v in values[i]) for i, c in enumerate(colors)}
+    calibration = {
+        "colors": colors,
+        "centroids": centroids,
+        "threshold": chosen["threshold"],
+        "tables": {
+            "box_lo": lo.reshape(-1).tolist(),
+            "box_hi": hi.reshape(-1).tolist(),
+            "rgb_algorithm": [ALGORITHMS.index(best)],
+        },
+    }
+    summary = {"best": best, "accuracy": {n: results[n]["accuracy"] for n in ALGORITHMS},
+               "box_accuracy": box_accuracy, "boxes_overlap": overlap}
+    return calibration, summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("logs", nargs="*", help="CSV logs: r,g,b,c,sensor,label")
+    parser.add_argument("--out", help="write the calibration file for the car")
+    parser.add_argument("--holdout", type=float, default=0.2, help="fraction of samples used for evaluation")
+    parser.add_argument("--threshold-quantile", type=float, default=0.99,
+                        help="quantile of the distance to the own centroid used as match threshold")
+    parser.add_argument("--synthetic", type=int, help="analyze N generated samples instead of logs")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    if args.synthetic:
+        raw, sensors, labels = synthetic(args.synthetic)
+    elif args.logs:
+        raw, sensors, labels = load_csv(args.logs)
+    else:
+        parser.error("no logs given")
+    t1 = time.perf_counter()
+    calibration, summary = analyze(raw, sensors, labels, args.holdout, args.threshold_quantile)
+    t2 = time.perf_counter()
+
+    print("\nbest conversion: %s" % summary["best"])
+    print("%d samples, load %.2f s, analysis %.2f s" % (len(raw), t1 - t0, t2 - t1))
+    if args.out:
+        size = calibration_store.save(args.out, calibration)
+        print("calibration written to %s (%d bytes)" % (args.out, size))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+'''
+Host stand-in for the ESP8266 bridge, on the text and the binary link.
+
+EspBridge sits on the other end of a fake_hw UART. It answers the SET+
+commands with [OK], switches to binary frames on SET+BINARY1 and back on
+SET+RESET, turns WS+ lines or TELEMETRY/JSON frames into the JSON the
+app gets and hands app packets to the Pico as a line or a CONTROL frame:
+
+    uart = fake_hw.UART(1)
+    bridge = EspBridge(uart)
+    ...                                 # WS_Server(..., binary=True).start()
+    bridge.connect()
+    bridge.app_send({"Q": 50, "K": "forward"})
+    bridge.app_frames                   # what the app received, JSON strings
+
+Only bool keys, Q and K (each also as null) cross the binary link,
+main.py handles no others.
+
+    python tools/esp_bridge.py [frames]
+
+runs WS_Server over both links and compares the UART bytes per frame and
+the Pico's receive time.
+'''
+import sys
+import time
+
+sys.path.insert(0, "tools")
+import fake_hw
+fake_hw.install()
+
+import json
+
+import framing
+
+IP = "192.168.4.1"
+
+
+class EspBridge():
+    def __init__(self, uart, version="1.0", binary_supported=True):
+        self.uart = uart
+        self.version = version
+        self.binary_supported = binary_supported
+        self.binary = False
+        self.pending = bytearray()      # bytes from the Pico not parsed yet
+        self.app_state = {}             # the fields the app has seen so far
+        self.app_frames = []
+        self.commands = []
+        self.pico_bytes = 0             # WS traffic Pico -> ESP
+        self.app_bytes = 0              # app packets ESP -> Pico
+        self.crc_errors = 0
+        uart.on_write = self.on_write
+
+    # Pico -> ESP
+    def on_write(self, data):
+        self.pending.extend(data)
+        telemetry = False
+        buf = self.pending
+        while buf:
+            if buf[0] == framing.SYNC:
+                if len(buf) < framing.HEADER:
+                    break
+                end = framing.HEADER + buf[2]
+                if len(buf) < end + framing.CRC_SIZE:
+                    break
+                if framing.crc16(buf[1:end]) != buf[end] | buf[end + 1] << 8:
+                    self.crc_errors += 1
+                    del buf[0]
+                    continue
+                kind, payload = buf[1], bytes(buf[framing.HEADER:end])
+                self.pico_bytes += end + framing.CRC_SIZE
+                del buf[:end + framing.CRC_SIZE]
+                if kind == framing.TELEMETRY:
+                    self.app_state.update(framing.unpack_telemetry(payload))
+                    telemetry = True
+                elif kind == framing.JSON:
+                    self.app_state.update(framing.json_payload(payload))
+                    telemetry = True
+                continue
+            i = buf.find(b"\n")
+            if i < 0:
+                break
+            line = bytes(buf[:i]).decode()
+            del buf[:i + 1]
+            if line.startswith("WS+"):
+                self.pico_bytes += i + 1
+                self.app_state.update(json.loads(line[3:]))
+                telemetry = True
+            elif line.startswith("SET+"):
+                self.command(line[4:])
+        if telemetry:
+            self.app_frames.append(json.dumps(self.app_state))
+
+    def command(self, command):
+        self.commands.append(command)
+        if command.startswith("BINARY"):
+            if not self.binary_supported:
+                self.reply("[ERROR] unknown command")
+                return
+            self.reply("[OK]")
+            self.binary = command == "BINARY1"
+        elif command == "RESET":
+            self.binary = False
+            self.reply("[OK] %s" % self.version)
+        elif command == "START":
+            self.reply("[OK] %s" % IP)
+        else:
+            self.reply("[OK]")
+
+    # ESP -> Pico
+    def reply(self, line):
+        """ a text line, in a TEXT frame on the binary link """
+        if self.binary:
+            self.uart.inject(framing.frame(framing.TEXT, line.encode()))
+        else:
+            self.uart.inject(("%s\r\n" % line).encode())
+
+    def connect(self, ip="192.168.4.2"):
+        self.reply("[CONNECTED] %s" % ip)
+
+    def disconnect(self, ip="192.168.4.2"):
+        self.reply("[DISCONNECTED] %s" % ip)
+
+    def app_send(self, data):
+        """ a packet from the app """
+        if self.binary:
+            packet = framing.frame(framing.CONTROL, framing.pack_control(data))
+        else:
+            packet = ("%s\r\n" % json.dumps(data)).encode()
+        self.app_bytes += len(packet)
+        self.uart.inject(packet)
+
+
+# a packet as the app sends it, every widget in every packet
+APP_PACKET = {
+    "A": 0, "B": 0, "C": 0, "D": 0, "E": True, "F": False, "G": True,
+    "H": False, "I": False, "J": 0, "K": "forward", "L": 0, "M": False,
+    "N": False, "O": False, "P": False, "Q": 60, "R": 0, "S": False,
+}
+
+
+def session(binary, frames):
+    import ws as ws_module
+    uart = fake_hw.UART(1)
+    bridge = EspBridge(uart)
+    ws_module.UART = lambda *args, **kwargs: uart
+    try:
+        server = ws_module.WS_Server(name="my_4wd_car", mode="ap", binary=binary)
+    finally:
+        ws_module.UART = fake_hw.UART
+    assert server.start()
+    received = []
+    server.on_receive = received.append
+    bridge.connect()
+    server.receive()
+    sonar = [0, 0]
+    d = server.send_dict
+    rx_us = 0
+    bridge.app_bytes = bridge.pico_bytes = 0
+    for i in range(frames):
+        packet = dict(APP_PACKET, Q=40 + i % 20)
+        bridge.app_send(packet)
+        t = time.perf_counter()
+        server.receive()
+        rx_us += (time.perf_counter() - t) * 1000000
+        d['B'] = round(10 + (i % 37) * 0.37, 2)
+        d['C'] = 0.01 * (i // 4)
+        sonar[0] = (i * 5) % 180 - 90
+        sonar[1] = 20 + i % 50
+        d['D'] = sonar
+        d['J'] = 0
+        if i % 10 == 0:
+            d['T'] = [200, 950, 1800, 90, 300, 700, 1500, 4100, 9200]
+        server.send_data()
+    assert len(received) == frames and received[-1]['Q'] == packet['Q']
+    print("%-6s app -> pico %5.1f bytes/packet, pico -> app %5.1f bytes/frame, receive %5.1f us/packet" % (
+        "binary" if binary else "text", bridge.app_bytes / frames, bridge.pico_bytes / frames, rx_us / frames))
+    return bridge
+
+
+def main():
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    print("%s, %d packets each way" % (sys.implementation.name, frames))
+    session(False, frames)
+    session(True, frames)
+
+
+if __name__ == "__main__":
+    main()
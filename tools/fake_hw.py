@@ -0,0 +1,331 @@
+'''
+Fake RP2040 hardware for running the car code on a PC.
+
+install() puts stand-ins for the MicroPython-only modules (machine,
+micropython, rp2, ustruct, typing) into sys.modules and adds the
+MicroPython ticks functions to time and print_exception() to sys, so
+modules from libs/ can be imported and driven by host tests and tools. Kept MicroPython
+compatible so the tools also run on the unix port.
+'''
+import sys
+import time
+
+_ROOT = "/".join(__file__.replace("\\", "/").split("/")[:-2])
+LIBS_PATH = _ROOT + "/libs" if _ROOT else "libs"
+
+
+def _module(name):
+    return type(sys)(name)
+
+
+def _ticks_us():
+    return int(time.perf_counter() * 1000000)
+
+
+def _real_time():
+    '''Undo a plain mock of time left in sys.modules by another test.'''
+    global time
+    current = sys.modules.get("time")
+    if not hasattr(current, "perf_counter") and not hasattr(current, "ticks_us"):
+        del sys.modules["time"]
+        import time
+    return time
+
+
+''' ---------------- machine ---------------- '''
+class Pin():
+    IN = 0
+    OUT = 1
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 4
+    IRQ_RISING = 8
+
+    def __init__(self, id, mode=None, pull=None, value=0):
+        self.id = id
+        self._value = value
+        self.handler = None
+        self.hard = False
+
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    high = on
+    low = off
+
+    def toggle(self):
+        self._value ^= 1
+
+    def irq(self, handler=None, trigger=None, hard=False):
+        self.handler = handler
+        self.hard = hard
+
+    def __call__(self, v=None):
+        return self.value(v)
+
+
+class PWM():
+    def __init__(self, pin, freq=None, duty_u16=None):
+        self.pin = pin
+        self._freq = freq or 0
+        self._duty = duty_u16 or 0
+
+    def freq(self, f=None):
+        if f is None:
+            return self._freq
+        self._freq = f
+
+    def duty_u16(self, d=None):
+        if d is None:
+            return self._duty
+        self._duty = d
+
+    def deinit(self):
+        pass
+
+
+class ADC():
+    def __init__(self, pin):
+        self.pin = pin
+        self.value = 30000
+
+    def read_u16(self):
+        return self.value
+
+
+class Timer():
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, mode=PERIODIC, period=-1, callback=None, freq=None):
+        self.callback = None
+        if callback is not None:
+            self.init(mode=mode, period=period, callback=callback)
+
+    def init(self, mode=PERIODIC, period=-1, callback=None, freq=None):
+        self.mode = mode
+        self.period = period
+        self.callback = callback
+
+    def deinit(self):
+        self.callback = None
+
+    def fire(self):
+        '''Run the callback once, host code calls this instead of an interrupt.'''
+        if self.callback is not None:
+            self.callback(self)
+
+
+class WDT():
+    def __init__(self, id=0, timeout=5000):
+        self.timeout = timeout
+        self.feeds = 0
+
+    def feed(self):
+        self.feeds += 1
+
+
+class UART():
+    '''Byte pipe standing in for machine.UART. Bytes the "remote" side
+    sends are queued with inject(), bytes written by the Pico collect in
+    tx and are passed to on_write if set.'''
+    IRQ_RXIDLE = 4096
+
+    def __init__(self, id=0, baudrate=115200, **kwargs):
+        self.rx = bytearray()
+        self.tx = bytearray()
+        self.on_write = None
+        self._irq_handler = None
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def inject(self, data):
+        if isinstance(data, str):
+            data = data.encode()
+        self.rx.extend(data)
+        if self._irq_handler is not None:
+            self._irq_handler(self)
+
+    def any(self):
+        return len(self.rx)
+
+    def read(self, n=None):
+        if not self.rx:
+            return None
+        n = len(self.rx) if n is None else min(n, len(self.rx))
+        data = bytes(self.rx[:n])
+        del self.rx[:n]
+        return data
+
+    def readinto(self, buf, n=None):
+        n = len(buf) if n is None else n
+        n = min(n, len(self.rx))
+        if not n:
+            return None
+        buf[:n] = self.rx[:n]
+        del self.rx[:n]
+        return n
+
+    def readline(self):
+        i = self.rx.find(b"\n")
+        if i < 0:
+            return None
+        return self.read(i + 1)
+
+    def write(self, data):
+        self.tx.extend(data)
+        if self.on_write is not None:
+            self.on_write(bytes(data))
+        return len(data)
+
+    def irq(self, handler=None, trigger=0, hard=False):
+        self._irq_handler = handler
+
+
+def esp8266_uart(version="1.0"):
+    '''UART with a stand-in ESP8266 that answers every SET command with
+    [OK], so WS_Server can be constructed and started on the host.'''
+    uart = UART(1)
+
+    def esp(data):
+        if data.startswith(b"SET+"):
+            uart.inject(("[OK] %s\r\n" % version).encode())
+
+    uart.on_write = esp
+    return uart
+
+
+class SoftI2C():
+    def __init__(self, scl=None, sda=None, freq=400000):
+        self.mem = {}
+
+    def scan(self):
+        return [0x29]
+
+    def readfrom_mem(self, addr, reg, n):
+        return bytes(self.mem.get(reg, bytes(n))[:n]).ljust(n, b"\x00")
+
+    def readfrom_mem_into(self, addr, reg, buf):
+        buf[:] = self.readfrom_mem(addr, reg, len(buf))
+
+    def writeto_mem(self, addr, reg, data):
+        self.mem[reg] = bytes(data)
+
+    def writeto(self, addr, data):
+        return len(data)
+
+
+I2C = SoftI2C
+
+
+def time_pulse_us(pin, level, timeout_us=1000000):
+    return 1000
+
+
+def _noop(*args, **kwargs):
+    return None
+
+
+''' ---------------- other modules ---------------- '''
+class _Generic():
+    def __getitem__(self, item):
+        return self
+
+
+def _rp2_decorator(*args, **kwargs):
+    return lambda f: f
+
+
+class StateMachine():
+    def __init__(self, *args, **kwargs):
+        self.words = 0
+
+    def active(self, value=None):
+        pass
+
+    def put(self, buf, shift=0):
+        self.words += len(buf)
+
+
+def _print_exception(e, file=None):
+    import traceback
+    traceback.print_exception(type(e), e, e.__traceback__, file=file or sys.stdout)
+
+
+def install():
+    '''Register the fake modules, returns the fake machine module.'''
+    _real_time()
+    for name, fn in (("ticks_us", _ticks_us),
+                     ("ticks_ms", lambda: _ticks_us() // 1000),
+                     ("ticks_cpu", _ticks_us),
+                     ("ticks_diff", lambda a, b: a - b),
+                     ("ticks_add", lambda a, b: a + b),
+                     ("sleep_ms", lambda ms: time.sleep(ms / 1000)),
+                     ("sleep_us", lambda us: time.sleep(us / 1000000))):
+        if not hasattr(time, name):
+            setattr(time, name, fn)
+    if not hasattr(sys, "print_exception"):
+        sys.print_exception = _print_exception
+
+    machine = _module("machine")
+    for cls in (Pin, PWM, ADC, Timer, WDT, UART, SoftI2C):
+        setattr(machine, cls.__name__, cls)
+    machine.I2C = I2C
+    machine.time_pulse_us = time_pulse_us
+    machine.freq = lambda f=None: 125000000
+    machine.reset = _noop
+    machine.disable_irq = lambda: 0
+    machine.enable_irq = _noop
+    sys.modules["machine"] = machine
+
+    if "micropython" not in sys.modules:
+        try:
+            import micropython
+        except ImportError:
+            micropython = _module("micropython")
+            micropython.const = lambda x: x
+            micropython.schedule = lambda f, arg: f(arg)
+            micropython.alloc_emergency_exception_buf = _noop
+            micropython.mem_info = _noop
+            micropython.native = lambda f: f
+            micropython.viper = lambda f: f
+            sys.modules["micropython"] = micropython
+
+    if "ustruct" not in sys.modules:
+        try:
+            import ustruct as struct_module
+        except ImportError:
+            import struct as struct_module
+        sys.modules["ustruct"] = struct_module
+
+    try:
+        import typing
+    except ImportError:
+        typing = _module("typing")
+        for name in ("Any", "Dict", "List", "Optional", "Tuple", "Union", "Callable"):
+            setattr(typing, name, _Generic())
+        sys.modules["typing"] = typing
+
+    rp2 = _module("rp2")
+    rp2.PIO = type("PIO", (), {"OUT_LOW": 0, "SHIFT_LEFT": 0})
+    rp2.StateMachine = StateMachine
+    rp2.asm_pio = _rp2_decorator
+    sys.modules["rp2"] = rp2
+
+    # Plain mocks of helper from other host tests lack most functions
+    helper = sys.modules.get("helper")
+    if helper is not None and not hasattr(helper, "set_debug"):
+        del sys.modules["helper"]
+
+    if LIBS_PATH not in sys.path:
+        sys.path.insert(0, LIBS_PATH)
+    return machine
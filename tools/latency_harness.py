@@ -0,0 +1,130 @@
+'''
+Command to PWM latency on the host.
+
+Drives a real WS_Server over the fake UART. An "app" injects a joystick
+packet every APP_INTERVAL_MS with its send time in the echo key, the
+car side runs the scheduler tasks (ws rx, control, background motor
+ramp) and the LatencyTrace hooks in WS_Server.read() and Motor.run():
+
+    python tools/latency_harness.py [seconds] [app interval ms]
+
+Besides the on-car stages it reports send -> PWM, the time a packet
+waits in the UART before ws rx picks it up included, taken from the
+echoed send time like the app would.
+'''
+import sys
+import time
+
+sys.path.insert(0, "tools")
+import fake_hw
+fake_hw.install()
+
+import asyncio
+import json
+
+import motors
+from classes.motor import Motor
+from latency import LatencyTrace
+from scheduler import Scheduler
+from stage_stats import StageStats
+import ws as ws_module
+from ws import WS_Server
+
+APP_INTERVAL_MS = 50
+WS_RX_PERIOD = 10
+CONTROL_PERIOD = 20
+MOTOR_RAMP_PERIOD = 2
+ECHO_KEY = 'Z'
+
+
+class EchoTrace(LatencyTrace):
+    '''also histograms send -> PWM from the echoed send time'''
+    def __init__(self):
+        super().__init__(ECHO_KEY)
+        self.app = StageStats(("send_pwm",))
+
+    def actuated(self, motor, old, power):
+        pending = self.pending
+        super().actuated(motor, old, power)
+        if pending and not self.pending and self.echo_value is not None:
+            self.app.add(0, time.ticks_diff(time.ticks_us(), self.echo_value))
+
+
+def make_server():
+    '''WS_Server on the fake UART, the "ESP8266" answers every SET with [OK]'''
+    uart = fake_hw.esp8266_uart()
+    # __init__ opens the UART and resets the ESP8266 through it
+    ws_module.UART = lambda *args, **kwargs: uart
+    try:
+        server = WS_Server(name="harness", mode="sta", ssid="harness")
+    finally:
+        ws_module.UART = fake_hw.UART
+    server._is_connected = True
+    return server
+
+
+def run(duration=2.0, app_interval=APP_INTERVAL_MS):
+    ws = make_server()
+    trace = EchoTrace()
+    ws.trace = trace
+    Motor.trace = trace
+    car = {"throttle": 0}
+
+    def on_receive(data):
+        trace.decoded(data)
+        car["throttle"] = data.get("Q", 0)
+
+    ws.on_receive = on_receive
+    motors.set_background_ramp(True)
+    motors.stop()
+
+    def ws_rx():
+        if ws.uart.any():
+            ws.receive()
+
+    def control():
+        p = car["throttle"]
+        motors.set_motors_power_gradually([p, p, p, p])
+
+    def ramp():
+        motors.ramp_step(MOTOR_RAMP_PERIOD)
+
+    sched = Scheduler()
+    sched.add("ws rx", ws_rx, WS_RX_PERIOD)
+    sched.add("control", control, CONTROL_PERIOD)
+    sched.add("motors", ramp, MOTOR_RAMP_PERIOD)
+
+    async def app():
+        n = 0
+        while True:
+            n += 1
+            # a new throttle every packet, so each one needs a duty write
+            packet = {"K": "forward", "Q": 20 + n % 2 * 40, ECHO_KEY: time.ticks_us()}
+            ws.uart.inject(json.dumps(packet) + "\n")
+            await asyncio.sleep(app_interval / 1000)
+
+    async def main():
+        app_task = asyncio.create_task(app())
+        stop = asyncio.create_task(stop_after())
+        await asyncio.gather(sched.start(), stop)
+        app_task.cancel()
+
+    async def stop_after():
+        await asyncio.sleep(duration)
+        sched.stop()
+
+    asyncio.run(main())
+    motors.set_background_ramp(False)
+    motors.stop()
+    Motor.trace = None
+    return trace
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    interval = float(sys.argv[2]) if len(sys.argv) > 2 else APP_INTERVAL_MS
+    trace = run(duration, interval)
+    print("%.1f s, a packet every %.0f ms" % (duration, interval))
+    print(trace.describe())
+    trace.stats.dump(sys.stdout)
+    trace.app.dump(sys.stdout)
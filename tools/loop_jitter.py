@@ -0,0 +1,215 @@
+'''
+Control-rate jitter of the main loop, before and after the scheduler.
+
+Runs on the host with fake hardware. The drivers are simulated with the
+timing of the real ones (UART readline timeout, TCS34725 power up and
+integration, follow_line() delay, 1 ms per step motor ramp) multiplied
+by <scale>:
+
+    python tools/loop_jitter.py [seconds] [scale]
+
+"before" is the plain `ws.loop(); remote_handler()` loop, "after" runs
+the same stages as scheduler tasks with the aio wrappers and the
+background motor ramp. The time between two runs of the control law is
+recorded for both.
+'''
+import sys
+import time
+
+sys.path.insert(0, "tools")
+import fake_hw
+fake_hw.install()
+
+import asyncio
+import random
+
+import aio
+import motors
+from scheduler import Scheduler
+
+UART_TIMEOUT_MS = 10        # WS_Server UART timeout
+APP_INTERVAL_MS = 50        # the app sends a control message every ~50 ms
+TCS_POWER_UP_MS = 3
+TCS_INTEG_MS = 38.4         # TCSINTEG_MEDIUM
+FOLLOW_LINE_DELAY_MS = 100
+LINE_TRACK_POWER = 30
+DIRECTIONS = ("forward", "left", "right")
+
+
+def now_ms():
+    return time.perf_counter() * 1000
+
+
+class SimUART():
+    '''Lines arrive every APP_INTERVAL_MS, readline() waits for the timeout without data.'''
+    def __init__(self, scale):
+        self.scale = scale
+        self.next_line = now_ms()
+
+    def any(self):
+        return now_ms() >= self.next_line
+
+    def readline(self):
+        if not self.any():
+            time.sleep(UART_TIMEOUT_MS * self.scale / 1000)
+            return None
+        self.next_line = now_ms() + APP_INTERVAL_MS * self.scale
+        return b'{"A": 0}\n'
+
+
+class SimTCS():
+    '''TCS34725 timing: power up, then one reading per integration cycle.'''
+    def __init__(self, scale):
+        self.scale = scale
+        self._active = False
+        self._t_start = 0
+
+    @property
+    def integration_time(self):
+        return TCS_INTEG_MS * self.scale
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        if value and not self._active:
+            time.sleep(TCS_POWER_UP_MS * self.scale / 1000)
+            self._t_start = now_ms()
+        self._active = value
+
+    def _valid(self):
+        return now_ms() - self._t_start >= self.integration_time
+
+    def read(self):
+        was_active = self._active
+        self.active(True)
+        while not self._valid():
+            time.sleep(self.integration_time / 1000)
+        self._t_start = now_ms()
+        self.active(was_active)
+        return (170, 160, 130, 450)
+
+
+class SimFollow():
+    def __init__(self, scale):
+        self.left_sensor = SimTCS(scale)
+        self.middle_sensor = SimTCS(scale)
+        self.right_sensor = SimTCS(scale)
+
+    def read_raw_all(self):
+        return (self.left_sensor.read(), self.middle_sensor.read(), self.right_sensor.read())
+
+
+def _powers(direction):
+    p = LINE_TRACK_POWER
+    if direction == "left":
+        return [-p, p, -p, p]
+    if direction == "right":
+        return [p, -p, p, -p]
+    return [p, p, p, p]
+
+
+def summary(stamps):
+    '''interval statistics (ms) of the control law timestamps'''
+    intervals = [b - a for a, b in zip(stamps, stamps[1:])]
+    n = len(intervals)
+    mean = sum(intervals) / n
+    std = (sum((i - mean) ** 2 for i in intervals) / n) ** 0.5
+    return {
+        "runs": len(stamps),
+        "mean_ms": mean,
+        "std_ms": std,
+        "max_jitter_ms": max(abs(i - mean) for i in intervals),
+    }
+
+
+def run_before(duration=1.0, scale=0.2, seed=1):
+    '''the plain loop, every stage blocks all the others'''
+    rng = random.Random(seed)
+    uart = SimUART(scale)
+    follow = SimFollow(scale)
+    motors.set_background_ramp(False)
+    motors.stop()
+    stamps = []
+    t_end = now_ms() + duration * 1000
+    while now_ms() < t_end:
+        # ws.loop()
+        uart.readline()
+        # remote_handler() -> line_track() -> follow_line() -> move()
+        stamps.append(now_ms())
+        follow.read_raw_all()
+        time.sleep(FOLLOW_LINE_DELAY_MS * scale / 1000)
+        _sim_ramp(_powers(rng.choice(DIRECTIONS)), scale)
+    return stamps
+
+
+def _sim_ramp(powers, scale):
+    '''set_motors_power_gradually() with the 1 ms step scaled'''
+    for i in range(4):
+        motors.target_powers[i] = powers[i]
+    while motors.ramp_step(1):
+        time.sleep(scale / 1000)
+
+
+def run_after(duration=1.0, scale=0.2, seed=1, control_period=20):
+    '''the scheduler tasks, returns (control timestamps, scheduler)'''
+    rng = random.Random(seed)
+    uart = SimUART(scale)
+    follow = SimFollow(scale)
+    motors.set_background_ramp(True)
+    motors.stop()
+    stamps = []
+    frame = [None]
+
+    def ws_rx():
+        if uart.any():
+            uart.readline()
+
+    async def sensor_task():
+        frame[0] = await aio.read_colors(follow)
+
+    def control():
+        stamps.append(now_ms())
+        motors.set_motors_power_gradually(_powers(rng.choice(DIRECTIONS)))
+
+    def ramp():
+        motors.ramp_step(1)
+
+    sched = Scheduler()
+    ms = lambda period: max(1, int(period * scale))
+    sched.add("ws rx", ws_rx, ms(10))
+    sched.add("telemetry", lambda: None, ms(100))
+    sched.add("sensors", sensor_task, ms(40))
+    sched.add("control", control, ms(control_period))
+    sched.add("lights", lambda: None, ms(50))
+    sched.add("motors", ramp, 1)
+
+    async def stop_after():
+        await asyncio.sleep(duration)
+        sched.stop()
+
+    async def run():
+        await asyncio.gather(sched.start(), stop_after())
+
+    asyncio.run(run())
+    motors.set_background_ramp(False)
+    motors.stop()
+    return stamps, sched
+
+
+def compare(duration=1.0, scale=0.2):
+    before = summary(run_before(duration, scale))
+    stamps, sched = run_after(duration, scale)
+    after = summary(stamps)
+    return before, after, sched
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 2.0
+    scale = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    before, after, sched = compare(duration, scale)
+    print("control law, %.1f s, timing scale %.2f" % (duration, scale))
+    for name, s in (("before", before), ("after", after)):
+        print("%-7s runs %5d  interval %7.2f ms  std %6.2f ms  max jitter %6.2f ms" % (
+            name, s["runs"], s["mean_ms"], s["std_ms"], s["max_jitter_ms"]))
+    print()
+    sched.report()
@@ -0,0 +1,167 @@
+'''
+Replay a recording of the car (libs/recorder.py) through main.py on the host.
+
+main.py is imported with fake hardware. The recorded lines go through
+WS_Server.receive() into main.on_receive(), the sensor frames into the
+cached frame the control law reads, and remote_handler() runs every
+CONTROL_PERIOD of recorded time in between:
+
+    python tools/replay.py record.bin
+
+The motor commands of the replay are compared with the recorded ones.
+The first command that differs is a decision divergence (e.g. another
+calibration on the host), the time between matching commands of the
+recording and the replay is the timing divergence. The host time of the
+main.py stages is reported from its stage timing.
+'''
+import sys
+import os
+
+sys.path.insert(0, "tools")
+import fake_hw
+fake_hw.install()
+
+from recorder import load, KIND_MESSAGE, KIND_FRAME, KIND_MOTORS
+
+
+def import_main(workdir=None):
+    '''import main.py, its WS_Server talks to a stand-in ESP8266'''
+    libs = os.path.abspath(fake_hw.LIBS_PATH)
+    main = sys.modules.get("main")
+    if main is not None and os.path.dirname(os.path.abspath(main.__file__)) == libs:
+        return main
+    # not the main.py at the top of the repository
+    sys.modules.pop("main", None)
+    sys.path.insert(0, libs)
+    import ws as ws_module
+    cwd = os.getcwd()
+    uart = fake_hw.esp8266_uart()
+    ws_module.UART = lambda *args, **kwargs: uart
+    try:
+        if workdir is not None:
+            os.chdir(workdir)   # main.py appends to log.txt at import
+        import main
+    finally:
+        ws_module.UART = fake_hw.UART
+        os.chdir(cwd)
+    return main
+
+
+def reset_main(main):
+    '''back to the state right after ws.start(), in scheduler mode'''
+    from car_state import CarState
+    from sensor_frame import Frame
+    main.state = CarState()
+    main.sensor_frame = Frame()
+    main.telemetry.state = main.state
+    main.telemetry.frame = main.sensor_frame
+    main.commands.last.clear()
+    main.commands.last_data = None
+    main.commands.pending = False
+    main.ws._is_connected = False
+    main.ws.on_receive = main.on_receive
+    main.stage_stats.reset()
+    main.car.set_background_ramp(True)
+    main.car.resume()
+    main.car.stop()
+
+
+class Capture():
+    '''stands in for the Recorder in motors.py, keeps the changed commands'''
+    def __init__(self):
+        self.now = 0
+        self.commands = []
+
+    def motors(self, powers):
+        powers = tuple(int(p) for p in powers)
+        if not self.commands or self.commands[-1][1] != powers:
+            self.commands.append((self.now, powers))
+
+
+def apply_frame(main, values):
+    frame = main.sensor_frame
+    for i in range(12):
+        frame.colors[i] = values[i]
+    for i in range(3):
+        frame.grayscale[i] = values[12 + i]
+    main.state.sonar_distance = values[15]
+    frame.speed = values[16]
+    frame.mileage = values[17]
+    frame.seq += 1
+    main.state.sensor_raw = frame.raw
+
+
+def divergence(recorded, replayed):
+    '''(index of the first differing command or None, [ms] replay - recording of the matching ones)'''
+    dts = []
+    for i in range(min(len(recorded), len(replayed))):
+        if recorded[i][1] != replayed[i][1]:
+            return i, dts
+        dts.append(replayed[i][0] - recorded[i][0])
+    if len(recorded) != len(replayed):
+        return min(len(recorded), len(replayed)), dts
+    return None, dts
+
+
+def replay(records, control_period=None, workdir=None):
+    main = import_main(workdir)
+    reset_main(main)
+    if control_period is None:
+        control_period = main.CONTROL_PERIOD
+    capture = Capture()
+    main.car.recorder = capture
+    recorded = []
+    messages = frames = 0
+    next_control = 0
+    try:
+        for kind, ms, value in records:
+            while next_control <= ms:
+                capture.now = next_control
+                main.remote_handler()
+                next_control += control_period
+            capture.now = ms
+            if kind == KIND_MESSAGE:
+                main.ws.uart.inject(value + "\n")
+                main.ws.receive()
+                messages += 1
+            elif kind == KIND_FRAME:
+                apply_frame(main, value)
+                frames += 1
+            elif kind == KIND_MOTORS:
+                recorded.append((ms, tuple(value)))
+    finally:
+        main.car.recorder = None
+        main.car.set_background_ramp(False)
+        main.car.stop()
+    first, dts = divergence(recorded, capture.commands)
+    return {
+        "messages": messages,
+        "frames": frames,
+        "recorded": recorded,
+        "replayed": capture.commands,
+        "first_divergence": first,
+        "mean_dt_ms": sum(dts) / len(dts) if dts else 0,
+        "max_dt_ms": max((abs(dt) for dt in dts), default=0),
+        "stage_stats": main.stage_stats,
+    }
+
+
+def report(result, out=sys.stdout):
+    out.write("%d messages, %d frames, %d recorded and %d replayed motor commands\n" % (
+        result["messages"], result["frames"], len(result["recorded"]), len(result["replayed"])))
+    first = result["first_divergence"]
+    if first is None:
+        out.write("decisions: no divergence\n")
+    else:
+        rec = result["recorded"][first] if first < len(result["recorded"]) else None
+        rep = result["replayed"][first] if first < len(result["replayed"]) else None
+        out.write("decisions: diverge at command %d, recorded %s, replayed %s\n" % (first, rec, rep))
+    out.write("timing: replay - recording %.1f ms mean, %d ms max over the matching commands\n" % (
+        result["mean_dt_ms"], result["max_dt_ms"]))
+    result["stage_stats"].dump(out)
+
+
+if __name__ == "__main__":
+    import tempfile
+    path = sys.argv[1] if len(sys.argv) > 1 else "record.bin"
+    report(replay(load(path), workdir=tempfile.mkdtemp()))